@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+'''
+Seeded generators of synthetic input data for the benchmarks of the uap
+tools. The same seed and size always produce the same bytes, also for
+gzipped files, so outputs can be compared against golden hashes.
+
+All generators derive their data from one random genome per seed:
+
+- FASTQ files, single or paired, plain or gzipped, with Illumina style
+  descriptions after the read names and some empty reads as left behind
+  by cutadapt,
+- segemehl SAM files collated by read name with multiple mappings (XI),
+  split reads (XQ), missing mates and optionally the mate information and
+  merged splits of s2c,
+- BED files of mate pairs as written by ``bedtools bamtobed``,
+- a cufflinks style GTF file with genes, transcripts and exons,
+- featureCounts tables and kallisto abundance tables of the genes and
+  transcripts of that GTF file,
+- .npz matrices as written by deepTools multiBamSummary (without NumPy).
+
+Run ``generators.py --help`` to write the files to a directory.
+'''
+
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+import struct
+import sys
+import zipfile
+
+CHROMOSOMES = 3
+'''
+Number of chromosomes of the random genome.
+'''
+
+CHROMOSOME_LENGTH = 1000000
+'''
+Length of every chromosome of the random genome.
+'''
+
+
+def open_text(path):
+    '''
+    Returns a text file object writing to *path*. Paths ending on .gz are
+    gzipped with a fixed timestamp, so the output is reproducible.
+    '''
+    if path.endswith('.gz'):
+        raw = open(path, 'wb')
+        compressed = gzip.GzipFile(filename='', mode='wb', fileobj=raw,
+                                   compresslevel=1, mtime=0)
+        # the gzip stream closes the file it did not open itself otherwise
+        compressed.myfileobj = raw
+        return io.TextIOWrapper(compressed, encoding='ascii')
+    return open(path, 'w')
+
+
+class Genome(object):
+    '''
+    Random chromosomes ``chr1``, ``chr2``, ... and the random number
+    generator all data of a *seed* is drawn from.
+    '''
+
+    def __init__(self, seed, chromosomes=CHROMOSOMES,
+                 length=CHROMOSOME_LENGTH):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.sequences = dict()
+        for index in range(chromosomes):
+            name = 'chr%d' % (index + 1)
+            self.sequences[name] = ''.join(
+                self.rng.choices('ACGT', k=length))
+        self.names = sorted(self.sequences)
+
+    def fork(self, purpose):
+        '''
+        Returns a random number generator for *purpose*, so every kind of
+        data is independent of the sizes of the other kinds.
+        '''
+        return random.Random('%d-%s' % (self.seed, purpose))
+
+    def read(self, rng, length):
+        '''
+        Returns the chromosome, position (1-based) and sequence of a random
+        read of *length* bases.
+        '''
+        chromosome = rng.choice(self.names)
+        sequence = self.sequences[chromosome]
+        start = rng.randrange(len(sequence) - length)
+        return chromosome, start + 1, sequence[start:start + length]
+
+    def write_fasta(self, path, width=60):
+        with open_text(path) as f:
+            for name in self.names:
+                sequence = self.sequences[name]
+                f.write('>%s\n' % name)
+                for start in range(0, len(sequence), width):
+                    f.write(sequence[start:start + width] + '\n')
+
+
+def fastq(genome, paths, reads, read_length=100, empty_fraction=0.01):
+    '''
+    Writes *reads* records to the FASTQ file *paths[0]* and, if given, their
+    mates to *paths[1]*. A fraction of *empty_fraction* of the reads has an
+    empty sequence. Returns the number of records per file.
+    '''
+    rng = genome.fork('fastq-%d' % len(paths))
+    qualities = [''.join(rng.choices('#+5<?@ABCDEFGHI', k=read_length))
+                 for _ in range(64)]
+    files = [open_text(path) for path in paths]
+    try:
+        for index in range(reads):
+            chromosome, position, sequence = genome.read(
+                rng, read_length * 2 + rng.randrange(200))
+            for mate, f in enumerate(files):
+                read = sequence[:read_length] if mate == 0 \
+                    else sequence[-read_length:]
+                if rng.random() < empty_fraction:
+                    read = ''
+                else:
+                    read = read[:read_length - rng.randrange(20)]
+                f.write('@read%08d %d:N:0:ACGTAC\n%s\n+\n%s\n' % (
+                    index, mate + 1, read,
+                    rng.choice(qualities)[:len(read)]))
+    finally:
+        for f in files:
+            f.close()
+    return reads
+
+
+def _sam_header(genome, sort_order='queryname'):
+    lines = ['@HD\tVN:1.0\tSO:%s' % sort_order]
+    for name in genome.names:
+        lines.append('@SQ\tSN:%s\tLN:%d' % (
+            name, len(genome.sequences[name])))
+    lines.append('@PG\tID:segemehl\tPN:segemehl\tVN:0.2.0')
+    return lines
+
+
+def _alignment(qname, flag, rname, pos, sequence, tags):
+    length = len(sequence)
+    return '\t'.join([qname, str(flag), rname, str(pos), '60',
+                      '%dM' % length, '*', '0', '0', sequence,
+                      'I' * length] + tags)
+
+
+def _fragments(rng, genome, length, reverse, split_fraction, distance):
+    '''
+    Returns the [chromosome, position, sequence, first, last] fragments of
+    one alignment in the order of the read, more than one for split reads.
+    *first* and *last* are the 1-based positions of the fragment in the
+    read. Most splits can be merged, some are too far apart, overlap or lie
+    on different chromosomes.
+    '''
+    chromosome, position, sequence = genome.read(rng, length)
+    if rng.random() >= split_fraction:
+        return [[chromosome, position, sequence, 1, length]]
+    count = rng.choice([2, 2, 2, 3])
+    cuts = sorted(rng.sample(range(15, length - 15), count - 1))
+    fragments = list()
+    chromosome_length = len(genome.sequences[chromosome])
+    for start, end in zip([0] + cuts, cuts + [length]):
+        gap = rng.choice([rng.randrange(50, 5000), rng.randrange(50, 5000),
+                          rng.randrange(50, 5000), distance * 2, -5])
+        if fragments:
+            position = fragments[-1][1] + len(fragments[-1][2]) + gap
+        if position + end - start >= chromosome_length:
+            position = rng.randrange(chromosome_length - length)
+        first, last = start + 1, end
+        if reverse:
+            # the read starts at the end of the reverse strand
+            first, last = length - end + 1, length - start
+        fragments.append([chromosome, position, sequence[start:end],
+                          first, last])
+    if rng.random() < 0.05:
+        fragments[-1][0] = rng.choice(genome.names)
+    if reverse:
+        fragments.reverse()
+    return fragments
+
+
+def sam(genome, path, templates, flavor='segemehl', read_length=100,
+        split_fraction=0.15, mate_loss=0.1, distance=200000):
+    '''
+    Writes the alignments of *templates* read pairs, collated by read name,
+    to the SAM file *path* and returns the number of alignment lines.
+
+    With *flavor* ``segemehl`` split reads are reported as fragments with
+    XQ tags and mates are lost at a rate of *mate_loss*. With ``s2c`` every
+    mapping (XI) consists of a complete pair with mate information and
+    split reads are merged into one alignment with an N operation.
+    '''
+    rng = genome.fork('sam-%s' % flavor)
+    count = 0
+    with open_text(path) as f:
+        f.write('\n'.join(_sam_header(genome)) + '\n')
+        for index in range(templates):
+            qname = 'read%08d' % index
+            hits = rng.choice([1, 1, 1, 1, 1, 1, 1, 2, 2, 3])
+            mates = [0x40, 0x80]
+            if flavor == 'segemehl' and rng.random() < mate_loss:
+                mates = [rng.choice(mates)]
+            lines = list()
+            for xi in range(hits):
+                reverse = rng.random() < 0.5
+                pair = list()
+                for mate in mates:
+                    length = read_length - rng.randrange(30)
+                    mate_reverse = reverse != (mate == 0x80)
+                    flag = mate | (0x10 if mate_reverse else 0)
+                    if flavor == 's2c':
+                        pair.append(_s2c_alignment(
+                            rng, genome, qname, flag, length, hits, xi))
+                        continue
+                    fragments = _fragments(rng, genome, length, mate_reverse,
+                                           split_fraction, distance)
+                    for xq, (rname, pos, sequence, first, last) in \
+                            enumerate(fragments):
+                        tags = ['NM:i:0', 'MD:Z:%d' % len(sequence),
+                                'NH:i:%d' % hits, 'XI:i:%d' % xi]
+                        if len(fragments) > 1:
+                            tags.extend(['XQ:i:%d' % xq, 'XX:i:%d' % first,
+                                         'XY:i:%d' % last])
+                        tags.append('XA:Z:Q')
+                        lines.append(_alignment(qname, flag, rname, pos,
+                                                sequence, tags))
+                if flavor == 's2c':
+                    _set_mates(pair)
+                    lines.extend('\t'.join(fields) for fields in pair)
+            f.write('\n'.join(lines) + '\n')
+            count += len(lines)
+    return count
+
+
+def _s2c_alignment(rng, genome, qname, flag, length, hits, xi):
+    rname, pos, sequence = genome.read(rng, length)
+    cigar = '%dM' % length
+    if rng.random() < 0.15:
+        cut = rng.randrange(15, length - 15)
+        cigar = '%dM%dN%dM' % (cut, rng.randrange(50, 5000), length - cut)
+    return [qname, str(flag | 0x1 | (0x100 if hits > 1 else 0)), rname,
+            str(pos), '60', cigar, '*', '0', '0', sequence, 'I' * length,
+            'NM:i:0', 'MD:Z:%d' % length, 'NH:i:%d' % hits, 'XI:i:%d' % xi,
+            'XS:A:%s' % rng.choice('+-'), 'YS:Z:OK']
+
+
+def _set_mates(pair):
+    if len(pair) != 2:
+        return
+    first, second = pair
+    same = first[2] == second[2]
+    first[6] = '=' if same else second[2]
+    second[6] = '=' if same else first[2]
+    first[7], second[7] = second[3], first[3]
+
+
+def bed_pairs(genome, path, pairs, read_length=100):
+    '''
+    Writes *pairs* mate pairs as BED6 lines with /1 and /2 read names and
+    returns the number of lines.
+    '''
+    rng = genome.fork('bed')
+    with open_text(path) as f:
+        for index in range(pairs):
+            chromosome, position, sequence = genome.read(
+                rng, read_length * 2 + rng.randrange(300))
+            strand = rng.choice('+-')
+            other = '-' if strand == '+' else '+'
+            end = position + len(sequence) - 1
+            f.write('%s\t%d\t%d\tread%08d/1\t60\t%s\n' % (
+                chromosome, position - 1, position - 1 + read_length,
+                index, strand))
+            f.write('%s\t%d\t%d\tread%08d/2\t60\t%s\n' % (
+                chromosome, end - read_length, end, index, other))
+    return 2 * pairs
+
+
+def annotation(genome, genes):
+    '''
+    Returns the genes of the synthetic annotation as list of (gene id,
+    gene name, chromosome, strand, transcripts) tuples. Every transcript
+    is a (transcript id, class code, exons) tuple, the exons are sorted
+    (start, end) tuples with 1-based, inclusive coordinates.
+    '''
+    rng = genome.fork('annotation')
+    result = list()
+    for index in range(genes):
+        chromosome = rng.choice(genome.names)
+        strand = rng.choice('++++---.')
+        start = rng.randrange(1, CHROMOSOME_LENGTH - 50000)
+        name = rng.choice(['ENSG%011d' % index, 'GENE%d' % index,
+                           'LINC%d' % index])
+        transcripts = list()
+        for number in range(rng.choice([1, 1, 2, 3, 4])):
+            exons = list()
+            position = start + rng.randrange(500)
+            for _ in range(rng.randint(1, 6)):
+                length = rng.randrange(50, 1500)
+                exons.append((position, position + length - 1))
+                position += length + rng.randrange(100, 5000)
+            transcripts.append(('TCONS_%08d.%d' % (index, number + 1),
+                                rng.choice('=jjcoiux'), exons))
+        result.append(('XLOC_%06d' % index, name, chromosome, strand,
+                       transcripts))
+    return result
+
+
+def gtf(genome, path, genes):
+    '''
+    Writes the exons of the synthetic annotation with *genes* genes in the
+    format of ``cuffmerge`` and returns the number of lines.
+    '''
+    count = 0
+    with open_text(path) as f:
+        for gene_id, name, chromosome, strand, transcripts in \
+                annotation(genome, genes):
+            for transcript_id, class_code, exons in transcripts:
+                for number, (start, end) in enumerate(exons):
+                    f.write(
+                        '%s\tCufflinks\texon\t%d\t%d\t.\t%s\t.\tgene_id '
+                        '"%s"; transcript_id "%s"; exon_number "%d"; '
+                        'gene_name "%s"; oId "CUFF.%s"; class_code "%s"; '
+                        'tss_id "TSS%s";\n' % (
+                            chromosome, start, end, strand, gene_id,
+                            transcript_id, number + 1, name, transcript_id,
+                            class_code, gene_id[5:]))
+                    count += 1
+    return count
+
+
+def feature_counts(genome, path, genes, samples=1, sample_seed=0):
+    '''
+    Writes a featureCounts table of the genes of the synthetic annotation
+    with *samples* count columns. *sample_seed* varies the counts of
+    different files. Returns the number of genes.
+    '''
+    rng = genome.fork('featureCounts-%d' % sample_seed)
+    names = ['sample%d_%d.bam' % (sample_seed, index)
+             for index in range(samples)]
+    with open_text(path) as f:
+        f.write('# Program:featureCounts v1.6.0; Command:"featureCounts" '
+                '"-a" "annotation.gtf" %s\n' % ' '.join(
+                    '"%s"' % name for name in names))
+        f.write('\t'.join(['Geneid', 'Chr', 'Start', 'End', 'Strand',
+                           'Length'] + names) + '\n')
+        for gene_id, name, chromosome, strand, transcripts in \
+                annotation(genome, genes):
+            exons = sorted(set(exon for transcript in transcripts
+                               for exon in transcript[2]))
+            f.write('\t'.join([
+                gene_id,
+                ';'.join(chromosome for exon in exons),
+                ';'.join(str(exon[0]) for exon in exons),
+                ';'.join(str(exon[1]) for exon in exons),
+                ';'.join(strand.replace('.', '+') for exon in exons),
+                str(sum(end - start + 1 for start, end in exons))] + [
+                    str(int(rng.paretovariate(1.2)) - 1)
+                    for _ in names]) + '\n')
+    return genes
+
+
+def kallisto(genome, path, genes):
+    '''
+    Writes a kallisto abundance table of the transcripts of the synthetic
+    annotation with *genes* genes and returns the number of transcripts.
+    '''
+    rng = genome.fork('kallisto')
+    rows = list()
+    for gene in annotation(genome, genes):
+        for transcript_id, class_code, exons in gene[4]:
+            length = sum(end - start + 1 for start, end in exons)
+            rows.append((transcript_id, length, max(length - 180, 1),
+                         rng.paretovariate(1.2) - 1))
+    # kallisto reports the transcripts in the order of its index
+    rng.shuffle(rows)
+    total = sum(counts / eff_length for _, _, eff_length, counts in rows)
+    with open_text(path) as f:
+        f.write('target_id\tlength\teff_length\test_counts\ttpm\n')
+        for transcript_id, length, eff_length, counts in rows:
+            f.write('%s\t%d\t%d\t%.4f\t%.6f\n' % (
+                transcript_id, length, eff_length, counts,
+                counts / eff_length / total * 1e6))
+    return len(rows)
+
+
+def _npy(dtype, shape, data):
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%s), }" % (
+        dtype, ''.join('%d, ' % size for size in shape).rstrip(' ')
+        if len(shape) > 1 else '%d,' % shape[0])
+    # the header is padded so the data is aligned to 64 bytes
+    length = len(header) + 11
+    header += ' ' * (64 - length % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + \
+        header.encode('latin1') + data
+
+
+def npz(genome, path, bins, samples, sample_seed=0):
+    '''
+    Writes a bins x *samples* float matrix with labels in the format of
+    ``multiBamSummary`` to *path* and returns the number of values.
+    '''
+    rng = genome.fork('npz-%d' % sample_seed)
+    values = [rng.paretovariate(1.5) - 1 if rng.random() < 0.3 else 0.0
+              for _ in range(bins * samples)]
+    labels = ['sample%d_%d' % (sample_seed, index)
+              for index in range(samples)]
+    width = max(len(label) for label in labels)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as f:
+        for name, content in [
+                ('matrix.npy', _npy('<f8', (bins, samples),
+                                    struct.pack('<%dd' % len(values),
+                                                *values))),
+                ('labels.npy', _npy('<U%d' % width, (samples,), b''.join(
+                    label.ljust(width, '\0').encode('utf-32-le')
+                    for label in labels)))]:
+            # fixed timestamps keep the archive reproducible
+            f.writestr(zipfile.ZipInfo(name, (1980, 1, 1, 0, 0, 0)), content,
+                       zipfile.ZIP_DEFLATED)
+    return bins * samples
+
+
+def read_args():
+    parser = argparse.ArgumentParser(
+        description='writes seeded synthetic input data for the uap tools')
+    parser.add_argument(
+        'outdir',
+        help='directory the files are written to')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=1,
+        help='seed of the random data. Default: 1')
+    parser.add_argument(
+        '--reads',
+        type=int,
+        default=100000,
+        help='number of reads, read pairs and templates. Default: 100000')
+    parser.add_argument(
+        '--genes',
+        type=int,
+        default=20000,
+        help='number of genes of the annotation. Default: 20000')
+    return parser.parse_args()
+
+
+def main(args):
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+
+    def path(name):
+        return os.path.join(args.outdir, name)
+
+    genome = Genome(args.seed)
+    genome.write_fasta(path('genome.fa'))
+    counts = {
+        'reads.fastq.gz': fastq(genome, [path('reads.fastq.gz')],
+                                args.reads),
+        'pairs_R1/R2.fastq.gz': fastq(genome, [path('pairs_R1.fastq.gz'),
+                                               path('pairs_R2.fastq.gz')],
+                                      args.reads),
+        'segemehl.sam': sam(genome, path('segemehl.sam'), args.reads),
+        's2c.sam': sam(genome, path('s2c.sam'), args.reads, 's2c'),
+        'pairs.bed': bed_pairs(genome, path('pairs.bed'), args.reads),
+        'merged.gtf': gtf(genome, path('merged.gtf'), args.genes),
+        'featureCounts.txt': feature_counts(
+            genome, path('featureCounts.txt'), args.genes),
+        'abundance.tsv': kallisto(genome, path('abundance.tsv'), args.genes),
+        'matrix.npz': npz(genome, path('matrix.npz'), args.genes, 4)}
+    json.dump(counts, sys.stdout, indent=4, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main(read_args())
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+'''
+Benchmarks the bookkeeping of uap itself on a synthetic project (see
+synthetic_pipeline) with *samples* x *steps* cheap tasks.
+
+Two kinds of timings are taken:
+
+- Phases of ``Pipeline.__init__`` and the task states, measured inside one
+  uap interpreter by wrapping the methods: ``read_config``,
+  ``build_steps``, the declaration of the runs of all steps,
+  ``check_tools``, ``get_state`` of all tasks with and without hashing,
+  ``check_ping_files`` and the search for volatile files.
+- Wall clock times of the uap subcommands as users call them: ``status``
+  with and without tool checks and ``--hash``, ``run-locally`` of a few
+  tasks (reported per task), ``submit-to-cluster`` against fake ``sbatch``
+  and ``squeue`` commands and ``status`` of the submitted project.
+
+The results are written as JSON with ``--output`` and can be compared to an
+earlier result file with ``--baseline``::
+
+    orchestration.py --samples 2500 --steps 5 --output 10k.json
+'''
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+BENCHMARKS_PATH = os.path.dirname(os.path.realpath(__file__))
+UAP_PATH = os.path.realpath(os.path.join(BENCHMARKS_PATH, '..'))
+
+FAKE_SBATCH = '''#!%(python)s
+import os
+import sys
+if '--version' in sys.argv:
+    print('slurm 20.11.0 (uap benchmark)')
+    sys.exit(0)
+path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'jobs')
+with open(path, 'a+') as f:
+    f.seek(0)
+    job_id = 1000 + len(f.readlines())
+    f.write('%%d %%s\\n' %% (job_id, ' '.join(sys.argv[1:])))
+print('Submitted batch job %%d' %% job_id)
+'''
+'''
+Stand-in for ``sbatch`` that accepts every job and never runs it.
+'''
+
+FAKE_SQUEUE = '''#!%(python)s
+import os
+path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'jobs')
+print('JOBID PARTITION NAME USER ST TIME NODES NODELIST(REASON)')
+if os.path.exists(path):
+    with open(path) as f:
+        for line in f:
+            print('%%s_[0-9] main uap user PD 0:00 1 (None)' %%
+                  line.split()[0])
+'''
+'''
+Stand-in for ``squeue`` that lists all jobs of the fake ``sbatch`` as
+pending.
+'''
+
+
+#############
+### probe ###
+#############
+
+
+class Timer(object):
+    '''
+    Wraps methods of classes to add up the time spent in them. Recursive
+    and nested calls of the same method are only counted once.
+    '''
+
+    def __init__(self):
+        self.seconds = OrderedDict()
+        self.calls = OrderedDict()
+
+    def wrap(self, owner, method, name):
+        function = getattr(owner, method)
+        depth = [0]
+        self.seconds[name] = 0.0
+        self.calls[name] = 0
+
+        def timed(*args, **kwargs):
+            depth[0] += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                if depth[0] == 0:
+                    self.seconds[name] += time.perf_counter() - start
+                    self.calls[name] += 1
+        setattr(owner, method, timed)
+
+    def measure(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.seconds[name] = time.perf_counter() - start
+        self.calls[name] = 1
+        return result
+
+
+def probe(config_path, no_tool_checks):
+    '''
+    Builds the pipeline of *config_path* in this interpreter and returns
+    the seconds and number of calls per phase.
+    '''
+    for path in ['', 'include', 'include/sources', 'include/steps',
+                 'include/subcommands']:
+        path = os.path.join(UAP_PATH, path)
+        if path not in sys.path:
+            sys.path.append(path)
+    os.environ['GIT_DIR'] = os.path.join(UAP_PATH, '.git')
+    os.environ['GIT_WORK_TREE'] = UAP_PATH
+    import abstract_step
+    import pipeline
+
+    timer = Timer()
+    timer.wrap(pipeline.Pipeline, '__init__', 'Pipeline.__init__')
+    timer.wrap(pipeline.Pipeline, 'read_config', 'read_config')
+    timer.wrap(pipeline.Pipeline, 'build_steps', 'build_steps')
+    # the runs of a step are declared on the first call
+    timer.wrap(abstract_step.AbstractStep, 'get_runs', 'declare runs')
+    timer.wrap(pipeline.Pipeline, 'check_tools', 'check_tools')
+
+    args = argparse.Namespace(
+        config=open(config_path), uap_path=UAP_PATH,
+        no_tool_checks=no_tool_checks, even_if_dirty=True, debugging=False,
+        verbose=0, run=list())
+    p = pipeline.Pipeline(arguments=args)
+    tasks = p.all_tasks_topologically_sorted
+    timer.measure('get_state', lambda: [task.get_task_state()
+                                        for task in tasks])
+    timer.measure('get_state (hash)', lambda: [
+        task.get_task_state(do_hash=True) for task in tasks])
+    timer.measure('check_ping_files', p.check_ping_files)
+    timer.measure('volatile files', p.check_volatile_files)
+    return OrderedDict([
+        ('tasks', len(tasks)),
+        ('seconds', timer.seconds),
+        ('calls', timer.calls)])
+
+
+###############
+### running ###
+###############
+
+
+def uap(args, config_path, arguments, env=None, check=True):
+    '''
+    Runs the uap subcommand *arguments* on *config_path* and returns the
+    wall clock seconds.
+    '''
+    command = [args.python, os.path.join(UAP_PATH, 'uap.py'),
+               os.path.basename(config_path)] + arguments
+    start = time.perf_counter()
+    process = subprocess.run(
+        command, cwd=os.path.dirname(config_path), env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - start
+    if check and process.returncode != 0:
+        raise RuntimeError('%s failed:\n%s' % (
+            ' '.join(command), process.stdout.decode(errors='replace')[-3000:]))
+    return seconds
+
+
+def run_probe(args, config_path, no_tool_checks):
+    command = [args.python, os.path.realpath(__file__), '--probe',
+               config_path]
+    if no_tool_checks:
+        command.append('--no-tool-checks')
+    output = subprocess.check_output(command, cwd=os.path.dirname(
+        config_path), stderr=subprocess.DEVNULL)
+    # the probe prints its result as last line
+    return json.loads(output.decode().strip().split('\n')[-1])
+
+
+def fake_cluster(directory, python):
+    '''
+    Writes the fake ``sbatch`` and ``squeue`` commands to *directory* and
+    returns an environment that finds them first.
+    '''
+    os.makedirs(directory)
+    for name, script in [('sbatch', FAKE_SBATCH), ('squeue', FAKE_SQUEUE)]:
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(script % {'python': python})
+        os.chmod(path, 0o755)
+    env = dict(os.environ)
+    env['PATH'] = directory + os.pathsep + env.get('PATH', '')
+    return env
+
+
+def benchmark(args, workdir):
+    import synthetic_pipeline
+
+    config_path = synthetic_pipeline.write_project(
+        os.path.join(workdir, 'project'), args.samples, args.steps)
+    tasks = synthetic_pipeline.task_count(args.samples, args.steps)
+    phases = OrderedDict()
+    results = OrderedDict([
+        ('samples', args.samples),
+        ('steps', args.steps),
+        ('tasks', tasks),
+        ('probe', run_probe(args, config_path, args.no_tool_checks)),
+        ('uap', phases)])
+
+    checks = ['--no-tool-checks'] if args.no_tool_checks else []
+    phases['status'] = uap(args, config_path, ['status'] + checks)
+    phases['status --no-tool-checks'] = uap(
+        args, config_path, ['status', '--no-tool-checks'])
+    phases['status --hash'] = uap(
+        args, config_path, ['status', '--hash'] + checks)
+
+    # the first tasks of the first copy step
+    width = len(str(args.samples))
+    runs = ['copy_1/sample_%0*d' % (width, index + 1)
+            for index in range(min(args.run_tasks, args.samples))]
+    seconds = uap(args, config_path, ['run-locally', '--even-if-dirty'] +
+                  checks + runs)
+    phases['run-locally'] = seconds
+    phases['run-locally per task'] = seconds / len(runs)
+    phases['status --hash (%d finished)' % len(runs)] = uap(
+        args, config_path, ['status', '--hash'] + checks)
+    phases['volatilize --details'] = uap(
+        args, config_path, ['volatilize', '--details'] + checks)
+
+    env = fake_cluster(os.path.join(workdir, 'bin'), sys.executable)
+    phases['submit-to-cluster'] = uap(
+        args, config_path, ['submit-to-cluster', '--cluster', 'slurm',
+                            '--even-if-dirty'] + checks, env=env)
+    phases['status (submitted)'] = uap(
+        args, config_path, ['status', '--cluster', 'slurm'] + checks,
+        env=env)
+    return results
+
+
+def report(results, baseline):
+    rows = list()
+    for name, seconds in results['probe']['seconds'].items():
+        rows.append(('probe', name, seconds))
+    for name, seconds in results['uap'].items():
+        rows.append(('uap', name, seconds))
+    previous = dict()
+    for kind in ['probe', 'uap']:
+        section = baseline.get(kind, {})
+        if kind == 'probe':
+            section = section.get('seconds', {})
+        for name, seconds in section.items():
+            previous[(kind, name)] = seconds
+    sys.stdout.write('%d samples x %d steps = %d tasks\n' % (
+        results['samples'], results['steps'], results['tasks']))
+    for kind, name, seconds in rows:
+        line = '%-6s %-36s %10.3f s' % (kind, name, seconds)
+        old = previous.get((kind, name))
+        if old:
+            line += '  %+.1f%%' % ((seconds / old - 1) * 100)
+        sys.stdout.write(line + '\n')
+
+
+def read_args():
+    default_python = os.path.join(UAP_PATH, 'python_env', 'bin', 'python')
+    parser = argparse.ArgumentParser(
+        description='benchmarks the bookkeeping of uap on a synthetic project')
+    parser.add_argument(
+        '--samples',
+        type=int,
+        default=100,
+        help='number of samples. Default: 100')
+    parser.add_argument(
+        '--steps',
+        type=int,
+        default=5,
+        help='number of processing steps. Default: 5')
+    parser.add_argument(
+        '--run-tasks',
+        type=int,
+        default=10,
+        help='number of tasks executed with run-locally. Default: 10')
+    parser.add_argument(
+        '--no-tool-checks',
+        action='store_true',
+        default=False,
+        help='skip the tool checks in all phases except the status that '
+        'measures them')
+    parser.add_argument(
+        '--python',
+        default=default_python,
+        help='interpreter of uap. Default: %s' % default_python)
+    parser.add_argument(
+        '--workdir',
+        default=None,
+        help='directory of the project, kept after the run. Default: a '
+        'temporary directory which is removed')
+    parser.add_argument(
+        '--output',
+        '-o',
+        default=None,
+        help='write the results as JSON to this file')
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='results of an earlier run to compare the timings with')
+    parser.add_argument(
+        '--probe',
+        default=None,
+        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main(args):
+    if args.probe is not None:
+        result = probe(args.probe, args.no_tool_checks)
+        sys.stdout.write('\n' + json.dumps(result) + '\n')
+        return 0
+
+    from run_benchmarks import git_commit, load_json, write_json
+
+    workdir = args.workdir
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix='uap-orchestration-')
+    elif os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    try:
+        results = benchmark(args, workdir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+    report(results, load_json(args.baseline) if args.baseline else {})
+    if args.output is not None:
+        results['commit'] = git_commit()
+        results['date'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        results['python'] = args.python
+        results.move_to_end('commit', last=False)
+        write_json(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(read_args()))
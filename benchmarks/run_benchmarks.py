@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+'''
+Runs the uap tools on seeded synthetic data (see generators) and reports
+records/s, MB/s of input and the peak resident memory of every run. The
+outputs are compared against the hashes in golden.json, so a faster tool
+is only faster if it still writes the same data.
+
+Every benchmark runs in its own directory with relative paths, so paths do
+not end up in the outputs. Gzipped outputs are hashed decompressed and
+.npz archives by their members, so a different compression level or
+timestamp does not count as change.
+
+The results are written as JSON with ``--output`` for regression tracking
+and can be compared to an earlier result file with ``--baseline``::
+
+    run_benchmarks.py --output before.json
+    # change a tool
+    run_benchmarks.py --baseline before.json
+'''
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict, namedtuple
+
+import generators
+
+BENCHMARKS_PATH = os.path.dirname(os.path.realpath(__file__))
+TOOLS_PATH = os.path.join(BENCHMARKS_PATH, '..', 'tools')
+GOLDEN_PATH = os.path.join(BENCHMARKS_PATH, 'golden.json')
+
+Size = namedtuple('Size', ['reads', 'genes', 'samples'])
+
+
+class Benchmark(object):
+    '''
+    A run of *tool* on the data *prepare* writes to the current directory.
+    *prepare* is called with the :class:`generators.Genome` and the
+    :data:`Size` of the run and returns the arguments of the tool and the
+    number of input records. The files in *outputs* and the redirected
+    *stdout* are compared against the golden hashes.
+    '''
+
+    def __init__(self, name, tool, prepare, outputs, stdin=None,
+                 stdout=None):
+        self.name = name
+        self.tool = tool
+        self.prepare = prepare
+        self.outputs = list(outputs)
+        self.stdin = stdin
+        self.stdout = stdout
+        if stdout is not None:
+            self.outputs.append(stdout)
+
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(tool, outputs, stdin=None, stdout=None):
+    '''
+    Registers the decorated prepare function as :class:`Benchmark` named
+    like the function.
+    '''
+    def register(prepare):
+        BENCHMARKS[prepare.__name__] = Benchmark(
+            prepare.__name__, tool, prepare, outputs, stdin, stdout)
+        return prepare
+    return register
+
+
+##################
+### benchmarks ###
+##################
+
+
+@benchmark('fix_cutadapt', ['out.fastq.gz'])
+def fix_cutadapt_single(genome, size):
+    records = generators.fastq(genome, ['in.fastq.gz'], size.reads)
+    return ['in.fastq.gz', 'out.fastq.gz'], records
+
+
+@benchmark('fix_cutadapt', ['out_R1.fastq.gz', 'out_R2.fastq.gz'])
+def fix_cutadapt_paired(genome, size):
+    records = generators.fastq(
+        genome, ['in_R1.fastq.gz', 'in_R2.fastq.gz'], size.reads)
+    return ['in_R1.fastq.gz', 'out_R1.fastq.gz',
+            '--R2-in', 'in_R2.fastq.gz',
+            '--R2-out', 'out_R2.fastq.gz'], 2 * records
+
+
+@benchmark('fix_make_segemehl_output_cufflinks_compatible', ['out.sam'])
+def fix_make_segemehl_output_cufflinks_compatible(genome, size):
+    records = generators.sam(genome, 'in.sam', size.reads, 's2c')
+    return ['in.sam', 'out.sam'], records
+
+
+@benchmark('fix_qnames', ['out.fastq'])
+def fix_qnames(genome, size):
+    records = generators.fastq(genome, ['in.fastq'], size.reads)
+    return ['in.fastq', 'out.fastq', '--filetype', 'FASTQ'], records
+
+
+@benchmark('fix_s2c', ['out.sam'])
+def fix_s2c(genome, size):
+    records = generators.sam(genome, 'in.sam', size.reads, 's2c')
+    return ['in.sam', 'out.sam'], records
+
+
+@benchmark('make_segemehl_output_cufflinks_compatible', [],
+           stdout='out.sam')
+def make_segemehl_output_cufflinks_compatible(genome, size):
+    records = generators.sam(genome, 'in.sam', size.reads)
+    return ['--sam', 'in.sam', '--outdir', '.'], records
+
+
+@benchmark('mate_pair_strand_switch', ['out.bed'])
+def mate_pair_strand_switch(genome, size):
+    records = generators.bed_pairs(genome, 'in.bed', size.reads)
+    return ['in.bed', 'out.bed'], records
+
+
+@benchmark('merge_genecounts', ['merged.txt'])
+def merge_genecounts(genome, size):
+    files = ['sample%d.txt' % index for index in range(size.samples)]
+    for index, path in enumerate(files):
+        generators.feature_counts(genome, path, size.genes,
+                                  sample_seed=index)
+    return ['--tool_name', 'fc', '--outpath', '.',
+            '--out_file_pattern', 'merged.txt', '--matrix'] + files, \
+        size.samples * size.genes
+
+
+@benchmark('merge_numpy_arrays', ['merged.npy', 'merged.labels.txt'])
+def merge_numpy_arrays(genome, size):
+    files = ['sample%d.npz' % index for index in range(size.samples)]
+    records = sum(generators.npz(genome, path, size.genes * 10, 4,
+                                 sample_seed=index)
+                  for index, path in enumerate(files))
+    return files + ['merged', '--format', 'npy'], records
+
+
+@benchmark('post_cufflinks_merge', ['out.gtf'])
+def post_cufflinks_merge(genome, size):
+    records = generators.gtf(genome, 'in.gtf', size.genes)
+    return ['in.gtf', 'out.gtf', '--remove-gencode'], records
+
+
+@benchmark('post_sawdust', ['out.sam', 'splits.sam', 'metrics.txt'])
+def post_sawdust(genome, size):
+    records = generators.sam(genome, 'in.sam', size.reads)
+    return ['in.sam', 'out.sam', '--logfile', 'metrics.txt',
+            '--outfile-splits', 'splits.sam',
+            '--library-type', 'fr-firststrand'], records
+
+
+@benchmark('post_sawdust', ['out.sam', 'splits.sam', 'metrics.txt'])
+def post_sawdust_unstranded(genome, size):
+    genome.write_fasta('genome.fa')
+    records = generators.sam(genome, 'in.sam', size.reads)
+    return ['in.sam', 'out.sam', '--logfile', 'metrics.txt',
+            '--outfile-splits', 'splits.sam',
+            '--library-type', 'fr-unstranded', '--genome', 'genome.fa'], \
+        records
+
+
+@benchmark('tcount2gcount', ['genes.tsv'])
+def tcount2gcount(genome, size):
+    generators.gtf(genome, 'annotation.gtf', size.genes)
+    records = generators.kallisto(genome, 'abundance.tsv', size.genes)
+    return ['--mapping-file', 'annotation.gtf', '--infile', 'abundance.tsv',
+            '--tool_name', 'kallisto', '--outfile', 'genes.tsv'], records
+
+
+@benchmark('tcount2gcount', ['genes.tsv'])
+def tcount2gcount_extended(genome, size):
+    generators.gtf(genome, 'annotation.gtf', size.genes)
+    records = generators.kallisto(genome, 'abundance.tsv', size.genes)
+    return ['--mapping-file', 'annotation.gtf', '--infile', 'abundance.tsv',
+            '--tool_name', 'kallisto', '--outfile', 'genes.tsv',
+            '--kallisto-extended'], records
+
+
+@benchmark('count_references', ['counts.txt'])
+def count_references(genome, size):
+    records = generators.sam(genome, 'in.sam', size.reads)
+    return ['in.sam', '--output', 'counts.txt'], records
+
+
+@benchmark('discardLargeSplitsAndPairs', ['out.sam', 'discarded.sam',
+                                          'stats.txt'])
+def discard_large_splits_and_pairs(genome, size):
+    records = generators.sam(genome, 's2c.sam', size.reads, 's2c')
+    return ['s2c.sam', 'out.sam', '--logfile', 'discarded.sam',
+            '--statsfile', 'stats.txt', '--N_splits', '2500',
+            '--M_mates', '500000'], records
+
+
+@benchmark('remove_reads_segemehl', [], stdin='in.sam', stdout='out.sam')
+def remove_reads_segemehl(genome, size):
+    records = generators.sam(genome, 'in.sam', size.reads)
+    return [], records
+
+
+###############
+### running ###
+###############
+
+
+def digest(path):
+    '''
+    Returns the sha256 of the content of *path*: decompressed for gzipped
+    files and of the member names and contents for zip archives.
+    '''
+    hasher = hashlib.sha256()
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                hasher.update(name.encode() + b'\0')
+                hasher.update(archive.read(name))
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+    return hasher.hexdigest()
+
+
+def execute(python, bench, arguments, directory):
+    '''
+    Runs the tool of *bench* in *directory* and returns the exit code, wall
+    clock seconds and peak resident memory in bytes.
+    '''
+    command = [python, os.path.join(TOOLS_PATH, bench.tool + '.py')] + \
+        arguments
+    stdin = open(os.path.join(directory, bench.stdin), 'rb') \
+        if bench.stdin is not None else subprocess.DEVNULL
+    stdout = open(os.path.join(directory, bench.stdout), 'wb') \
+        if bench.stdout is not None else subprocess.DEVNULL
+    try:
+        with open(os.path.join(directory, 'stderr.txt'), 'wb') as stderr:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, cwd=directory, stdin=stdin,
+                                       stdout=stdout, stderr=stderr)
+            # wait4 reports the resources of this process only
+            _, status, usage = os.wait4(process.pid, 0)
+            seconds = time.perf_counter() - start
+            process.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        for f in (stdin, stdout):
+            if hasattr(f, 'close'):
+                f.close()
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return process.returncode, seconds, usage.ru_maxrss * scale
+
+
+def run(bench, args, size, golden):
+    directory = os.path.join(args.workdir, bench.name)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        arguments, records = bench.prepare(
+            generators.Genome(args.seed), size)
+    finally:
+        os.chdir(cwd)
+    input_bytes = sum(entry.stat().st_size for entry in os.scandir(directory))
+
+    result = OrderedDict([('name', bench.name), ('tool', bench.tool),
+                          ('records', records), ('input bytes', input_bytes)])
+    timings = list()
+    peak = 0
+    for _ in range(args.repeat):
+        for output in bench.outputs:
+            path = os.path.join(directory, output)
+            if os.path.exists(path):
+                os.remove(path)
+        code, seconds, rss = execute(args.python, bench, arguments, directory)
+        peak = max(peak, rss)
+        if code != 0:
+            with open(os.path.join(directory, 'stderr.txt'), 'rb') as f:
+                result['status'] = 'failed'
+                result['exit code'] = code
+                result['stderr'] = f.read()[-2000:].decode(errors='replace')
+            return result
+        timings.append(seconds)
+
+    seconds = min(timings)
+    result['seconds'] = seconds
+    result['records/s'] = records / seconds
+    result['MB/s'] = input_bytes / 1e6 / seconds
+    result['peak RSS MB'] = peak / 1e6
+    result['outputs'] = OrderedDict(
+        (output, digest(os.path.join(directory, output))
+         if os.path.exists(os.path.join(directory, output)) else None)
+        for output in bench.outputs)
+
+    if golden is None:
+        result['status'] = 'no golden'
+    elif golden == result['outputs']:
+        result['status'] = 'ok'
+    else:
+        result['status'] = 'mismatch'
+        result['golden'] = golden
+    return result
+
+
+def golden_key(args):
+    return 'scale %g, seed %d' % (args.scale, args.seed)
+
+
+def load_json(path):
+    if not os.path.exists(path):
+        return dict()
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+        f.write('\n')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=BENCHMARKS_PATH,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline):
+    previous = dict((result['name'], result)
+                    for result in baseline.get('benchmarks', []))
+    sys.stdout.write('%-46s %10s %12s %9s %9s %10s\n' % (
+        'benchmark', 'seconds', 'records/s', 'MB/s', 'RSS MB',
+        'status'))
+    for result in results:
+        if 'seconds' not in result:
+            sys.stdout.write('%-46s %10s %12s %9s %9s %10s\n' % (
+                result['name'], '-', '-', '-', '-', result['status']))
+            continue
+        line = '%-46s %10.3f %12.0f %9.2f %9.1f %10s' % (
+            result['name'], result['seconds'], result['records/s'],
+            result['MB/s'], result['peak RSS MB'], result['status'])
+        old = previous.get(result['name'], {})
+        if 'seconds' in old:
+            line += '  %+.1f%% time' % (
+                (result['seconds'] / old['seconds'] - 1) * 100)
+        sys.stdout.write(line + '\n')
+
+
+def read_args():
+    default_python = os.path.join(BENCHMARKS_PATH, '..', 'python_env', 'bin',
+                                  'python')
+    if not os.path.exists(default_python):
+        default_python = sys.executable
+    parser = argparse.ArgumentParser(
+        description='benchmarks the uap tools on synthetic data')
+    parser.add_argument(
+        'names',
+        nargs='*',
+        help='benchmarks to run, default: all of %s' % ', '.join(BENCHMARKS))
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=1.0,
+        help='multiplies the size of the data (20000 reads and 2000 genes). '
+        'Default: 1')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=1,
+        help='seed of the synthetic data. Default: 1')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='runs of every benchmark, the fastest one is reported. '
+        'Default: 1')
+    parser.add_argument(
+        '--python',
+        default=default_python,
+        help='interpreter the tools are run with. Default: %s' %
+        default_python)
+    parser.add_argument(
+        '--workdir',
+        default=None,
+        help='directory for data and outputs, kept after the run. '
+        'Default: a temporary directory which is removed')
+    parser.add_argument(
+        '--output',
+        '-o',
+        default=None,
+        help='write the results as JSON to this file')
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='results of an earlier run to compare the timings with')
+    parser.add_argument(
+        '--update-golden',
+        action='store_true',
+        default=False,
+        help='store the output hashes of successful runs as golden hashes')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(unknown))
+    return args
+
+
+def main(args):
+    size = Size(reads=int(20000 * args.scale), genes=int(2000 * args.scale),
+                samples=4)
+    golden = load_json(GOLDEN_PATH)
+    key = golden_key(args)
+    temporary = args.workdir is None
+    if temporary:
+        args.workdir = tempfile.mkdtemp(prefix='uap-benchmarks-')
+
+    results = list()
+    try:
+        for name in args.names or BENCHMARKS:
+            results.append(run(BENCHMARKS[name], args, size,
+                               golden.get(name, {}).get(key)))
+            if results[-1]['status'] == 'failed':
+                sys.stderr.write('%s failed:\n%s\n' % (
+                    name, results[-1]['stderr']))
+    finally:
+        if temporary:
+            shutil.rmtree(args.workdir)
+
+    if args.update_golden:
+        for result in results:
+            if 'outputs' in result:
+                golden.setdefault(result['name'], {})[key] = \
+                    result['outputs']
+                result['status'] = 'updated'
+        write_json(GOLDEN_PATH, OrderedDict(sorted(golden.items())))
+
+    report(results, load_json(args.baseline) if args.baseline else {})
+    if args.output is not None:
+        write_json(args.output, OrderedDict([
+            ('commit', git_commit()),
+            ('date', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ('host', platform.node()),
+            ('platform', platform.platform()),
+            ('python', args.python),
+            ('scale', args.scale),
+            ('seed', args.seed),
+            ('repeat', args.repeat),
+            ('benchmarks', results)]))
+    return 1 if any(result['status'] in ('failed', 'mismatch')
+                    for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(read_args()))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+'''
+Writes uap projects of any size for benchmarks of uap itself: *samples*
+tiny text files, a ``raw_file_source`` step and a chain of *steps*
+processing steps. All but the last step copy every sample with
+``copy_file``, the last one concatenates all samples with ``cat_text``,
+so a project has ``samples * (steps - 1) + 1`` tasks, all of them cheap.
+The copies are marked ``_volatile``, so they can be volatilized.
+'''
+
+import argparse
+import os
+import sys
+
+import yaml
+
+
+def task_count(samples, steps):
+    '''
+    Returns the number of tasks of a project with *samples* samples and
+    *steps* processing steps.
+    '''
+    return samples * (steps - 1) + 1
+
+
+def config(samples, steps):
+    '''
+    Returns the configuration of a project with *samples* samples and
+    *steps* processing steps as dictionary. The data is expected in
+    ``data/`` next to the configuration.
+    '''
+    if steps < 2:
+        raise ValueError('A project needs at least 2 steps.')
+    step_config = dict()
+    step_config['samples (raw_file_source)'] = {
+        'pattern': 'data/sample_*.txt',
+        'group': r'(sample_\d+)\.txt'}
+    parent = 'samples/raw'
+    for index in range(1, steps):
+        name = 'copy_%d' % index
+        step_config['%s (copy_file)' % name] = {
+            '_depends': parent.split('/')[0],
+            '_connect': {'in/sequence': parent},
+            '_volatile': True}
+        parent = '%s/copied' % name
+    step_config['merged (cat_text)'] = {
+        '_depends': parent.split('/')[0],
+        '_connect': {'in/text': parent},
+        'filenameEnding': 'txt'}
+    return {
+        'destination_path': 'out',
+        'steps': step_config}
+
+
+def write_project(directory, samples, steps):
+    '''
+    Writes the data and the configuration ``project.yaml`` of a project with
+    *samples* samples and *steps* processing steps to *directory* and
+    returns the path of the configuration.
+    '''
+    for subdirectory in ['data', 'out']:
+        path = os.path.join(directory, subdirectory)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    width = len(str(samples))
+    for index in range(1, samples + 1):
+        name = 'sample_%0*d' % (width, index)
+        with open(os.path.join(directory, 'data', name + '.txt'), 'w') as f:
+            f.write('%s\n' % name)
+    config_path = os.path.join(directory, 'project.yaml')
+    with open(config_path, 'w') as f:
+        yaml.dump(config(samples, steps), f, default_flow_style=False)
+    return config_path
+
+
+def read_args():
+    parser = argparse.ArgumentParser(
+        description='writes a synthetic uap project of samples x steps tasks')
+    parser.add_argument(
+        'directory',
+        help='directory of the project')
+    parser.add_argument(
+        '--samples',
+        type=int,
+        default=100,
+        help='number of samples. Default: 100')
+    parser.add_argument(
+        '--steps',
+        type=int,
+        default=5,
+        help='number of processing steps (at least 2). Default: 5')
+    return parser.parse_args()
+
+
+def main(args):
+    path = write_project(args.directory, args.samples, args.steps)
+    sys.stdout.write('%s: %d tasks\n' % (
+        path, task_count(args.samples, args.steps)))
+
+
+if __name__ == '__main__':
+    main(read_args())
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+'''
+A SLURM stand-in that runs batch jobs on the local machine, to test the
+submission of uap without a cluster.
+
+The script is called through the links ``sbatch``, ``squeue`` and
+``scancel`` next to it and understands the subset of their options uap and
+its users need:
+
+- ``sbatch`` with array ranges (``--array=0-9``, ``1,3,5-7``, ``0-15:4``)
+  and ``%`` throttles (``--array=0-99%5``), dependencies
+  (``--dependency=afterany:1000:1001``, ``after``, ``afterok`` and
+  ``afternotok``, combined with ``,`` or ``?``), ``--cpus-per-task``,
+  ``--job-name``, ``--output``, ``--error`` with the ``%A``, ``%a``,
+  ``%j``, ``%x`` and ``%%`` patterns, ``--chdir``, ``--parsable`` and
+  ``#SBATCH`` lines in the script. Other options are ignored. Jobs that
+  request more cores than the pool has get all cores of the pool.
+- ``squeue`` lists pending and running jobs in the default format of SLURM,
+  pending array tasks folded to ``1000_[3-9%2]``. Finished jobs are not
+  listed. It supports ``--noheader``, ``--jobs`` and ``--array``.
+- ``scancel`` cancels jobs, array tasks (``1000_3``) or jobs by
+  ``--name``. Running tasks are killed with SIGTERM.
+
+The jobs are run by a scheduler daemon which is started by ``sbatch`` and
+``scancel`` when needed and exits when there is nothing left to run. It
+starts a task as soon as its dependencies are satisfied, its array
+throttle allows it and enough cores of the pool are free. The state of all
+jobs is kept in the directory ``$UAP_FAKE_SLURM_DIR`` (default:
+``~/.uap-fake-slurm``), the pool has ``$UAP_FAKE_SLURM_CORES`` cores
+(default: all cores of the machine). If the daemon is killed, its running
+tasks are marked ``NODE_FAIL`` by the next daemon, like jobs on a crashed
+node.
+'''
+
+import argparse
+import fcntl
+import getpass
+import json
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import time
+
+STATE_PATH = os.path.expanduser(
+    os.environ.get('UAP_FAKE_SLURM_DIR', '~/.uap-fake-slurm'))
+CORES = int(os.environ.get('UAP_FAKE_SLURM_CORES', os.cpu_count()))
+POLL_INTERVAL = 0.2
+FIRST_JOB_ID = 1000
+VERSION = 'slurm 20.11.9 (uap fake-slurm)'
+
+FINISHED_STATES = ['COMPLETED', 'FAILED', 'CANCELLED', 'NODE_FAIL']
+DEPENDENCY_TYPES = ['after', 'afterany', 'afterok', 'afternotok']
+
+
+class FakeSlurmError(Exception):
+    pass
+
+
+#############
+### state ###
+#############
+
+
+class State(object):
+    '''
+    The jobs in ``jobs.json`` of the state directory, locked for the
+    lifetime of the object::
+
+        with State() as state:
+            state.jobs[...]
+    '''
+
+    def __init__(self, exclusive=True):
+        self.exclusive = exclusive
+        self.path = os.path.join(STATE_PATH, 'jobs.json')
+
+    def __enter__(self):
+        os.makedirs(os.path.join(STATE_PATH, 'scripts'), exist_ok=True)
+        self.lock = open(os.path.join(STATE_PATH, 'jobs.lock'), 'a')
+        fcntl.flock(self.lock, fcntl.LOCK_EX if self.exclusive
+                    else fcntl.LOCK_SH)
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {'next_id': FIRST_JOB_ID, 'jobs': dict()}
+        self.next_id = data['next_id']
+        self.jobs = data['jobs']
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.exclusive and exc_type is None:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'next_id': self.next_id, 'jobs': self.jobs}, f)
+            os.replace(temp_path, self.path)
+        self.lock.close()
+
+    def tasks(self, *states):
+        '''
+        Yields job id, job and task id of all tasks in one of *states*, in
+        order of submission.
+        '''
+        for job_id in sorted(self.jobs, key=int):
+            job = self.jobs[job_id]
+            for task_id in job['order']:
+                if job['tasks'][task_id]['state'] in states:
+                    yield job_id, job, task_id
+
+
+def parse_array(spec):
+    '''
+    Returns the task ids and the throttle (0 if unlimited) of the array
+    specification *spec*, e.g. ``0-9:2,20%4``.
+    '''
+    throttle = 0
+    if '%' in spec:
+        spec, throttle = spec.split('%', 1)
+        throttle = int(throttle)
+    task_ids = list()
+    for part in spec.split(','):
+        match = re.match(r'^(\d+)(?:-(\d+)(?::(\d+))?)?$', part)
+        if not match:
+            raise FakeSlurmError('Invalid job array specification: %s' % spec)
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        step = int(match.group(3) or 1)
+        task_ids.extend(range(first, last + 1, step))
+    if not task_ids:
+        raise FakeSlurmError('Invalid job array specification: %s' % spec)
+    return sorted(set(task_ids)), throttle
+
+
+def parse_dependency(spec):
+    '''
+    Returns the dependency *spec* as list of ``[type, job id, task id]``
+    lists and whether all (``,``) or any (``?``) have to be satisfied.
+    '''
+    if ',' in spec and '?' in spec:
+        raise FakeSlurmError('Mixing "," and "?" in dependencies is not '
+                             'supported: %s' % spec)
+    separator = '?' if '?' in spec else ','
+    conditions = list()
+    for part in spec.split(separator):
+        kind, _, job_ids = part.partition(':')
+        if kind not in DEPENDENCY_TYPES or not job_ids:
+            raise FakeSlurmError('Invalid dependency specification: %s' %
+                                 part)
+        for job_id in job_ids.split(':'):
+            match = re.match(r'^(\d+)(?:_(\d+))?$', job_id)
+            if not match:
+                raise FakeSlurmError('Invalid job id in dependency: %s' %
+                                     job_id)
+            conditions.append([kind, match.group(1), match.group(2)])
+    return {'conditions': conditions, 'any': separator == '?'}
+
+
+def dependency_state(state, job):
+    '''
+    Returns ``True`` if the dependencies of *job* are satisfied, ``None``
+    if they may be satisfied later and ``False`` if they never will.
+    '''
+    if job['dependency'] is None:
+        return True
+    results = list()
+    for kind, job_id, task_id in job['dependency']['conditions']:
+        parent = state.jobs[job_id]
+        task_ids = parent['order'] if task_id is None else [task_id]
+        tasks = [parent['tasks'][i] for i in task_ids if i in parent['tasks']]
+        if kind == 'after':
+            results.append(True if all(t['state'] != 'PENDING' for t in tasks)
+                           else None)
+            continue
+        if not all(t['state'] in FINISHED_STATES for t in tasks):
+            results.append(None)
+        elif kind == 'afterany':
+            results.append(True)
+        elif kind == 'afterok':
+            results.append(all(t['state'] == 'COMPLETED' for t in tasks))
+        else:
+            results.append(any(t['state'] != 'COMPLETED' for t in tasks))
+    if job['dependency']['any']:
+        if True in results:
+            return True
+        return None if None in results else False
+    if False in results:
+        return False
+    return None if None in results else True
+
+
+##############
+### daemon ###
+##############
+
+
+def ensure_daemon():
+    '''
+    Starts the scheduler daemon if it is not running. Has to be called with
+    the state locked, so that the daemon cannot exit in between.
+    '''
+    with open(os.path.join(STATE_PATH, 'daemon.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    with open(os.path.join(STATE_PATH, 'daemon.log'), 'a') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.realpath(__file__), '--daemon'],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+            start_new_session=True, close_fds=True)
+
+
+def output_path(pattern, job_id, job, task_id):
+    replacements = {
+        'A': job_id,
+        'a': task_id if job['array'] else '4294967294',
+        'j': job_id,
+        'x': job['name'],
+        'N': 'localhost',
+        'u': job['user'],
+        '%': '%'}
+    path = re.sub(r'%(.)', lambda m: replacements.get(m.group(1),
+                                                     m.group(0)), pattern)
+    return os.path.join(job['cwd'], path)
+
+
+def start_task(job_id, job, task_id):
+    '''
+    Starts a task of *job* and returns its process.
+    '''
+    task = job['tasks'][task_id]
+    env = dict(job['env'])
+    env.update({
+        'SLURM_JOB_ID': job_id,
+        'SLURM_JOB_NAME': job['name'],
+        'SLURM_CPUS_PER_TASK': str(job['cpus']),
+        'SLURM_SUBMIT_DIR': job['cwd'],
+        'SLURM_JOB_NODELIST': 'localhost',
+        'SLURMD_NODENAME': 'localhost'})
+    if job['array']:
+        env.update({
+            'SLURM_ARRAY_JOB_ID': job_id,
+            'SLURM_ARRAY_TASK_ID': task_id,
+            'SLURM_ARRAY_TASK_COUNT': str(len(job['order'])),
+            'SLURM_ARRAY_TASK_MIN': job['order'][0],
+            'SLURM_ARRAY_TASK_MAX': job['order'][-1]})
+    stdout_path = output_path(job['stdout'], job_id, job, task_id)
+    stderr_path = output_path(job['stderr'] or job['stdout'], job_id, job,
+                              task_id)
+    stdout = open(stdout_path, 'a')
+    stderr = stdout if stderr_path == stdout_path else open(stderr_path, 'a')
+    try:
+        process = subprocess.Popen(
+            [job['script']], cwd=job['cwd'], env=env,
+            stdin=subprocess.DEVNULL, stdout=stdout, stderr=stderr,
+            start_new_session=True)
+    except OSError as e:
+        stderr.write('fake-slurm: cannot start %s: %s\n' % (job['script'], e))
+        process = None
+    finally:
+        stdout.close()
+        stderr.close()
+    task['state'] = 'RUNNING' if process else 'FAILED'
+    task['start'] = time.time()
+    task['pid'] = process.pid if process else None
+    return process
+
+
+def kill(task):
+    try:
+        os.killpg(task['pid'], signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, TypeError):
+        pass
+
+
+def daemon():
+    '''
+    Runs the scheduler until there is nothing left to run.
+    '''
+    lock = open(os.path.join(STATE_PATH, 'daemon.lock'), 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        # another daemon is already running
+        return
+    processes = dict()
+    with State() as state:
+        # tasks of a daemon that died
+        for job_id, job, task_id in state.tasks('RUNNING'):
+            task = job['tasks'][task_id]
+            task.update({'state': 'NODE_FAIL', 'end': time.time()})
+    while True:
+        with State() as state:
+            for (job_id, task_id), process in list(processes.items()):
+                returncode = process.poll()
+                if returncode is None:
+                    continue
+                del processes[(job_id, task_id)]
+                task = state.jobs[job_id]['tasks'][task_id]
+                if task['state'] == 'RUNNING':
+                    task['state'] = 'COMPLETED' if returncode == 0 \
+                        else 'FAILED'
+                task.update({'end': time.time(), 'exit_code': returncode})
+            free_cores = CORES - sum(
+                job['cpus'] for _, job, _ in state.tasks('RUNNING'))
+            pending = False
+            for job_id, job, task_id in state.tasks('PENDING'):
+                if not dependency_state(state, job):
+                    continue
+                running = sum(1 for t in job['tasks'].values()
+                              if t['state'] == 'RUNNING')
+                if job['throttle'] and running >= job['throttle']:
+                    pending = True
+                    continue
+                if job['cpus'] > free_cores:
+                    pending = True
+                    continue
+                process = start_task(job_id, job, task_id)
+                if process is not None:
+                    processes[(job_id, task_id)] = process
+                    free_cores -= job['cpus']
+                else:
+                    # failed tasks may satisfy dependencies
+                    pending = True
+            if not processes and not pending:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                return
+        time.sleep(POLL_INTERVAL)
+
+
+##############
+### sbatch ###
+##############
+
+
+def sbatch_parser():
+    parser = argparse.ArgumentParser(
+        prog='sbatch', description='submits a batch script to fake-slurm')
+    parser.add_argument('-V', '--version', action='store_true')
+    parser.add_argument('-a', '--array')
+    parser.add_argument('-c', '--cpus-per-task', type=int)
+    parser.add_argument('-d', '--dependency')
+    parser.add_argument('-D', '--chdir')
+    parser.add_argument('-e', '--error')
+    parser.add_argument('-J', '--job-name')
+    parser.add_argument('-o', '--output')
+    parser.add_argument('--parsable', action='store_true')
+    return parser
+
+
+def script_options(script):
+    '''
+    Returns the arguments of the ``#SBATCH`` lines at the beginning of
+    *script*.
+    '''
+    options = list()
+    for line in script.split('\n')[1:]:
+        line = line.strip()
+        if line.startswith('#SBATCH'):
+            options.extend(shlex.split(line[len('#SBATCH'):], comments=True))
+        elif line and not line.startswith('#'):
+            break
+    return options
+
+
+def sbatch(arguments):
+    parser = sbatch_parser()
+    args, unknown = parser.parse_known_args(arguments)
+    if args.version:
+        print(VERSION)
+        return 0
+    if not unknown or unknown[0].startswith('-'):
+        raise FakeSlurmError('A batch script is required.')
+    script_path = unknown.pop(0)
+    if unknown:
+        sys.stderr.write('sbatch: warning: ignoring %s\n' % ' '.join(unknown))
+    with open(script_path) as f:
+        script = f.read()
+    if not script.startswith('#!'):
+        raise FakeSlurmError('This does not look like a batch script. The '
+                             'first line must start with #!')
+    defaults, unknown = parser.parse_known_args(script_options(script))
+    for key, value in vars(args).items():
+        if value is None or value is False:
+            setattr(args, key, getattr(defaults, key))
+    if unknown:
+        sys.stderr.write('sbatch: warning: ignoring %s\n' % ' '.join(unknown))
+
+    cpus = args.cpus_per_task or 1
+    if cpus > CORES:
+        # SLURM would reject the job, but the pool is only a stand-in
+        sys.stderr.write('sbatch: warning: %d cores requested, using the '
+                         '%d of the pool\n' % (cpus, CORES))
+        cpus = CORES
+    task_ids, throttle = [0], 0
+    if args.array:
+        task_ids, throttle = parse_array(args.array)
+    dependency = None
+    if args.dependency:
+        dependency = parse_dependency(args.dependency)
+    cwd = os.path.abspath(args.chdir or os.getcwd())
+    with State() as state:
+        for _, job_id, _ in (dependency or {}).get('conditions', []):
+            if job_id not in state.jobs:
+                raise FakeSlurmError('Job dependency problem: unknown job %s'
+                                     % job_id)
+        job_id = str(state.next_id)
+        state.next_id += 1
+        stored_script = os.path.join(STATE_PATH, 'scripts', job_id + '.sh')
+        with open(stored_script, 'w') as f:
+            f.write(script)
+        os.chmod(stored_script, 0o700)
+        default_output = 'slurm-%A_%a.out' if args.array else 'slurm-%j.out'
+        state.jobs[job_id] = {
+            'name': args.job_name or os.path.basename(script_path),
+            'script': stored_script,
+            'cwd': cwd,
+            'user': getpass.getuser(),
+            'env': dict(os.environ),
+            'cpus': cpus,
+            'array': bool(args.array),
+            'throttle': throttle,
+            'dependency': dependency,
+            'stdout': args.output or default_output,
+            'stderr': args.error,
+            'submit': time.time(),
+            'order': [str(i) for i in task_ids],
+            'tasks': {str(i): {'state': 'PENDING'} for i in task_ids}}
+        ensure_daemon()
+    if args.parsable:
+        print(job_id)
+    else:
+        print('Submitted batch job %s' % job_id)
+    return 0
+
+
+##############
+### squeue ###
+##############
+
+
+def fold(task_ids):
+    '''
+    Returns the sorted numbers *task_ids* as range string, e.g. ``1-3,5``.
+    '''
+    ranges = list()
+    for task_id in sorted(int(i) for i in task_ids):
+        if ranges and ranges[-1][1] == task_id - 1:
+            ranges[-1][1] = task_id
+        else:
+            ranges.append([task_id, task_id])
+    return ','.join(str(a) if a == b else '%d-%d' % (a, b) for a, b in ranges)
+
+
+def elapsed(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+    return '%d:%02d' % (minutes, seconds)
+
+
+def pending_reason(state, job):
+    satisfied = dependency_state(state, job)
+    if satisfied is None:
+        return 'Dependency'
+    if satisfied is False:
+        return 'DependencyNeverSatisfied'
+    running = sum(1 for t in job['tasks'].values() if t['state'] == 'RUNNING')
+    if job['throttle'] and running >= job['throttle']:
+        return 'JobArrayTaskLimit'
+    return 'Resources'
+
+
+def squeue(arguments):
+    parser = argparse.ArgumentParser(
+        prog='squeue', description='lists the jobs of fake-slurm',
+        add_help=False)
+    parser.add_argument('--help', action='help')
+    parser.add_argument('-V', '--version', action='store_true')
+    parser.add_argument('-h', '--noheader', action='store_true')
+    parser.add_argument('-j', '--jobs')
+    parser.add_argument('-r', '--array', action='store_true')
+    parser.add_argument('-u', '--user')
+    parser.add_argument('--me', action='store_true')
+    args = parser.parse_args(arguments)
+    if args.version:
+        print(VERSION)
+        return 0
+    selected = set(args.jobs.split(',')) if args.jobs else None
+
+    rows = list()
+    now = time.time()
+    with State(exclusive=False) as state:
+        for job_id in sorted(state.jobs, key=int):
+            if selected is not None and job_id not in selected:
+                continue
+            job = state.jobs[job_id]
+            user = job['user'][:8]
+            name = job['name'][:8]
+            for task_id in job['order']:
+                task = job['tasks'][task_id]
+                if task['state'] != 'RUNNING':
+                    continue
+                label = '%s_%s' % (job_id, task_id) if job['array'] \
+                    else job_id
+                rows.append((label, name, user, 'R',
+                             elapsed(now - task['start']), 'localhost'))
+            pending = [i for i in job['order']
+                       if job['tasks'][i]['state'] == 'PENDING']
+            if not pending:
+                continue
+            reason = '(%s)' % pending_reason(state, job)
+            if not job['array']:
+                labels = [job_id]
+            elif args.array:
+                labels = ['%s_%s' % (job_id, i) for i in pending]
+            else:
+                throttle = '%%%d' % job['throttle'] if job['throttle'] else ''
+                folded = fold(pending)
+                if len(pending) > 1 or throttle:
+                    folded = '[%s%s]' % (folded, throttle)
+                labels = ['%s_%s' % (job_id, folded)]
+            for label in labels:
+                rows.append((label, name, user, 'PD', '0:00', reason))
+
+    if not args.noheader:
+        print('%18s %9s %8s %8s %2s %10s %5s %s' % (
+            'JOBID', 'PARTITION', 'NAME', 'USER', 'ST', 'TIME', 'NODES',
+            'NODELIST(REASON)'))
+    for label, name, user, st, time_used, nodelist in rows:
+        print('%18s %9s %8s %8s %2s %10s %5d %s' % (
+            label, 'local', name, user, st, time_used, 1, nodelist))
+    return 0
+
+
+###############
+### scancel ###
+###############
+
+
+def scancel(arguments):
+    parser = argparse.ArgumentParser(
+        prog='scancel', description='cancels jobs of fake-slurm')
+    parser.add_argument('-n', '--name')
+    parser.add_argument('-u', '--user')
+    parser.add_argument('job_ids', nargs='*')
+    args = parser.parse_args(arguments)
+    if not args.job_ids and not args.name and not args.user:
+        raise FakeSlurmError('No job identification provided')
+
+    with State() as state:
+        targets = list()
+        for job_id in args.job_ids:
+            match = re.match(r'^(\d+)(?:_(\d+))?$', job_id)
+            if not match or match.group(1) not in state.jobs:
+                sys.stderr.write('scancel: error: Invalid job id %s\n' %
+                                 job_id)
+                continue
+            targets.append(match.groups())
+        for job_id, job in state.jobs.items():
+            if (args.name and job['name'] == args.name) or \
+                    (args.user and job['user'] == args.user):
+                targets.append((job_id, None))
+        for job_id, task_id in targets:
+            job = state.jobs[job_id]
+            for i in job['order'] if task_id is None else [task_id]:
+                task = job['tasks'].get(i)
+                if task is None or task['state'] in FINISHED_STATES:
+                    continue
+                if task['state'] == 'RUNNING':
+                    kill(task)
+                task.update({'state': 'CANCELLED', 'end': time.time()})
+        # cancelled jobs may satisfy 'afterany' dependencies
+        if any(state.tasks('PENDING')):
+            ensure_daemon()
+    return 0
+
+
+def main():
+    command = os.path.basename(sys.argv[0])
+    arguments = sys.argv[1:]
+    if arguments[:1] == ['--daemon']:
+        daemon()
+        return 0
+    commands = {'sbatch': sbatch, 'squeue': squeue, 'scancel': scancel}
+    if command not in commands:
+        # called as fake_slurm.py <command> ...
+        if not arguments or arguments[0] not in commands:
+            sys.stderr.write('usage: %s {%s} ...\n' % (
+                command, ','.join(sorted(commands))))
+            return 2
+        command = arguments.pop(0)
+    try:
+        return commands[command](arguments)
+    except (FakeSlurmError, OSError) as e:
+        sys.stderr.write('%s: error: %s\n' % (command, e))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,18 @@
 from .import abstract_step
 from .import command
 from .import exec_group
+from .import file_io
 from .import fscache
+from .import indexed_fasta
 from .import misc
 from .import pipeline
 from .import pipeline_info
 from .import process_pool
+from .import record_io
 from .import run
 from .import task
+from .import tracing
 
-__all__ = ['abstract_step', 'command', 'exec_group', 'fscache', 'misc',
-           'pipeline', 'pipeline_info', 'process_pool', 'run', 'task']
+__all__ = ['abstract_step', 'command', 'exec_group', 'file_io', 'fscache',
+           'indexed_fasta', 'misc', 'pipeline', 'pipeline_info',
+           'process_pool', 'record_io', 'run', 'task', 'tracing']
@@ -30,9 +30,11 @@ import yaml
 from uaperrors import UAPError
 from connections_collector import ConnectionsCollector
 import command as command_info
+import file_io
 import misc
 import process_pool
 import pipeline_info
+import tracing
 from run import Run
 
 abs_path = os.path.dirname(os.path.realpath(__file__))
@@ -403,7 +405,9 @@ class AbstractStep(object):
                 return dict()
 
             self._runs = dict()
-            self.declare_runs()
+            with tracing.span('declare_runs', 'step',
+                              args={'step': str(self)}):
+                self.declare_runs()
 
             # define file dependencies
             for run_id in self._runs.keys():
@@ -619,8 +623,11 @@ class AbstractStep(object):
         self._state = AbstractStep.states.EXECUTING
         base_working_dir = os.getcwd()
         os.chdir(run.get_temp_output_directory())
+        task_args = {'task': '%s/%s' % (self, run_id)}
         try:
-            self.execute(run_id, run)
+            with tracing.span('execute', 'run', profile=True,
+                              args=task_args):
+                self.execute(run_id, run)
         except BaseException:
             # Oh my. We have a situation. This is awkward. Tell the process
             # pool to wrap up. This way, we can try to get process stats before
@@ -708,51 +715,90 @@ class AbstractStep(object):
                 show_progress = True
             else:
                 show_progress = False
-            try:
-                def stop(signum, frame):
-                    raise SignalError(signum)
-                original_term_handler = signal.signal(signal.SIGTERM, stop)
-                original_int_handler = signal.signal(signal.SIGINT, stop)
-                pool = multiprocessing.Pool(self.get_cores())
-                total = len(to_be_moved)
-                file_iter = pool.imap(misc.sha_and_file, to_be_moved.keys())
-                file_iter = tqdm(
-                    file_iter,
-                    total=total,
-                    leave=False,
-                    bar_format='{desc}:{percentage:3.0f}%|{bar:10}{r_bar}',
-                    disable=not show_progress,
-                    desc='files')
-                for i, (hashsum, path) in enumerate(file_iter):
-                    run.fsc.sha256sum_of(to_be_moved[path], value=hashsum)
-                    known_paths[to_be_moved[path]]['sha256'] = hashsum
-                    if not show_progress:
-                        logger.info("sha256 [%d/%d] %s %s" %
-                                    (i + 1, total, hashsum, path))
-            except BaseException:
-                caught_exception = sys.exc_info()
+            with tracing.span('hashing', 'run', profile=True,
+                              args=task_args):
                 try:
-                    # removing the progress bar
-                    file_iter.close()
+                    def stop(signum, frame):
+                        raise SignalError(signum)
+                    original_term_handler = signal.signal(signal.SIGTERM, stop)
+                    original_int_handler = signal.signal(signal.SIGINT, stop)
+                    pool = multiprocessing.Pool(self.get_cores(),
+                                                misc.default_sigterm)
+                    # files larger than the chunk size get a tree hash
+                    # so their chunks can be hashed in parallel
+                    chunk_size = p.config['hashing']['tree_chunk_size']
+                    hinted = self._use_hash_hints(
+                        run, to_be_moved, known_paths, chunk_size)
+                    tree_files = [path for path, new_path
+                                  in to_be_moved.items()
+                                  if path not in hinted and chunk_size and
+                                  known_paths[new_path]['size'] > chunk_size]
+                    plain_files = [path for path in to_be_moved.keys()
+                                   if path not in tree_files and
+                                   path not in hinted]
+                    total = len(plain_files)
+                    file_iter = pool.imap(misc.sha_and_file, plain_files)
+                    file_iter = tqdm(
+                        file_iter,
+                        total=total,
+                        leave=False,
+                        bar_format='{desc}:{percentage:3.0f}%|{bar:10}{r_bar}',
+                        disable=not show_progress,
+                        desc='files')
+                    for i, (hashsum, path) in enumerate(file_iter):
+                        run.fsc.sha256sum_of(to_be_moved[path], value=hashsum)
+                        known_paths[to_be_moved[path]]['sha256'] = hashsum
+                        if not show_progress:
+                            logger.info("sha256 [%d/%d] %s %s" %
+                                        (i + 1, total, hashsum, path))
+                    chunks = [chunk for path in tree_files
+                              for chunk in misc.file_chunks(path, chunk_size)]
+                    file_iter = pool.imap(misc.sha256sum_of_chunk, chunks)
+                    file_iter = tqdm(
+                        file_iter,
+                        total=len(chunks),
+                        leave=False,
+                        bar_format='{desc}:{percentage:3.0f}%|{bar:10}{r_bar}',
+                        disable=not show_progress,
+                        desc='chunks')
+                    chunk_hashes = {path: list() for path in tree_files}
+                    for (path, _, _), hashsum in zip(chunks, file_iter):
+                        chunk_hashes[path].append(hashsum)
+                    for i, path in enumerate(tree_files):
+                        tree = misc.tree_sha256(chunk_size, chunk_hashes[path])
+                        run.fsc.tree_sha256sum_of(
+                            to_be_moved[path], chunk_size, value=tree)
+                        known_paths[to_be_moved[path]]['sha256 tree'] = tree
+                        if not show_progress:
+                            logger.info("sha256 tree [%d/%d] %s %s" %
+                                        (i + 1, len(tree_files), tree['root'],
+                                         path))
                 except BaseException:
-                    pass
-                error = caught_exception[1]
-                if caught_exception[0] is SignalError:
-                    p.caught_signal = error.signum
-                logger.error(error)
-                if pool:
-                    pool.terminate()
-            else:
-                pool.close()
+                    caught_exception = sys.exc_info()
+                    try:
+                        # removing the progress bar
+                        file_iter.close()
+                    except BaseException:
+                        pass
+                    error = caught_exception[1]
+                    if caught_exception[0] is SignalError:
+                        p.caught_signal = error.signum
+                    logger.error(error)
+                    if pool:
+                        pool.terminate()
+                else:
+                    pool.close()
             signal.signal(signal.SIGTERM, original_term_handler)
             signal.signal(signal.SIGINT, original_int_handler)
 
         run.add_known_paths(known_paths)
         if not p.caught_signal and not caught_exception:
             try:
-                for source_path, new_path in to_be_moved.items():
-                    logger.debug("Moving %s to %s." % (source_path, new_path))
-                    os.rename(source_path, new_path)
+                with tracing.span('renames', 'run', args=task_args):
+                    for source_path, new_path in to_be_moved.items():
+                        logger.debug("Moving %s to %s." %
+                                     (source_path, new_path))
+                        os.rename(source_path, new_path)
             except BaseException:
                 caught_exception = sys.exc_info()
 
@@ -765,8 +811,10 @@ class AbstractStep(object):
         elif caught_exception is not None:
             error = ''.join(traceback.format_exception(
                     *caught_exception)[-2:]).strip()
-        annotation_path = run.write_annotation_file(
-            run.get_output_directory(), error=error, job_id=job_id)
+        with tracing.span('write_annotation', 'run', profile=True,
+                          args=task_args):
+            annotation_path = run.write_annotation_file(
+                run.get_output_directory(), error=error, job_id=job_id)
 
         kill_exec_ping()
         self._state = AbstractStep.states.DEFAULT
@@ -819,6 +867,39 @@ class AbstractStep(object):
         if pool is not None:
             pool.join()
 
+    def _use_hash_hints(self, run, to_be_moved, known_paths, chunk_size):
+        '''
+        Stores the hashes that tools left as hash hints (see
+        file_io.write_hash_hint) for the output files in *to_be_moved* and
+        returns the set of output files that need no further hashing.
+        '''
+        hinted = set()
+        for path, new_path in to_be_moved.items():
+            hint = file_io.pop_hash_hint(path)
+            if hint is None:
+                continue
+            if chunk_size and known_paths[new_path]['size'] > chunk_size:
+                if hint.get('chunk size') != chunk_size:
+                    continue
+                tree = misc.tree_sha256(chunk_size, hint['chunks'])
+                run.fsc.tree_sha256sum_of(new_path, chunk_size, value=tree)
+                known_paths[new_path]['sha256 tree'] = tree
+            else:
+                run.fsc.sha256sum_of(new_path, value=hint['sha256'])
+                known_paths[new_path]['sha256'] = hint['sha256']
+            logger.info("sha256 taken from hash hint of %s" % path)
+            hinted.add(path)
+        return hinted
+
+    def get_hash_hint_args(self):
+        '''
+        Returns the arguments for tools which hash their output while
+        writing it and leave a hash hint (e.g. ``transfer_file``). The tree
+        chunk size is passed in the environment, see
+        ``file_io.TREE_CHUNK_SIZE_VARIABLE``.
+        '''
+        return ['--hash-hint']
+
     def get_pre_commands(self):
         """
         Return dictionary with commands to execute before starting any other
@@ -12,6 +12,24 @@ from uaperrors import UAPError
 
 
 class ExecGroup(object):
+
+    DD_BLOCKSIZE = '2M'
+    '''
+    Block size used by ``dd`` in input and output streams if the step does not
+    define the option ``dd-blocksize``.
+    '''
+
+    PIGZ_BLOCKSIZE = '2048'
+    '''
+    Block size used by ``pigz`` in input and output streams if the step does
+    not define the option ``pigz-blocksize``.
+    '''
+
+    GZIP_SUFFIXES = ('.gz', '.gzip')
+    '''
+    File name suffixes that mark a file as gzip compressed.
+    '''
+
     def __init__(self, run):
         self._run = run
         self._pipes_and_commands = list()
@@ -39,6 +57,149 @@ class ExecGroup(object):
         self._pipes_and_commands.append(command)
         return command
 
+    def add_input_stream(self, path, cores=None, force_fifo=False):
+        '''
+        Returns a path from which the uncompressed content of *path* can be
+        read by a command of this exec group.
+
+        - uncompressed files are read directly and *path* is returned as is
+          unless *force_fifo* is set,
+        - gzipped files are decompressed by ``pigz`` with *cores* threads
+          (default: the cores of the step) into a fifo which is returned.
+
+        The block sizes are taken from the step options ``dd-blocksize`` and
+        ``pigz-blocksize`` if the step defines them.
+        '''
+        compressed = self.is_compressed(path)
+        if not compressed and not force_fifo:
+            return path
+        step = self._run.get_step()
+        fifo = self._run.add_temporary_file(
+            'in-fifo-%s' % os.path.basename(path))
+        self.add_command([step.get_tool('mkfifo'), fifo])
+        dd_blocksize = self.get_stream_option('dd-blocksize',
+                                              ExecGroup.DD_BLOCKSIZE)
+        if not compressed:
+            self.add_command([step.get_tool('dd'),
+                              'bs=%s' % dd_blocksize,
+                              'if=%s' % path,
+                              'of=%s' % fifo])
+            return fifo
+        with self.add_pipeline() as unzip_pipe:
+            unzip_pipe.add_command([step.get_tool('dd'),
+                                    'ibs=%s' % dd_blocksize,
+                                    'if=%s' % path])
+            unzip_pipe.add_command(self.pigz_command(cores, decompress=True))
+            unzip_pipe.add_command([step.get_tool('dd'),
+                                    'obs=%s' % dd_blocksize,
+                                    'of=%s' % fifo])
+        return fifo
+
+    def add_input_streams(self, path, count, cores=None):
+        '''
+        Returns a list of *count* paths from which the uncompressed content of
+        *path* can be read by concurrently running commands of this exec
+        group.
+
+        Uncompressed files are read directly. Gzipped files are decompressed
+        only once and ``tee`` feeds the data into one fifo per consumer.
+        All consumers have to read their fifo at the same time, since the
+        slowest reader determines the speed of all others.
+        '''
+        if count < 1:
+            raise UAPError('At least one input stream is needed for %s.'
+                           % path)
+        if not self.is_compressed(path):
+            return [path] * count
+        if count == 1:
+            return [self.add_input_stream(path, cores=cores)]
+        step = self._run.get_step()
+        fifos = [self._run.add_temporary_file(
+                 'in-fifo-%s' % os.path.basename(path))
+                 for _ in range(count)]
+        self.add_command([step.get_tool('mkfifo')] + fifos)
+        dd_blocksize = self.get_stream_option('dd-blocksize',
+                                              ExecGroup.DD_BLOCKSIZE)
+        with self.add_pipeline() as unzip_pipe:
+            unzip_pipe.add_command([step.get_tool('dd'),
+                                    'ibs=%s' % dd_blocksize,
+                                    'if=%s' % path])
+            unzip_pipe.add_command(self.pigz_command(cores, decompress=True))
+            unzip_pipe.add_command([step.get_tool('tee')] + fifos[:-1])
+            unzip_pipe.add_command([step.get_tool('dd'),
+                                    'obs=%s' % dd_blocksize,
+                                    'of=%s' % fifos[-1]])
+        return fifos
+
+    def add_output_stream(self, path, compress=None, cores=None, level=None):
+        '''
+        Returns a path a command of this exec group can write uncompressed
+        data to which ends up in *path*.
+
+        If *compress* is ``None`` it is determined by the suffix of *path*.
+        Uncompressed output is written directly, so *path* is returned as is.
+        Otherwise a fifo is returned and its content is compressed by ``pigz``
+        with *cores* threads (default: the cores of the step) and the
+        compression *level* (default: that of ``pigz``) into *path*.
+        '''
+        if compress is None:
+            compress = self.is_compressed(path)
+        if not compress:
+            return path
+        step = self._run.get_step()
+        fifo = self._run.add_temporary_file(
+            'out-fifo-%s' % os.path.basename(path))
+        self.add_command([step.get_tool('mkfifo'), fifo])
+        dd_blocksize = self.get_stream_option('dd-blocksize',
+                                              ExecGroup.DD_BLOCKSIZE)
+        with self.add_pipeline() as zip_pipe:
+            zip_pipe.add_command([step.get_tool('dd'),
+                                  'ibs=%s' % dd_blocksize,
+                                  'if=%s' % fifo])
+            zip_pipe.add_command(self.pigz_command(cores, level=level))
+            zip_pipe.add_command([step.get_tool('dd'),
+                                  'obs=%s' % dd_blocksize,
+                                  'of=%s' % path])
+        return fifo
+
+    @staticmethod
+    def is_compressed(path):
+        '''
+        Returns True if *path* has a gzip suffix.
+        '''
+        return os.path.splitext(path)[1] in ExecGroup.GZIP_SUFFIXES
+
+    def get_stream_option(self, key, default):
+        '''
+        Returns the step option *key*, e.g. ``dd-blocksize``, or *default* if
+        the step does not define it or it is not set.
+        '''
+        # get_options() includes the defaults of all defined options
+        value = self._run.get_step().get_options().get(key)
+        if value is None:
+            return default
+        return value
+
+    def pigz_command(self, cores=None, decompress=False, level=None):
+        '''
+        Returns a ``pigz`` command that (de)compresses stdin to stdout with
+        *cores* threads (default: the cores of the step) and the compression
+        *level* (default: that of ``pigz``).
+        '''
+        step = self._run.get_step()
+        if cores is None:
+            cores = step.get_cores()
+        pigz = [step.get_tool('pigz'), '--processes', str(cores)]
+        if decompress:
+            pigz.append('--decompress')
+        elif level is not None:
+            pigz.append('-%d' % level)
+        pigz.extend(['--blocksize',
+                     self.get_stream_option('pigz-blocksize',
+                                            ExecGroup.PIGZ_BLOCKSIZE),
+                     '--stdout'])
+        return pigz
+
     def get_pipes_and_commands(self, sort=False):
         if sort is not True:
             return self._pipes_and_commands
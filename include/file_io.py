@@ -0,0 +1,415 @@
+'''
+Sequential I/O for large files, used to hash and copy output files.
+
+Files are read in large blocks. The kernel is told about the sequential
+access pattern and every consumed range is dropped from the page cache
+afterwards, so hashing a finished project does not evict the working set
+of other jobs running on the same node. Optionally, the number of
+concurrent readers per file system and node can be limited.
+
+Files are copied as hardlinks or reflinks where possible and inside the
+kernel otherwise. Tools that have to move the data anyway hash it on the
+way and leave a hash hint, so uap does not read their output again.
+'''
+
+import errno
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+BLOCK_SIZE = 8 * 1024 * 1024
+'''
+Number of bytes read at once.
+'''
+
+USE_MMAP = False
+'''
+Read files through a memory map instead of read calls.
+'''
+
+DROP_CACHE = True
+'''
+Drop consumed ranges from the page cache.
+'''
+
+IO_SLOTS = 0
+'''
+Maximal number of files read concurrently from the same file system on this
+node. A value of 0 means no limit.
+'''
+
+FICLONE = 0x40049409
+'''
+Linux ioctl request that makes a file share the extents of another file.
+'''
+
+HASH_HINT_SUFFIX = '.uap-sha256'
+'''
+Suffix of the files in which tools store the hashes of an output file they
+computed while writing it, see write_hash_hint().
+'''
+
+TREE_CHUNK_SIZE_VARIABLE = 'UAP_TREE_CHUNK_SIZE'
+'''
+Environment variable through which uap passes ``hashing: tree_chunk_size``
+to the tools it runs. It is not part of their commands, so changing it does
+not mark finished runs as changed.
+'''
+
+
+def tree_chunk_size_from_env():
+    '''
+    Returns the tree chunk size set by uap in the environment or 0.
+    '''
+    return int(os.environ.get(TREE_CHUNK_SIZE_VARIABLE, 0))
+
+
+def configure(block_size=None, use_mmap=None, drop_cache=None,
+              io_slots=None):
+    '''
+    Set the module wide I/O parameters. Unset parameters are left unchanged.
+    '''
+    global BLOCK_SIZE, USE_MMAP, DROP_CACHE, IO_SLOTS
+    if block_size is not None:
+        BLOCK_SIZE = block_size
+    if use_mmap is not None:
+        USE_MMAP = use_mmap
+    if drop_cache is not None:
+        DROP_CACHE = drop_cache
+    if io_slots is not None:
+        IO_SLOTS = io_slots
+
+
+def _fadvise(fd, offset, length, advice):
+    # not every platform and file system supports advice
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except (AttributeError, OSError):
+        pass
+
+
+def _read_blocks(fd, offset, size):
+    os.lseek(fd, offset, os.SEEK_SET)
+    while size > 0:
+        block = os.read(fd, min(size, BLOCK_SIZE))
+        if not block:
+            break
+        yield block
+        if DROP_CACHE:
+            _fadvise(fd, offset, len(block), os.POSIX_FADV_DONTNEED)
+        offset += len(block)
+        size -= len(block)
+
+
+def _mmap_blocks(fd, offset, size):
+    # the mapping has to start at a multiple of the allocation granularity
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with mmap.mmap(fd, size + offset - start, offset=start,
+                   access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, 'madvise'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mm)
+        try:
+            position = offset - start
+            end = position + size
+            while position < end:
+                length = min(end - position, BLOCK_SIZE)
+                block = view[position:position + length]
+                try:
+                    yield block
+                finally:
+                    block.release()
+                if DROP_CACHE:
+                    _fadvise(fd, start + position, length,
+                             os.POSIX_FADV_DONTNEED)
+                position += length
+        finally:
+            view.release()
+
+
+def read_blocks(path, offset=0, size=None):
+    '''
+    Yields the content of *path* in blocks of BLOCK_SIZE bytes, starting at
+    *offset* and reading *size* bytes or up to the end of the file.
+    The blocks are bytes-like objects which are only valid until the next
+    block is requested.
+    '''
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        file_size = os.fstat(fd).st_size
+        if size is None or offset + size > file_size:
+            size = max(file_size - offset, 0)
+        _fadvise(fd, offset, size, os.POSIX_FADV_SEQUENTIAL)
+        if USE_MMAP and size > 0:
+            blocks = _mmap_blocks(fd, offset, size)
+        else:
+            blocks = _read_blocks(fd, offset, size)
+        for block in blocks:
+            yield block
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def io_slot(path):
+    '''
+    Context manager that waits until less than IO_SLOTS files of the file
+    system *path* resides on are read on this node.
+    '''
+    if IO_SLOTS <= 0:
+        yield
+        return
+    device = os.stat(path).st_dev
+    lock_files = [os.path.join(tempfile.gettempdir(),
+                               'uap-io-slot-%d-%d.lock' % (device, slot))
+                  for slot in range(IO_SLOTS)]
+    fd = None
+    while fd is None:
+        for lock_file in lock_files:
+            candidate = os.open(lock_file, os.O_WRONLY | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                os.close(candidate)
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            else:
+                fd = candidate
+                break
+        else:
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def hash_file(path, algorithm='sha256', offset=0, size=None):
+    '''
+    Returns the hexdigest of *path* computed with the passed hashlib
+    algorithm. Use *offset* and *size* to hash only a part of the file.
+    '''
+    hasher = hashlib.new(algorithm)
+    with io_slot(path):
+        for block in read_blocks(path, offset, size):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def tee_hash(source, targets=(), algorithm='sha256'):
+    '''
+    Reads the binary file object *source* up to its end, writes every block
+    to all binary file objects in *targets* and returns the hexdigest of the
+    data computed with the passed hashlib algorithm.
+    '''
+    hasher = hashlib.new(algorithm)
+    while True:
+        block = source.read(BLOCK_SIZE)
+        if not block:
+            break
+        hasher.update(block)
+        for target in targets:
+            target.write(block)
+    for target in targets:
+        target.flush()
+    return hasher.hexdigest()
+
+
+def _copy_file_range(source, target, count):
+    return os.copy_file_range(source, target, count)
+
+
+def _sendfile(source, target, count):
+    return os.sendfile(target, source, None, count)
+
+
+def _read_write(source, target, count):
+    block = os.read(source, min(count, BLOCK_SIZE))
+    view = memoryview(block)
+    while view:
+        view = view[os.write(target, view):]
+    return len(block)
+
+
+_COPY_METHODS = (_copy_file_range, _sendfile, _read_write)
+
+
+def _append_hashed(source, target, hasher):
+    copied = 0
+    while True:
+        block = os.read(source, BLOCK_SIZE)
+        if not block:
+            return copied
+        hasher.update(block)
+        view = memoryview(block)
+        while view:
+            view = view[os.write(target, view):]
+        copied += len(block)
+
+
+def append_file(path, target, hasher=None):
+    '''
+    Appends the content of *path* to the file descriptor *target* at its
+    current offset and returns the number of bytes copied. The data is
+    copied inside the kernel with copy_file_range (which shares the extents
+    on file systems with reflinks) or sendfile where possible, and read and
+    written in blocks otherwise. If a :class:`StreamHasher` is passed, the
+    data is always read and written, so it is hashed in the same pass.
+    '''
+    methods = list(_COPY_METHODS)
+    copied = 0
+    with open(path, 'rb') as f:
+        source = f.fileno()
+        if hasher is not None:
+            return _append_hashed(source, target, hasher)
+        size = os.fstat(source).st_size
+        while copied < size:
+            try:
+                count = methods[0](source, target,
+                                   min(size - copied, 1 << 30))
+            except (AttributeError, OSError):
+                # not supported by this Python, kernel or file system
+                if len(methods) == 1:
+                    raise
+                methods.pop(0)
+                continue
+            if count == 0:
+                break
+            copied += count
+    return copied
+
+
+def reflink(source, target):
+    '''
+    Makes the file descriptor *target* share all extents of the file
+    descriptor *source* (e.g. on Btrfs or XFS). Returns False if the
+    platform or file system does not support it.
+    '''
+    try:
+        fcntl.ioctl(target, FICLONE, source)
+    except OSError:
+        return False
+    return True
+
+
+def transfer_file(source, target, link=False, hasher=None, copy=True):
+    '''
+    Creates *target* with the content of *source* the cheapest way possible
+    and returns how, trying in this order:
+
+    - ``reflink``: *target* is a new file sharing the extents of *source*,
+    - ``hardlink``: *target* is the same file as *source*, only tried if
+      *link* is set,
+    - ``copy``: the data is copied with :func:`append_file`,
+    - ``symlink``: *target* links to *source*, instead of a copy if *copy*
+      is not set.
+
+    Only a copy moves data, so only a copy updates *hasher*.
+    '''
+    with open(source, 'rb') as fin:
+        with open(target, 'wb') as fout:
+            if reflink(fin.fileno(), fout.fileno()):
+                return 'reflink'
+    if link or not copy:
+        # links do not replace the empty file
+        os.remove(target)
+    if link:
+        try:
+            os.link(source, target)
+            return 'hardlink'
+        except OSError:
+            # e.g. a different file system or no permission
+            pass
+    if not copy:
+        os.symlink(os.path.abspath(source), target)
+        return 'symlink'
+    with open(target, 'wb') as fout:
+        append_file(source, fout.fileno(), hasher)
+    return 'copy'
+
+
+class StreamHasher(object):
+    '''
+    Computes the sha256 of the data passed to update() and, if *chunk_size*
+    is set, the sha256 of every chunk of *chunk_size* bytes, from which
+    :func:`misc.tree_sha256` builds the tree hash.
+    '''
+
+    def __init__(self, chunk_size=0):
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self.chunks = []
+        self.chunk = hashlib.sha256()
+        self.chunk_fill = 0
+
+    def update(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        if not self.chunk_size:
+            return
+        view = memoryview(data)
+        while view:
+            length = min(len(view), self.chunk_size - self.chunk_fill)
+            self.chunk.update(view[:length])
+            self.chunk_fill += length
+            view = view[length:]
+            if self.chunk_fill == self.chunk_size:
+                self.chunks.append(self.chunk.hexdigest())
+                self.chunk = hashlib.sha256()
+                self.chunk_fill = 0
+
+    def result(self):
+        '''
+        Returns the size, sha256 and, with a chunk size, the chunk hashes
+        of the data seen so far as dictionary.
+        '''
+        result = {'size': self.size, 'sha256': self.hasher.hexdigest()}
+        if self.chunk_size:
+            result['chunk size'] = self.chunk_size
+            result['chunks'] = list(self.chunks)
+            if self.chunk_fill:
+                result['chunks'].append(self.chunk.hexdigest())
+        return result
+
+
+def write_hash_hint(path, hasher):
+    '''
+    Stores the hashes of the :class:`StreamHasher` *hasher*, which saw all
+    data written to *path*, in a file next to *path*. uap uses the hint
+    instead of reading *path* again when it hashes the output files of a
+    run.
+    '''
+    hint = hasher.result()
+    stat = os.stat(path)
+    if hint['size'] != stat.st_size:
+        return
+    hint['mtime_ns'] = stat.st_mtime_ns
+    with open(path + HASH_HINT_SUFFIX, 'w') as f:
+        json.dump(hint, f)
+
+
+def pop_hash_hint(path):
+    '''
+    Removes the hash hint of *path* and returns it as written by
+    :func:`write_hash_hint`. Returns None if there is no hint or *path* was
+    changed after the hint was written.
+    '''
+    hint_path = path + HASH_HINT_SUFFIX
+    try:
+        with open(hint_path) as f:
+            hint = json.load(f)
+        os.unlink(hint_path)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(path)
+    if hint.get('size') != stat.st_size or \
+       hint.get('mtime_ns') != stat.st_mtime_ns:
+        return None
+    return hint
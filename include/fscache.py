@@ -55,6 +55,22 @@ class FSCache:
         self.cache['sha256sums'][path] = sha
         return sha
 
+    def tree_sha256sum_of(self, path, chunk_size, value=None):
+        if 'tree_sha256sums' not in self.cache:
+            self.cache['tree_sha256sums'] = dict()
+        key = (path, chunk_size)
+
+        if value is not None:
+            self.cache['tree_sha256sums'][key] = value
+            return value
+
+        if key in self.cache['tree_sha256sums']:
+            return self.cache['tree_sha256sums'][key]
+
+        tree = misc.tree_sha256sum_of(path, chunk_size)
+        self.cache['tree_sha256sums'][key] = tree
+        return tree
+
     def clear(self):
         self.cache = dict()
 
@@ -0,0 +1,323 @@
+'''
+Random access to the sequences of a FASTA file by coordinate.
+
+:class:`IndexedFasta` uses a ``.fai`` index (as written by
+``samtools faidx``) and reads substrings through a memory map, so opening a
+whole genome takes milliseconds and almost no memory. The index is created
+next to the FASTA file, or in the temp directory, if it does not exist.
+:class:`PackedFasta` holds the sequences 2-bit packed in memory instead.
+
+Usage example::
+
+    genome = open_fasta('genome.fa')
+    motif = genome['chr1'][1000:1004]
+'''
+
+import bisect
+import mmap
+import os
+import tempfile
+import zlib
+
+from uaperrors import UAPError
+
+
+class FaiEntry(object):
+    '''
+    One line of a ``.fai`` index.
+    '''
+    __slots__ = ('name', 'length', 'offset', 'line_bases', 'line_width')
+
+    def __init__(self, name, length, offset, line_bases, line_width):
+        self.name = name
+        self.length = length
+        self.offset = offset
+        self.line_bases = line_bases
+        self.line_width = line_width
+
+    def byte_offset(self, position):
+        '''
+        Returns the file offset of the base at *position*.
+        '''
+        return self.offset + (position // self.line_bases) * self.line_width \
+            + position % self.line_bases
+
+
+def read_fai(fai_path):
+    '''
+    Returns an ordered dict of :class:`FaiEntry` by sequence name.
+    '''
+    entries = dict()
+    with open(fai_path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 5:
+                raise UAPError('Invalid line in FASTA index %s: %s'
+                               % (fai_path, line))
+            entries[fields[0]] = FaiEntry(fields[0], *map(int, fields[1:5]))
+    return entries
+
+
+def build_fai(fasta_path):
+    '''
+    Scans *fasta_path* once and returns its index entries. All lines of a
+    sequence but the last have to be of the same length.
+    '''
+    entries = dict()
+    entry = None
+    last_line = False
+    offset = 0
+    with open(fasta_path, 'rb') as f:
+        for line in f:
+            offset += len(line)
+            if line.startswith(b'>'):
+                name = line[1:].split(None, 1)[0].decode() \
+                    if line[1:].strip() else ''
+                entry = FaiEntry(name, 0, offset, 0, 0)
+                entries[name] = entry
+                last_line = False
+                continue
+            if entry is None:
+                raise UAPError('%s does not start with a FASTA header.'
+                               % fasta_path)
+            bases = len(line.rstrip(b'\r\n'))
+            if bases == 0:
+                last_line = True
+                continue
+            if last_line:
+                raise UAPError('Sequence %s in %s has lines of different '
+                               'length.' % (entry.name, fasta_path))
+            if entry.line_bases == 0:
+                entry.line_bases = bases
+                entry.line_width = len(line)
+            elif bases != entry.line_bases or len(line) != entry.line_width:
+                # only the last line may be shorter
+                last_line = True
+                if bases > entry.line_bases:
+                    raise UAPError('Sequence %s in %s has lines of different '
+                                   'length.' % (entry.name, fasta_path))
+            entry.length += bases
+    return entries
+
+
+def write_fai(fai_path, entries):
+    '''
+    Writes the index *entries* to *fai_path*. The index is written to a
+    temporary file in the same directory and renamed, so concurrent jobs
+    never read a partial index.
+    '''
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(fai_path)), suffix='.fai')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for entry in entries.values():
+                f.write('%s\t%d\t%d\t%d\t%d\n' % (
+                    entry.name, entry.length, entry.offset,
+                    entry.line_bases, entry.line_width))
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, fai_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_fai(fasta_path, fai_path=None):
+    '''
+    Returns the index entries of *fasta_path*. The index is read from
+    *fai_path* (default: ``<fasta_path>.fai`` or a copy in the temp
+    directory) or created there if it is missing or older than the FASTA
+    file.
+    '''
+    fasta_mtime = os.stat(fasta_path).st_mtime
+    candidates = [fai_path] if fai_path else [
+        fasta_path + '.fai',
+        os.path.join(tempfile.gettempdir(), 'uap-%s-%d.fai' % (
+            os.path.basename(fasta_path),
+            zlib.crc32(os.path.abspath(fasta_path).encode())))]
+    for candidate in candidates:
+        if os.path.exists(candidate) and \
+           os.stat(candidate).st_mtime >= fasta_mtime:
+            return read_fai(candidate)
+    entries = build_fai(fasta_path)
+    for candidate in candidates:
+        try:
+            write_fai(candidate, entries)
+            break
+        except OSError:
+            continue
+    return entries
+
+
+class Sequence(object):
+    '''
+    A sequence of a FASTA file which returns substrings when sliced like a
+    string. Only slices with step 1 are supported.
+    '''
+    __slots__ = ('_fasta', '_name', '_length')
+
+    def __init__(self, fasta, name, length):
+        self._fasta = fasta
+        self._name = name
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, step = key.indices(self._length)
+            if step != 1:
+                raise UAPError('Sequences can only be sliced with step 1.')
+            if end <= start:
+                return ''
+            return self._fasta.fetch(self._name, start, end)
+        start, end, step = slice(key, key + 1 or None).indices(self._length)
+        if end <= start:
+            raise IndexError('%s has no position %d' % (self._name, key))
+        return self._fasta.fetch(self._name, start, end)
+
+    def __str__(self):
+        return self[:]
+
+
+class IndexedFasta(object):
+    '''
+    FASTA file accessed through a memory map and its ``.fai`` index.
+    ``fasta[name]`` returns a :class:`Sequence`, ``fetch(name, start, end)``
+    the bases from *start* up to, excluding, *end* (0-based).
+    '''
+
+    def __init__(self, fasta_path, fai_path=None):
+        self._entries = load_fai(fasta_path, fai_path)
+        self._file = open(fasta_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ) if size else b''
+        if hasattr(self._map, 'madvise'):
+            # junctions are looked up all over the genome
+            self._map.madvise(mmap.MADV_RANDOM)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __getitem__(self, name):
+        return Sequence(self, name, self._entries[name].length)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def fetch(self, name, start, end):
+        entry = self._entries[name]
+        start = max(start, 0)
+        end = min(end, entry.length)
+        if end <= start:
+            return ''
+        data = self._map[entry.byte_offset(start):
+                         entry.byte_offset(end - 1) + 1]
+        if entry.line_width != entry.line_bases:
+            data = data.replace(b'\n', b'').replace(b'\r', b'')
+        return data.decode('ascii')
+
+
+class PackedFasta(object):
+    '''
+    FASTA sequences held 2-bit packed in memory, a quarter of the size of
+    the plain sequence. All bases are returned in upper case; everything
+    that is not A, C, G or T is returned as N.
+    '''
+
+    _BASES = 'ACGT'
+
+    def __init__(self, fasta_path, fai_path=None):
+        import numpy
+        self._numpy = numpy
+        codes = numpy.full(256, 255, dtype=numpy.uint8)
+        for code, base in enumerate(self._BASES):
+            codes[ord(base)] = code
+            codes[ord(base.lower())] = code
+        self._packed = dict()
+        self._lengths = dict()
+        self._n_runs = dict()
+        with IndexedFasta(fasta_path, fai_path) as fasta:
+            for name, entry in fasta._entries.items():
+                raw = fasta._map[entry.offset:entry.byte_offset(
+                    entry.length - 1) + 1] if entry.length else b''
+                raw = raw.replace(b'\n', b'').replace(b'\r', b'')
+                seq = codes[numpy.frombuffer(raw, dtype=numpy.uint8)]
+                unknown = seq == 255
+                # runs of unknown bases as sorted (start, end) pairs
+                edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(
+                    ([False], unknown, [False])).astype(numpy.int8)))
+                self._n_runs[name] = (edges[0::2].tolist(),
+                                      edges[1::2].tolist())
+                seq[unknown] = 0
+                padded = numpy.zeros(-(-len(seq) // 4) * 4,
+                                     dtype=numpy.uint8)
+                padded[:len(seq)] = seq
+                quads = padded.reshape(-1, 4)
+                self._packed[name] = (quads[:, 0] << 6 | quads[:, 1] << 4 |
+                                      quads[:, 2] << 2 | quads[:, 3])
+                self._lengths[name] = entry.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def close(self):
+        pass
+
+    def __contains__(self, name):
+        return name in self._lengths
+
+    def __getitem__(self, name):
+        return Sequence(self, name, self._lengths[name])
+
+    def keys(self):
+        return self._lengths.keys()
+
+    def fetch(self, name, start, end):
+        numpy = self._numpy
+        start = max(start, 0)
+        end = min(end, self._lengths[name])
+        if end <= start:
+            return ''
+        packed = self._packed[name][start // 4:(end - 1) // 4 + 1]
+        codes = numpy.stack([packed >> 6, packed >> 4 & 3, packed >> 2 & 3,
+                             packed & 3], axis=1).ravel()
+        first = start - (start // 4) * 4
+        bases = bytearray(numpy.frombuffer(b'ACGT', dtype=numpy.uint8)[
+            codes[first:first + end - start]].tobytes())
+        starts, ends = self._n_runs[name]
+        run = max(bisect.bisect_right(starts, start) - 1, 0)
+        while run < len(starts) and starts[run] < end:
+            n_start = max(starts[run], start)
+            n_end = min(ends[run], end)
+            if n_start < n_end:
+                bases[n_start - start:n_end - start] = \
+                    b'N' * (n_end - n_start)
+            run += 1
+        return bases.decode('ascii')
+
+
+def open_fasta(fasta_path, packed=False, fai_path=None):
+    '''
+    Returns an :class:`IndexedFasta` or, if *packed* is set, a
+    :class:`PackedFasta` of *fasta_path*.
+    '''
+    if packed:
+        return PackedFasta(fasta_path, fai_path)
+    return IndexedFasta(fasta_path, fai_path)
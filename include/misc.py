@@ -2,12 +2,14 @@ from uaperrors import UAPError
 import sys
 import hashlib
 import json
+import multiprocessing
 from logging import getLogger
 import os
 import re
 import signal
 import yaml
 from collections import OrderedDict
+import file_io
 
 logger = getLogger('uap_logger')
 
@@ -190,24 +192,12 @@ def sha256sum_of(file):
     """
     Returns hexdigits of the sha256sum of the passed file.
     """
-    sha256sum = hashlib.sha256()
     try:
-        with open(file, 'rb') as f:
-            # the below exception is raised for large files
-            # this workaround reads the file in chunks and
-            # updates the sha256sum
-            while True:
-                # read file in 2MB chunks
-                buf = f.read(2 * 1024 * 1024)
-                if not buf:
-                    break
-                sha256sum.update(buf)
+        return file_io.hash_file(file)
     except BaseException:
         raise UAPError("Error while calculating SHA256sum "
                        "of %s" % file)
 
-    return sha256sum.hexdigest()
-
 
 def sha_and_file(file):
     '''
@@ -217,6 +207,96 @@ def sha_and_file(file):
     return sha256sum_of(file), file
 
 
+def default_sigterm():
+    '''
+    Restores the default SIGTERM handler. Designed as initializer of a
+    multiprocessing.Pool, so its workers do not inherit the handler of uap.
+    '''
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def sha256sum_of_chunk(chunk):
+    '''
+    Returns hexdigits of the sha256sum of a chunk of a file. The chunk is
+    passed as tuple (file, offset, size) so this function can be run in
+    multiprocessing.Pool().imap. The pool should be initialized with
+    default_sigterm.
+    '''
+    file, offset, size = chunk
+    try:
+        return file_io.hash_file(file, offset=offset, size=size)
+    except BaseException:
+        raise UAPError("Error while calculating SHA256sum of "
+                       "%s at offset %d" % (file, offset))
+
+
+def file_chunks(file, chunk_size):
+    '''
+    Returns a list of (file, offset, size) tuples covering the whole file.
+    '''
+    size = os.path.getsize(file)
+    return [(file, offset, min(chunk_size, size - offset))
+            for offset in range(0, size, chunk_size)]
+
+
+def tree_sha256(chunk_size, chunk_hashes):
+    '''
+    Returns the tree hash of a file as dictionary::
+
+        chunk size: <bytes per chunk>
+        chunks: [<sha256 of chunk 1>, <sha256 of chunk 2>, ...]
+        root: <sha256 of the concatenated binary chunk digests>
+    '''
+    root = hashlib.sha256()
+    for chunk_hash in chunk_hashes:
+        root.update(bytes.fromhex(chunk_hash))
+    return {
+        'chunk size': chunk_size,
+        'chunks': list(chunk_hashes),
+        'root': root.hexdigest()}
+
+
+def tree_sha256sum_of(file, chunk_size, processes=None):
+    '''
+    Returns the tree hash (see tree_sha256) of the passed file. The chunks
+    are hashed in parallel by a pool of *processes* processes, which defaults
+    to the number of CPUs available to this process.
+    '''
+    chunks = file_chunks(file, chunk_size)
+    if processes is None:
+        processes = len(os.sched_getaffinity(0))
+    processes = min(processes, len(chunks))
+    if processes < 2:
+        chunk_hashes = [sha256sum_of_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(processes, default_sigterm) as pool:
+            chunk_hashes = pool.map(sha256sum_of_chunk, chunks)
+    return tree_sha256(chunk_size, chunk_hashes)
+
+
+def changed_chunks(old_tree, new_tree):
+    '''
+    Returns a list of byte ranges (first, last) in which two tree hashes
+    with the same chunk size differ. Adjacent ranges are merged.
+    '''
+    chunk_size = old_tree['chunk size']
+    old_chunks = old_tree['chunks']
+    new_chunks = new_tree['chunks']
+    ranges = list()
+    for index in range(max(len(old_chunks), len(new_chunks))):
+        old = old_chunks[index] if index < len(old_chunks) else None
+        new = new_chunks[index] if index < len(new_chunks) else None
+        if old == new:
+            continue
+        first = index * chunk_size
+        last = first + chunk_size - 1
+        if ranges and ranges[-1][1] == first - 1:
+            ranges[-1] = (ranges[-1][0], last)
+        else:
+            ranges.append((first, last))
+    return ranges
+
+
 class UAPDumper(yaml.Dumper):
     # ensures indentation of lists
     def increase_indent(self, flow=False, indentless=False):
@@ -18,8 +18,10 @@ with warnings.catch_warnings():
 from tqdm import tqdm
 
 import abstract_step
+import file_io
 import misc
 import task as task_module
+import tracing
 from uaperrors import UAPError
 
 
@@ -292,6 +294,17 @@ class Pipeline(object):
         with open(self._cluster_config_path, 'r') as cluster_config_file:
             self._cluster_config = yaml.load(
                 cluster_config_file, Loader=yaml.FullLoader)
+        # commands given as relative path are part of uap
+        for cluster_type, cluster_config in self._cluster_config.items():
+            for key in ['submit', 'stat']:
+                command = cluster_config.get(key)
+                if command and os.sep in command \
+                        and not os.path.isabs(command):
+                    cluster_config[key] = os.path.join(self._uap_path, command)
+            test = cluster_config.get('identity_test')
+            if test and os.sep in test[0] and not os.path.isabs(test[0]):
+                cluster_config['identity_test'] = \
+                    [os.path.join(self._uap_path, test[0])] + test[1:]
 
         try:
             # set cluster type
@@ -409,14 +422,27 @@ class Pipeline(object):
             'lmod',
             'tools',
             'base_working_directory',
+            'hashing',
             'id'}
         '''
         A set of accepted keys in the config.
         '''
 
-        self.read_config(self.args.config)
+        self.known_hashing_keys = {
+            'tree_chunk_size',
+            'block_size',
+            'mmap',
+            'drop_cache',
+            'io_slots'}
+        '''
+        A set of accepted keys in the hashing section of the config.
+        '''
+
+        with tracing.span('read_config', 'pipeline', profile=True):
+            self.read_config(self.args.config)
         self.setup_lmod()
-        self.build_steps()
+        with tracing.span('build_steps', 'pipeline', profile=True):
+            self.build_steps()
 
         configured_tools = set(tool for tool, conf in
                                self.config['tools'].items() if not
@@ -426,32 +452,34 @@ class Pipeline(object):
             logger.warning('Unused tool(s): %s' % list(unused_tools))
 
         # collect all tasks
-        for step_name in self.topological_step_order:
-            step = self.get_step(step_name)
-            self.tasks_in_step[step_name] = list()
-            logger.debug("Collect now all tasks for step: %s" % step)
-            for run_index, run_id in enumerate(
-                    misc.natsorted(step.get_run_ids())):
-                task = task_module.Task(self, step, run_id, run_index)
-                # if any run of a step contains an exec_groups,
-                # the task (step/run) is added to the task list
-                run = step.get_run(run_id)
-                logger.debug("Step: %s, Run: %s" % (step, run_id))
-                run_has_exec_groups = False
-                if len(run.get_exec_groups()) > 0:
-                    run_has_exec_groups = True
-                if run_has_exec_groups:
-                    logger.debug("Task: %s" % task)
-                    self.all_tasks_topologically_sorted.append(task)
-                    self.tasks_in_step[step_name].append(task)
-                # Fail if multiple tasks with the same name exist
-                if str(task) in self.task_for_task_id:
-                    raise UAPError("Duplicate task ID %s." % task)
-                self.task_for_task_id[str(task)] = task
+        with tracing.span('collect tasks', 'pipeline', profile=True):
+            for step_name in self.topological_step_order:
+                step = self.get_step(step_name)
+                self.tasks_in_step[step_name] = list()
+                logger.debug("Collect now all tasks for step: %s" % step)
+                for run_index, run_id in enumerate(
+                        misc.natsorted(step.get_run_ids())):
+                    task = task_module.Task(self, step, run_id, run_index)
+                    # if any run of a step contains an exec_groups,
+                    # the task (step/run) is added to the task list
+                    run = step.get_run(run_id)
+                    logger.debug("Step: %s, Run: %s" % (step, run_id))
+                    run_has_exec_groups = False
+                    if len(run.get_exec_groups()) > 0:
+                        run_has_exec_groups = True
+                    if run_has_exec_groups:
+                        logger.debug("Task: %s" % task)
+                        self.all_tasks_topologically_sorted.append(task)
+                        self.tasks_in_step[step_name].append(task)
+                    # Fail if multiple tasks with the same name exist
+                    if str(task) in self.task_for_task_id:
+                        raise UAPError("Duplicate task ID %s." % task)
+                    self.task_for_task_id[str(task)] = task
 
         self.tool_versions = {}
         if not self.args.no_tool_checks:
-            self.check_tools()
+            with tracing.span('check_tools', 'pipeline', profile=True):
+                self.check_tools()
 
     def get_uap_path(self):
         return self._uap_path
@@ -589,6 +617,41 @@ class Pipeline(object):
             self.config['cluster'].setdefault(i, '')
         self.config['cluster'].setdefault('default_job_quota', 0)  # no quota
 
+        # hashing
+        if 'hashing' not in self.config or self.config['hashing'] is None:
+            self.config['hashing'] = dict()
+        for key in self.config['hashing'].keys():
+            if key not in self.known_hashing_keys:
+                raise UAPError('The key "%s" set in hashing is unknown.' % key)
+        # no tree hashes by default
+        self.config['hashing'].setdefault('tree_chunk_size', 0)
+        self.config['hashing'].setdefault('block_size', file_io.BLOCK_SIZE)
+        self.config['hashing'].setdefault('mmap', file_io.USE_MMAP)
+        self.config['hashing'].setdefault('drop_cache', file_io.DROP_CACHE)
+        # no limit of concurrent reads by default
+        self.config['hashing'].setdefault('io_slots', file_io.IO_SLOTS)
+        for key in ['tree_chunk_size', 'io_slots']:
+            value = self.config['hashing'][key]
+            if not isinstance(value, int) or value < 0:
+                raise UAPError('hashing: %s needs to be a non-negative '
+                               'integer, not %s.' % (key, value))
+        block_size = self.config['hashing']['block_size']
+        if not isinstance(block_size, int) or block_size < 1:
+            raise UAPError('hashing: block_size needs to be a positive '
+                           'integer, not %s.' % block_size)
+        for key in ['mmap', 'drop_cache']:
+            if not isinstance(self.config['hashing'][key], bool):
+                raise UAPError('hashing: %s needs to be a boolean, not %s.'
+                               % (key, self.config['hashing'][key]))
+        file_io.configure(
+            block_size=block_size,
+            use_mmap=self.config['hashing']['mmap'],
+            drop_cache=self.config['hashing']['drop_cache'],
+            io_slots=self.config['hashing']['io_slots'])
+        # tools that leave hash hints read the chunk size from here
+        os.environ[file_io.TREE_CHUNK_SIZE_VARIABLE] = \
+            str(self.config['hashing']['tree_chunk_size'])
+
     def build_steps(self):
         self.steps = {}
         if 'steps' not in self.config:
@@ -1040,6 +1103,9 @@ class Pipeline(object):
         # Let's see if we can successfully run a cluster identity test
         # Test all configured cluster types
         for cluster_type in cluster_config.keys():
+            if not cluster_config[cluster_type].get('autodetect', True):
+                # e.g. the fake scheduler which is always available
+                continue
             # Do we have an identity test command
             identity = dict()
             for key in ['test', 'answer']:
@@ -2,6 +2,7 @@
 
 """
 import command as command_info
+from uaperrors import UAPError
 
 
 class PipelineInfo(object):
@@ -23,6 +24,44 @@ class PipelineInfo(object):
         self._commands.append(command)
         return command
 
+    def add_input_stream(self, path, cores=None):
+        '''
+        Starts this pipeline with commands that write the uncompressed
+        content of *path* to stdout.
+
+        The file is read by ``dd`` and gzipped files are decompressed by
+        ``pigz`` with *cores* threads (default: the cores of the step).
+        '''
+        if self._commands:
+            raise UAPError('An input stream has to start the pipeline.')
+        eg = self.get_exec_group()
+        step = eg.get_run().get_step()
+        self.add_command([step.get_tool('dd'),
+                          'ibs=%s' % eg.get_stream_option(
+                              'dd-blocksize', eg.DD_BLOCKSIZE),
+                          'if=%s' % path])
+        if eg.is_compressed(path):
+            self.add_command(eg.pigz_command(cores, decompress=True))
+
+    def add_output_stream(self, path, compress=None, cores=None):
+        '''
+        Writes the stdout of the last command of this pipeline to *path*.
+
+        If *compress* is ``None`` it is determined by the suffix of *path*.
+        Compressed output is piped through ``pigz`` with *cores* threads
+        (default: the cores of the step) before it is written.
+        '''
+        if not self._commands:
+            raise UAPError('Cannot add an output stream to an empty pipeline.')
+        eg = self.get_exec_group()
+        if compress is None:
+            compress = eg.is_compressed(path)
+        if not compress:
+            self._commands[-1].set_stdout_path(path)
+            return path
+        self.add_command(eg.pigz_command(cores), stdout_path=path)
+        return path
+
     def get_commands(self):
         return self._commands
 
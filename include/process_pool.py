@@ -13,6 +13,7 @@ import fcntl
 import errno
 import datetime
 import copy
+import tracing
 from uaperrors import UAPError
 '''
 This module can be used to launch child processes and wait for them.
@@ -70,6 +71,18 @@ class ProcessPool(object):
     the buffer size which is used for writing.
     '''
 
+    THROUGHPUT_INTERVAL = 1.0
+    '''
+    Initial interval in seconds in which the throughput of every stream is
+    sampled.
+    '''
+
+    THROUGHPUT_SAMPLES = 100
+    '''
+    Maximum number of throughput samples per stream. If there would be
+    more, neighbouring samples are merged and the interval is doubled.
+    '''
+
     SIGTERM_TIMEOUT = 10
     '''
     After a SIGTERM signal is issued, wait this many seconds before going postal.
@@ -154,6 +167,9 @@ class ProcessPool(object):
         # list of commands to be launched
         self.launch_calls = []
 
+        # list of PID lists, one per pipeline or single command
+        self.pipelines = []
+
         # List of processes we killed deliberately. Look: every time a
         # within a pipeline exits, we SIGTERM its predecessor. This is
         # necessary because otherwise, stuff is hanging forever.
@@ -245,12 +261,16 @@ class ProcessPool(object):
             for module_load in module_loads:
                 self.load_unload_module(module_load)
 
+        run = self.get_run()
+        task_args = {'task': '%s/%s' % (run.get_step(), run.get_run_id())}
         # now launch all processes...
-        self._launch_all_processes()
+        with tracing.span('launch', 'process_pool', args=task_args):
+            self._launch_all_processes()
 
         # ...and wait until all child processes have exited
         try:
-            self._wait()
+            with tracing.span('wait', 'process_pool', args=task_args):
+                self._wait()
         except BaseException:
             # pass log to step even if there was a problem
             self.get_run().get_step().append_pipeline_log(self.get_log())
@@ -333,23 +353,67 @@ class ProcessPool(object):
         log['log'] = copy.deepcopy(self.log_entries)
         log['process_watcher'] = copy.deepcopy(self.process_watcher_report)
         log['ok_to_fail'] = copy.deepcopy(self.ok_to_fail)
+        log['pipelines'] = [self._pipeline_throughput(pids)
+                            for pids in self.pipelines]
 
         return log
 
+    def _pipeline_throughput(self, pids):
+        '''
+        Summarizes the stdout streams of the processes *pids* of a pipeline.
+
+        The stage whose stdout copy process waited longer for the stage
+        (reading) than for the next stage (writing) is the bottleneck: the
+        stages before it are slowed down by backpressure and the stages
+        after it are starved. If all copy processes mostly waited for
+        writing, the output file is the bottleneck.
+        '''
+        keys = ['length', 'seconds', 'bytes_per_second', 'read_blocked',
+                'write_blocked', 'short_writes', 'write_retries']
+        stages = list()
+        for pid in pids:
+            stage = {'pid': pid, 'name': self.proc_details[pid]['name']}
+            # the first copy process is the one for stdout
+            listener = self.copy_processes_for_pid.get(pid, [None])[0]
+            report = self.proc_details.get(listener, dict())
+            for key in keys:
+                if key in report:
+                    stage[key] = report[key]
+            stages.append(stage)
+        summary = {'stages': stages}
+        for key in ['read_blocked', 'write_blocked', 'short_writes',
+                    'write_retries']:
+            summary[key] = sum(stage.get(key, 0) for stage in stages)
+        summary['bottleneck'] = None
+        for stage in stages:
+            if 'read_blocked' not in stage:
+                continue
+            summary['bottleneck'] = stage['name']
+            if stage['read_blocked'] >= stage['write_blocked']:
+                break
+        else:
+            if summary['bottleneck'] is not None:
+                summary['bottleneck'] = 'output of %s' % summary['bottleneck']
+        return summary
+
     def _launch_all_processes(self):
         for info in self.launch_calls:
             if info.__class__ == ProcessPool.Pipeline:
                 pipeline = info
                 use_stdin = None
                 last_pid = None
+                pids = list()
                 for index, info in enumerate(pipeline.append_calls):
                     use_stdin, pid = self._do_launch(
                         info, index < len(pipeline.append_calls) - 1, use_stdin)
                     if last_pid is not None:
                         self.proc_details[pid]['use_stdin_of'] = last_pid
                     last_pid = pid
+                    pids.append(pid)
+                self.pipelines.append(pids)
             else:
-                self._do_launch(info)
+                _, pid = self._do_launch(info)
+                self.pipelines.append([pid])
 
     def _do_launch(self, info, keep_stdout_open=False, use_stdin=None):
         '''
@@ -449,6 +513,18 @@ class ProcessPool(object):
                         report['tail'] = tail.decode('utf-8', errors='ignore')
                         report['length'] = length
                         report['lines'] = newline_count
+                        # throughput and backpressure
+                        seconds = time.perf_counter() - start
+                        report['seconds'] = round(seconds, 3)
+                        report['bytes_per_second'] = \
+                            int(length / seconds) if seconds > 0 else 0
+                        report['read_blocked'] = round(read_blocked, 3)
+                        report['write_blocked'] = round(write_blocked, 3)
+                        report['short_writes'] = short_writes
+                        report['write_retries'] = write_retries
+                        sample_throughput(time.perf_counter(), final=True)
+                        report['throughput'] = throughput
+                        report['throughput_interval'] = interval
                         freport.write(yaml.dump(report))
                 except (IOError, LookupError) as e:
                     logger.error("Eror while writing %s (%s): %s" %
@@ -473,8 +549,66 @@ class ProcessPool(object):
             length = 0
             newline_count = 0
 
+            # seconds spent waiting for the process (reading) and for the
+            # output file or the next process (writing)
+            read_blocked = 0.0
+            write_blocked = 0.0
+            short_writes = 0
+            write_retries = 0
+            # [seconds since start, bytes/s] per interval
+            throughput = list()
+            interval = ProcessPool.THROUGHPUT_INTERVAL
+            start = time.perf_counter()
+            interval_start = start
+            interval_length = 0
+
+            def sample_throughput(now, final=False):
+                nonlocal interval, interval_start, interval_length
+                if now - interval_start < interval and \
+                        not (final and interval_length):
+                    return
+                throughput.append([
+                    round(interval_start - start, 3),
+                    int(interval_length / max(now - interval_start, 1e-6))])
+                interval_start = now
+                interval_length = 0
+                if len(throughput) > ProcessPool.THROUGHPUT_SAMPLES:
+                    # merge neighbouring samples
+                    merged = [[a[0], (a[1] + b[1]) // 2] for a, b in
+                              zip(throughput[::2], throughput[1::2])]
+                    if len(throughput) % 2:
+                        merged.append(throughput[-1])
+                    throughput[:] = merged
+                    interval *= 2
+
+            def write_block(fd, block):
+                '''
+                Writes all of *block* to *fd*, even if a write is short.
+                '''
+                nonlocal write_blocked, short_writes, write_retries
+                view = memoryview(block)
+                tries = 0
+                before = time.perf_counter()
+                while len(view) > 0:
+                    try:
+                        bytes_written = os.write(fd, view)
+                    except OSError:
+                        tries += 1
+                        write_retries += 1
+                        if tries == 5:
+                            raise
+                        time.sleep(.1)
+                        continue
+                    if bytes_written < len(view):
+                        short_writes += 1
+                    view = view[bytes_written:]
+                write_blocked += time.perf_counter() - before
+
             while True:
+                before = time.perf_counter()
                 block = fin.read(ProcessPool.COPY_BLOCK_SIZE)
+                after = time.perf_counter()
+                read_blocked += after - before
                 if len(block) == 0:
                     # fin reports EOF, let's call it a day
                     break
@@ -497,33 +631,14 @@ class ProcessPool(object):
 
                 # write block to output file
                 if fdout is not None:
-                    tries = 0
-                    bytes_written = None
-                    while not bytes_written:
-                        try:
-                            bytes_written = os.write(fdout, block)
-                        except OSError:
-                            tries += 1
-                            if tries == 5:
-                                raise
-                            time.sleep(.1)
-                    if bytes_written != len(block):
-                        os._exit(1)
+                    write_block(fdout, block)
 
                 # write block to pipe
                 if pipe is not None:
-                    tries = 0
-                    bytes_written = None
-                    while not bytes_written:
-                        try:
-                            bytes_written = os.write(pipe[1], block)
-                        except OSError:
-                            tries += 1
-                            if tries == 5:
-                                raise
-                            time.sleep(.1)
-                    if bytes_written != len(block):
-                        os._exit(2)
+                    write_block(pipe[1], block)
+
+                interval_length += len(block)
+                sample_throughput(time.perf_counter())
 
             # we're finished, close everything
             fin.close()
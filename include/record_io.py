@@ -0,0 +1,405 @@
+'''
+Buffered, bytes-level readers and writers for the line based formats the
+tools in ``tools/`` filter: FASTQ (single and paired), SAM and BED.
+
+Files are read and written in large blocks by background threads which also
+(de)compress gzipped data, so a filter only splits blocks into lines and
+fields. zlib releases the GIL, so the compression runs in parallel to the
+filter. Readers hand out lines without their newline in batches (lists of
+bytes) and writers take such batches back::
+
+    reader = SamReader(path)
+    with LineWriter('-') as writer:
+        writer.write_lines(reader.header)
+        for lines in reader.batches():
+            writer.write_lines(
+                line for line in lines if line.split(b'\\t', 2)[1] != b'4')
+
+Fields should be cut with ``line.split(b'\\t', n)`` up to the last field
+that is needed, the rest of the line stays one unparsed bytes object.
+'''
+
+import queue
+import sys
+import threading
+import zlib
+
+from uaperrors import UAPError
+
+BLOCK_SIZE = 4 * 1024 * 1024
+'''
+Number of bytes read or compressed at once.
+'''
+
+QUEUE_SIZE = 4
+'''
+Number of blocks buffered between a (de)compression thread and the filter.
+'''
+
+WRITE_BATCH_SIZE = 65536
+'''
+Number of lines collected by :meth:`LineWriter.write_line` before they are
+passed to the writer thread.
+'''
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _open(target, mode):
+    '''
+    Returns the binary file object for *target* and whether it has to be
+    closed. *target* is a path, ``-`` for stdin or stdout, or an open
+    binary file object.
+    '''
+    if target == '-':
+        stream = sys.stdin if 'r' in mode else sys.stdout
+        return stream.buffer, False
+    if isinstance(target, str):
+        return open(target, mode), True
+    return target, False
+
+
+def _name(target):
+    if isinstance(target, str):
+        return target
+    return getattr(target, 'name', repr(target))
+
+
+class BlockReader(threading.Thread):
+    '''
+    Reads a file or fifo in blocks and decompresses gzipped data in the
+    background. Blocks are fetched with get(), an empty block marks the end.
+    '''
+
+    def __init__(self, source):
+        super(BlockReader, self).__init__(daemon=True)
+        self.source = source
+        self.path = _name(source)
+        self.blocks = queue.Queue(QUEUE_SIZE)
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            fin, close = _open(self.source, 'rb')
+            try:
+                block = fin.read(BLOCK_SIZE)
+                if block[:2] == GZIP_MAGIC:
+                    self.decompress(fin, block)
+                else:
+                    while block:
+                        self.blocks.put(block)
+                        block = fin.read(BLOCK_SIZE)
+            finally:
+                if close:
+                    fin.close()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.blocks.put(b'')
+
+    def decompress(self, fin, block):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        while block:
+            data = decompressor.decompress(block)
+            # files can consist of several gzip members
+            while decompressor.eof and decompressor.unused_data:
+                rest = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                data += decompressor.decompress(rest)
+            if data:
+                self.blocks.put(data)
+            block = fin.read(BLOCK_SIZE)
+        if not decompressor.eof:
+            raise EOFError('%s ended before the end of the gzip stream.'
+                           % self.path)
+
+    def get(self):
+        block = self.blocks.get()
+        if not block and self.error is not None:
+            raise self.error
+        return block
+
+
+class BlockWriter(threading.Thread):
+    '''
+    Writes blocks passed to put() to a file or fifo and compresses them in
+    the background if a compression level is given.
+    '''
+
+    def __init__(self, target, level=None):
+        super(BlockWriter, self).__init__(daemon=True)
+        self.target = target
+        self.path = _name(target)
+        self.level = level
+        self.blocks = queue.Queue(QUEUE_SIZE)
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            fout, close = _open(self.target, 'wb')
+            try:
+                self.write(fout)
+            finally:
+                if close:
+                    fout.close()
+                else:
+                    fout.flush()
+        except Exception as e:
+            self.error = e
+            # keep consuming so that the filter does not block
+            while self.blocks.get() is not None:
+                pass
+
+    def write(self, fout):
+        compressor = None
+        if self.level is not None:
+            compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            if compressor is not None:
+                block = compressor.compress(block)
+            fout.write(block)
+        if compressor is not None:
+            fout.write(compressor.flush())
+
+    def put(self, block):
+        if self.error is not None:
+            raise self.error
+        self.blocks.put(block)
+
+    def close(self):
+        self.blocks.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+class LineReader(object):
+    '''
+    Reads the lines of a (gzipped) text file. Lines starting with one of
+    ``header_prefixes`` before the first record are collected in
+    ``header``.
+    '''
+
+    header_prefixes = ()
+
+    def __init__(self, source):
+        self.reader = BlockReader(source)
+        self.path = self.reader.path
+        self.rest = b''
+        self.eof = False
+        self.header = []
+        self.pending = []
+        if self.header_prefixes:
+            self.read_header()
+
+    def read_lines(self):
+        '''
+        Returns the complete lines of the next block(s), an empty list at
+        the end of the file.
+        '''
+        lines = []
+        while not lines and not self.eof:
+            block = self.reader.get()
+            if block:
+                lines = (self.rest + block).split(b'\n')
+                self.rest = lines.pop()
+            else:
+                self.eof = True
+                if self.rest:
+                    lines = [self.rest]
+                    self.rest = b''
+        return lines
+
+    def read_header(self):
+        prefixes = tuple(self.header_prefixes)
+        while True:
+            lines = self.read_lines()
+            if not lines:
+                return
+            for index, line in enumerate(lines):
+                if not line.startswith(prefixes):
+                    self.pending = lines[index:]
+                    return
+                self.header.append(line)
+
+    def batches(self):
+        '''
+        Yields lists of lines, one list per block read.
+        '''
+        if self.pending:
+            lines, self.pending = self.pending, []
+            yield lines
+        while True:
+            lines = self.read_lines()
+            if not lines:
+                return
+            yield lines
+
+    def __iter__(self):
+        for lines in self.batches():
+            for line in lines:
+                yield line
+
+
+class FastqReader(LineReader):
+    '''
+    Reads FASTQ records. Every batch holds the four lines of complete
+    records, so ``lines[1::4]`` are the sequences of the batch.
+    '''
+
+    def batches(self):
+        rest = []
+        for lines in super(FastqReader, self).batches():
+            if rest:
+                lines = rest + lines
+            end = len(lines) - len(lines) % 4
+            rest = lines[end:]
+            if end:
+                yield lines[:end] if rest else lines
+        if rest:
+            raise UAPError('%s ends with an incomplete FASTQ record.'
+                           % self.path)
+
+
+def paired_batches(readers):
+    '''
+    Yields lists with one batch per reader of *readers* (e.g. the
+    :class:`FastqReader` of both mates), all batches with the same number
+    of lines.
+    '''
+    iterators = [reader.batches() for reader in readers]
+    buffers = [[] for reader in readers]
+    done = [False for reader in readers]
+    while True:
+        for index, iterator in enumerate(iterators):
+            while not buffers[index] and not done[index]:
+                lines = next(iterator, None)
+                if lines is None:
+                    done[index] = True
+                else:
+                    buffers[index] = lines
+        count = min(len(lines) for lines in buffers)
+        if count == 0:
+            if any(buffers):
+                raise UAPError('The records of %s are not paired.' %
+                               ', '.join(reader.path for reader in readers))
+            return
+        yield [lines[:count] for lines in buffers]
+        buffers = [lines[count:] for lines in buffers]
+
+
+class SamReader(LineReader):
+    '''
+    Reads SAM lines. The header lines are available in ``header`` before
+    the first alignment is read.
+    '''
+
+    header_prefixes = (b'@',)
+
+
+class BedReader(LineReader):
+    '''
+    Reads BED lines. Leading track, browser and comment lines are collected
+    in ``header``.
+    '''
+
+    header_prefixes = (b'track', b'browser', b'#')
+
+
+class LineWriter(object):
+    '''
+    Writes lines to a file, ``-`` for stdout or a binary file object. The
+    output is gzipped with *level*, or with level 6 if the path ends on
+    ``.gz``.
+    '''
+
+    def __init__(self, target, level=None):
+        if level is None and isinstance(target, str) and \
+           target.endswith('.gz'):
+            level = 6
+        self.writer = BlockWriter(target, level)
+        self.lines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write_line(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def write_lines(self, lines):
+        self.flush()
+        if not isinstance(lines, list):
+            lines = list(lines)
+        if lines:
+            self.writer.put(b'\n'.join(lines) + b'\n')
+
+    def flush(self):
+        if self.lines:
+            lines, self.lines = self.lines, []
+            self.writer.put(b'\n'.join(lines) + b'\n')
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class SamRecord(object):
+    '''
+    One SAM line, given as str. The mandatory fields are attributes, the
+    optional fields are kept as raw ``TAG:TYPE:VALUE`` strings by tag and
+    only parsed when read with get_tag(). to_line() writes the optional
+    fields sorted by tag.
+    '''
+    __slots__ = ('qname', 'flag', 'rname', 'pos', 'mapq', 'cigar', 'mrnm',
+                 'mpos', 'isize', 'seq', 'qual', 'tags')
+
+    def __init__(self, line):
+        fields = line.split('\t')
+        (self.qname, flag, self.rname, pos, mapq, self.cigar, self.mrnm,
+         self.mpos, isize, self.seq, self.qual) = fields[:11]
+        self.flag = int(flag)
+        self.pos = int(pos)
+        self.mapq = int(mapq)
+        self.isize = int(isize)
+        self.tags = {field[:2]: field for field in fields[11:]}
+
+    def has_tag(self, tag):
+        return tag in self.tags
+
+    def get_tag(self, tag):
+        '''
+        Returns the value of *tag* or None if it is not set.
+        '''
+        field = self.tags.get(tag)
+        if field is None:
+            return None
+        (opt_id, opt_def, opt_val) = field.split(':', 2)
+        if opt_def == 'i':
+            return int(opt_val)
+        if opt_def == 'f':
+            return float(opt_val)
+        return opt_val
+
+    def set_tag(self, tag, value, opt_def):
+        self.tags[tag] = '%s:%s:%s' % (tag, opt_def, value)
+
+    def remove_tag(self, tag):
+        self.tags.pop(tag, None)
+
+    def to_line(self):
+        return '\t'.join([
+            self.qname, str(self.flag), self.rname, str(self.pos),
+            str(self.mapq), self.cigar, self.mrnm, str(self.mpos),
+            str(self.isize), self.seq, self.qual] +
+            [self.tags[tag] for tag in sorted(self.tags)])
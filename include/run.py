@@ -18,6 +18,7 @@ import command as command_info
 import exec_group
 import pipeline_info
 import misc
+import tracing
 from uaperrors import UAPError
 
 logger = getLogger("uap_logger")
@@ -395,13 +396,24 @@ class Run(object):
 
             # hash sum
             if do_hash is True:
-                old_hash = meta_data['sha256']
-                new_hash = self.fsc.sha256sum_of(path)
-                if new_hash != old_hash:
-                    yield '%s sha256sum changed from %s to %s%s' % \
-                          (path, old_hash, new_hash, change_str)
-                    continue
-                elif change_str or report_correct is True:
+                if 'sha256 tree' in meta_data:
+                    old_tree = meta_data['sha256 tree']
+                    new_tree = self.fsc.tree_sha256sum_of(
+                        path, old_tree['chunk size'])
+                    if new_tree['root'] != old_tree['root']:
+                        ranges = misc.changed_chunks(old_tree, new_tree)
+                        yield '%s sha256 tree changed in byte range(s) %s%s' \
+                              % (path, ', '.join('%d-%d' % r for r in ranges),
+                                 change_str)
+                        continue
+                else:
+                    old_hash = meta_data['sha256']
+                    new_hash = self.fsc.sha256sum_of(path)
+                    if new_hash != old_hash:
+                        yield '%s sha256sum changed from %s to %s%s' % \
+                              (path, old_hash, new_hash, change_str)
+                        continue
+                if change_str or report_correct is True:
                     yield '%s sha256sum is correct%s' % \
                           (path, change_str)
                     continue
@@ -415,6 +427,8 @@ class Run(object):
                 yield path + change_str
 
     @cache
+    @tracing.traced('get_state', 'state', lambda run: {
+        'task': '%s/%s' % (run.get_step(), run.get_run_id())})
     def get_state(self, do_hash=False, reset=False):
 
         states = self.get_step().get_pipeline().states
@@ -16,8 +16,6 @@ class RawUrlSource(AbstractStep):
         self.add_connection('out/raw')
 
         self.require_tool('compare_secure_hashes')
-        # Step was tested for cp (GNU coreutils) release 8.25
-        self.require_tool('cp')
         # Step was tested for curl release 7.47.0
         self.require_tool('curl')
         # Step was tested for dd (coreutils) release 8.25
@@ -73,41 +71,42 @@ class RawUrlSource(AbstractStep):
         with self.declare_run('download') as run:
             out_file = run.add_output_file('raw', filename, [])
 
-            temp_filename = run.add_temporary_file(suffix=url_filename)
-            with run.new_exec_group() as curl_exec_group:
-                # 1. download file
-                curl = [self.get_tool('curl'),
-                        '--output', temp_filename,
-                        self.get_option('url')]
-                curl_exec_group.add_command(curl)
-
-            if self.is_option_set_in_config('hashing-algorithm') and \
-               self.is_option_set_in_config('secure-hash'):
-                with run.new_exec_group() as check_exec_group:
-                    # 2. Compare secure hashes
-                    compare_secure_hashes = [
-                        self.get_tool('compare_secure_hashes'),
-                        '--algorithm',
-                        self.get_option('hashing-algorithm'),
-                        '--secure-hash',
-                        self.get_option('secure-hash'),
-                        temp_filename
-                    ]
-                    check_exec_group.add_command(compare_secure_hashes)
-            with run.new_exec_group() as cp_exec_group:
-                if self.get_option("uncompress"):
-                    with cp_exec_group.add_pipeline() as pipe:
+            with run.new_exec_group() as exec_group:
+                # Download, check and uncompress in a single pass
+                with exec_group.add_pipeline() as pipe:
+                    # 1. download file
+                    curl = [self.get_tool('curl'), self.get_option('url')]
+                    pipe.add_command(curl)
+
+                    check = self.is_option_set_in_config(
+                        'hashing-algorithm') and \
+                        self.is_option_set_in_config('secure-hash')
+                    if check:
+                        # 2. Compare secure hashes at the end of the stream
+                        compare_secure_hashes = [
+                            self.get_tool('compare_secure_hashes'),
+                            '--algorithm',
+                            self.get_option('hashing-algorithm'),
+                            '--secure-hash',
+                            self.get_option('secure-hash')
+                        ]
+                        if self.get_option('uncompress'):
+                            compare_secure_hashes.append('--stdout')
+                        else:
+                            compare_secure_hashes.extend(
+                                ['--output', out_file])
+                        compare_secure_hashes.append('-')
+                        pipe.add_command(compare_secure_hashes)
+
+                    # 3. Write the (uncompressed) file
+                    if self.get_option('uncompress'):
                         pigz = [self.get_tool('pigz'),
                                 '--decompress',
                                 '--stdout',
-                                '--processes', '1',
-                                temp_filename]
+                                '--processes', '1']
+                        pipe.add_command(pigz)
+                    if self.get_option('uncompress') or not check:
                         dd_out = [self.get_tool('dd'),
                                   'bs=%s' % self.get_option('dd-blocksize'),
                                   'of=%s' % out_file]
-                        pipe.add_command(pigz)
                         pipe.add_command(dd_out)
-                else:
-                    cp = [self.get_tool('cp'), '--update', temp_filename,
-                          out_file]
-                    cp_exec_group.add_command(cp)
@@ -16,7 +16,6 @@ class RawUrlSource(AbstractStep):
         self.add_connection('out/raw')
 
         self.require_tool('compare_secure_hashes')
-        self.require_tool('cp')
         self.require_tool('curl')
         self.require_tool('dd')
         self.require_tool('pigz')
@@ -114,43 +113,45 @@ class RawUrlSource(AbstractStep):
             with self.declare_run(files) as run:
                 out_file = run.add_output_file('raw', filename, [])
 
-                temp_filename = run.add_temporary_file(suffix = url_filename)
-                with run.new_exec_group() as curl_exec_group:
-                    # 1. download file
-                    curl = [self.get_tool('curl'), downloads['url']]
-                    curl_exec_group.add_command(
-                        curl, stdout_path=temp_filename)
-
-                if downloads['hashing-algorithm'] and downloads['secure-hash']:
-                    with run.new_exec_group() as check_exec_group:
-                        # 2. Compare secure hashes
-                        compare_secure_hashes = [
-                            self.get_tool('compare_secure_hashes'),
-                            '--algorithm',
-                            downloads['hashing-algorithm'],
-                            '--secure-hash',
-                            downloads['secure-hash'],
-                            temp_filename
-                        ]
-                        check_exec_group.add_command(compare_secure_hashes)
-
-                with run.new_exec_group() as cp_exec_group:
-                    if downloads["uncompress"]:
-                        with cp_exec_group.add_pipeline() as pipe:
+                with run.new_exec_group() as exec_group:
+                    # Download, check and uncompress in a single pass
+                    with exec_group.add_pipeline() as pipe:
+                        # 1. download file
+                        curl = [self.get_tool('curl'), downloads['url']]
+                        pipe.add_command(curl)
+
+                        check = downloads['hashing-algorithm'] and \
+                            downloads['secure-hash']
+                        if check:
+                            # 2. Compare secure hashes at the end of the
+                            # stream
+                            compare_secure_hashes = [
+                                self.get_tool('compare_secure_hashes'),
+                                '--algorithm',
+                                downloads['hashing-algorithm'],
+                                '--secure-hash',
+                                downloads['secure-hash']
+                            ]
+                            if downloads['uncompress']:
+                                compare_secure_hashes.append('--stdout')
+                            else:
+                                compare_secure_hashes.extend(
+                                    ['--output', out_file])
+                            compare_secure_hashes.append('-')
+                            pipe.add_command(compare_secure_hashes)
+
+                        # 3. Write the (uncompressed) file
+                        if downloads['uncompress']:
                             pigz = [self.get_tool('pigz'),
                                     '--decompress',
                                     '--stdout',
-                                    '--processes', '1',
-                                    temp_filename]
+                                    '--processes', '1']
+                            pipe.add_command(pigz)
+                        if downloads['uncompress'] or not check:
                             dd_out = [
                                 self.get_tool('dd'),
                                 'bs=%s' %
                                 self.get_option('dd-blocksize'),
                                 'of=%s' %
                                 out_file]
-                            pipe.add_command(pigz)
                             pipe.add_command(dd_out)
-                    else:
-                        cp = [self.get_tool('cp'), '--update', temp_filename,
-                              out_file]
-                        cp_exec_group.add_command(cp)
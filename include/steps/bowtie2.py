@@ -515,54 +515,9 @@ class Bowtie2(AbstractStep):
                         if not self.get_option('fifo'):
                             temp_fifos.append(input_path)
                             return (exec_group, temp_fifos)
-                        # Create temporary fifo
-                        temp_fifo = run.add_temporary_file(
-                            'in-fifo-%s' %
-                            os.path.basename(input_path))
-                        mkfifo = [self.get_tool('mkfifo'), temp_fifo]
-                        exec_group.add_command(mkfifo)
-                        # Is input gzipped fasta?
-                        is_fastq_gz = False
-                        if any(input_path.endswith(suff)
-                                for suff in ['.fq.gz', '.fastq.gz']):
-                            is_fastq_gz = True
-                        # If yes we need to decompress it
-                        if is_fastq_gz:
-                            with exec_group.add_pipeline() as unzip_pipe:
-                                # 2.1 command: Read file in 'dd-blocksize'
-                                # chunks
-                                dd_in = [
-                                    self.get_tool('dd'),
-                                    'bs=%s' % self.get_option('dd-blocksize'),
-                                    'if=%s' % input_path
-                                ]
-                                unzip_pipe.add_command(dd_in)
-                                # 2.2 command: Uncompress data
-                                pigz = [self.get_tool('pigz'),
-                                        '--processes',
-                                        str(self.get_cores()),
-                                        '--decompress',
-                                        '--blocksize',
-                                        self.get_option('pigz-blocksize'),
-                                        '--stdout']
-                                unzip_pipe.add_command(pigz)
-                                # 2.3 Write file in 'dd-blocksize' chunks to
-                                # fifo
-                                dd_out = [
-                                    self.get_tool('dd'),
-                                    'obs=%s' % self.get_option('dd-blocksize'),
-                                    'of=%s' % temp_fifo
-                                ]
-                                unzip_pipe.add_command(dd_out)
-                        else:
-                            dd = [
-                                self.get_tool('dd'),
-                                'bs=%s' % self.get_option('dd-blocksize'),
-                                'if=%s' % input_path,
-                                'of=%s' % temp_fifo
-                            ]
-                            exec_group.add_command(dd)
-                        temp_fifos.append(temp_fifo)
+                        # Stream (decompressed) file through a fifo
+                        temp_fifos.append(exec_group.add_input_stream(
+                            input_path, force_fifo=True))
                         return (exec_group, temp_fifos)
 
                     for input_path in fr_input:
@@ -9,6 +9,9 @@ logger = getLogger('uap_logger')
 class CatText(AbstractStep):
     '''
     cats text files together
+
+    The output is hashed while it is written, so it is not read again for
+    the annotation.
     '''
 
     def __init__(self, pipeline):
@@ -22,7 +25,7 @@ class CatText(AbstractStep):
         self.add_option('additionalFiles', list, optional=True)
         self.add_option('run_id', str, default='merged', optional=True)
 
-        self.require_tool('cat')
+        self.require_tool('concatenate_files')
 #        self.require_tool('grep')
 #        self.require_tool('sort')
 #        self.require_tool('uniq')
@@ -47,10 +50,12 @@ class CatText(AbstractStep):
 #            out = run.add_output_file("text","foo", input_paths)
 
             with run.new_exec_group() as exec_group:
-                cat = [self.get_tool('cat')]
+                cat = [self.get_tool('concatenate_files')]
+                cat.extend(self.get_hash_hint_args())
+                cat.extend(['--output', out])
                 if self.is_option_set_in_config('additionalFiles'):
                     files = [
                         os.path.abspath(f) for f in self.get_option('additionalFiles')]
                     cat.extend(files)
                 cat.extend(input_paths)
-                exec_group.add_command(cat, stdout_path=out)
+                exec_group.add_command(cat)
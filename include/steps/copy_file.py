@@ -9,6 +9,10 @@ class CopyFile(AbstractStep):
     '''
     copies a file or a list of files defined by there
     dependencies and filenames
+
+    The files are copied as reflinks on file systems that support them
+    (e.g. Btrfs or XFS), which is instant. Otherwise the data is hashed
+    while it is copied, so it is not read again for the annotation.
     '''
 
     def __init__(self, pipeline):
@@ -19,7 +23,16 @@ class CopyFile(AbstractStep):
         self.add_connection('in/sequence')
         self.add_connection('out/copied')
 
-        self.require_tool('cp')
+        self.require_tool('transfer_file')
+
+        self.add_option(
+            'hardlink',
+            bool,
+            optional=True,
+            default=False,
+            description="Create hardlinks instead of copies where reflinks "
+            "are not possible. The copies are then the same files as the "
+            "inputs, so only use this if neither are modified in place.")
 
     def runs(self, run_ids_connections_files):
         for run_id in run_ids_connections_files.keys():
@@ -32,6 +45,9 @@ class CopyFile(AbstractStep):
                         out_file = run.add_output_file('copied',
                                                        file_name,
                                                        input_paths)
-                        cp = [self.get_tool('cp'),
-                              input_file, out_file]
-                        cp_exec_group.add_command(cp)
+                        transfer = [self.get_tool('transfer_file')]
+                        if self.get_option('hardlink'):
+                            transfer.append('--link')
+                        transfer.extend(self.get_hash_hint_args())
+                        transfer.extend([input_file, out_file])
+                        cp_exec_group.add_command(transfer)
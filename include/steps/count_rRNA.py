@@ -8,7 +8,15 @@ logger = getLogger('uap_logger')
 
 class SamToFastq(AbstractStep):
     '''
-    Tbla bla bla    http://www.htslib.org/doc/samtools.html
+    Counts the alignments per rRNA reference. The key of an alignment are
+    its FLAG, RNAME and POS columns cut before the first '|' and '_',
+    unmapped reads are not counted. The report lists the counts in the
+    format of ``uniq -c``, sorted ascending.
+
+    The default engine counts in a single process with a hash map. The
+    pipeline engine uses samtools, cut, grep, sort and uniq instead.
+
+    http://www.htslib.org/doc/samtools.html
     '''
 
     def __init__(self, pipeline):
@@ -25,6 +33,18 @@ class SamToFastq(AbstractStep):
         self.require_tool('grep')
         self.require_tool('sort')
         self.require_tool('uniq')
+        self.require_tool('count_references')
+
+        self.add_option(
+            'engine',
+            str,
+            optional=True,
+            default='counter',
+            choices=['counter', 'pipeline'],
+            description="counter: count in a single pass with the "
+            "count_references tool, SAM files are read directly and only "
+            "BAM files are decoded by samtools. pipeline: the former "
+            "samtools | cut | grep | sort | uniq pipeline.")
 
     def runs(self, run_ids_connections_files):
 
@@ -48,6 +68,20 @@ class SamToFastq(AbstractStep):
 
                 samtools = [self.get_tool('samtools'), 'view', '-S']
 
+                if self.get_option('engine') == 'counter':
+                    count = [self.get_tool('count_references')]
+                    with run.new_exec_group() as exec_group:
+                        if os.path.splitext(input_paths[0])[1] == '.bam':
+                            with exec_group.add_pipeline() as pipe:
+                                samtools.append(input_paths[0])
+                                pipe.add_command(samtools)
+                                count.extend(['-', '--output', out])
+                                pipe.add_command(count)
+                        else:
+                            count.extend([input_paths[0], '--output', out])
+                            exec_group.add_command(count)
+                    continue
+
                 with run.new_exec_group() as exec_group:
                     with exec_group.add_pipeline() as pipe:
                         # 1.1 command: Uncompress file to no fucking fifo
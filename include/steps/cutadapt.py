@@ -17,6 +17,10 @@ class Cutadapt(AbstractStep):
 
     This step wraps release: cutadpat 1.5
 
+    With ``quality_stats`` the quality statistics of the input reads are
+    computed by ``fastx_quality_stats`` in the same pass, so gzipped reads
+    are decompressed once for both tools.
+
     '''
 
     def __init__(self, pipeline):
@@ -30,6 +34,8 @@ class Cutadapt(AbstractStep):
         self.add_connection('out/second_read', optional=True)
         self.add_connection('out/log_first_read')
         self.add_connection('out/log_second_read', optional=True)
+        self.add_connection('out/first_read_quality_stats', optional=True)
+        self.add_connection('out/second_read_quality_stats', optional=True)
 
         # Step was tested for cat (GNU coreutils) release 8.25
         self.require_tool('cat')
@@ -275,6 +281,15 @@ class Cutadapt(AbstractStep):
             description="If set to true, only the leftmost string "
             "without spaces of the QNAME field of the FASTQ data is "
             "kept. This might be necessary for downstream analysis.")
+        self.add_option(
+            'quality_stats',
+            bool,
+            optional=True,
+            default=False,
+            description="If set to true, fastx_quality_stats computes the "
+            "quality statistics of the input reads, like the step "
+            "fastx_quality_stats. The reads are decompressed only once and "
+            "passed to both tools.")
 
         self.add_option('dd-blocksize', str, optional=True, default="2M")
         self.add_option('pigz-blocksize', str, optional=True, default="2048")
@@ -341,6 +356,16 @@ class Cutadapt(AbstractStep):
                 option_list.append('--%s' % option)
                 option_list.append(str(self.get_option(option)))
 
+        quality_stats = self.get_option('quality_stats')
+        if quality_stats:
+            # only required here to keep the tool versions of other runs
+            self.require_tool('fastx_quality_stats')
+            self.require_tool('tee')
+            fastx_qs_options = list()
+            if self.is_option_set_in_config('quality-base'):
+                fastx_qs_options.extend(
+                    ['-Q', str(self.get_option('quality-base'))])
+
         for run_id in cc.keys():
             run = self.declare_run(run_id)
             for read in read_types:
@@ -371,59 +396,33 @@ class Cutadapt(AbstractStep):
                                     "required to call cutadapt for sample %s!"
                                     % run_id)
                 temp_fifos = list()
+                stats_fifos = list()
                 exec_group = run.new_exec_group()
                 for input_path in input_paths:
-                    # 1. Create temporary fifo for every input file
-                    temp_fifo = run.add_temporary_file(
-                        "fifo-%s" % os.path.basename(input_path))
-                    temp_fifos.append(temp_fifo)
-                    mkfifo = [self.get_tool('mkfifo'), temp_fifo]
-                    exec_group.add_command(mkfifo)
-                    # 2. Output files to fifo
-                    if input_path.endswith('fastq.gz'):
-                        with exec_group.add_pipeline() as pigz_pipe:
-                            # 2.1 command: Read file in 4MB chunks
-                            dd_in = [
-                                self.get_tool('dd'),
-                                'ibs=%s' %
-                                self.get_option('dd-blocksize'),
-                                'if=%s' % input_path
-                            ]
-                            # 2.2 command: Uncompress file to fifo
-                            pigz = [self.get_tool('pigz'),
-                                    '--decompress',
-                                    '--processes',
-                                    str(self.get_cores()),
-                                    '--blocksize',
-                                    self.get_option('pigz-blocksize'),
-                                    '--stdout']
-                            # 2.3 command: Write file in 4MB chunks to
-                            #              fifo
-                            dd_out = [
-                                self.get_tool('dd'),
-                                'obs=%s' %
-                                self.get_option('dd-blocksize'),
-                                'of=%s' % temp_fifo
-                            ]
-
-                            pigz_pipe.add_command(dd_in)
-                            pigz_pipe.add_command(pigz)
-                            pigz_pipe.add_command(dd_out)
-
-                    elif input_path.endswith('fastq'):
-                        # 2.1 command: Read file in 4MB chunks and
-                        #              write to fifo in 4MB chunks
-                        dd_in = [
-                            self.get_tool('dd'),
-                            'bs=%s' % self.get_option('dd-blocksize'),
-                            'if=%s' % input_path,
-                            'of=%s' % temp_fifo
-                        ]
-                        exec_group.add_command(dd_in)
-                    else:
+                    if not input_path.endswith(('fastq', 'fastq.gz')):
                         raise StepError(self, "File %s does not end with any "
                                         "expected suffix (fastq.gz or "
-                                        "fastq). Please fix that issue.")
+                                        "fastq). Please fix that issue."
+                                        % input_path)
+                    # 1. Stream (decompressed) files, once for both tools
+                    streams = exec_group.add_input_streams(
+                        input_path, 2 if quality_stats else 1)
+                    temp_fifos.append(streams[0])
+                    stats_fifos.extend(streams[1:])
+                # 2. Compute quality statistics of the same data
+                if quality_stats:
+                    with exec_group.add_pipeline() as fastx_pipe:
+                        fastx_qs_file = run.add_output_file(
+                            "%s_quality_stats" % read,
+                            "%s_%s.fastq.quality.tsv" %
+                            (run_id, read_types[read]),
+                            input_paths)
+                        fastx_pipe.add_command(
+                            [self.get_tool('cat')] + stats_fifos)
+                        fastx_qs = [self.get_tool('fastx_quality_stats')]
+                        fastx_qs.extend(fastx_qs_options)
+                        fastx_pipe.add_command(fastx_qs,
+                                               stdout_path=fastx_qs_file)
                 # 3. Read data from fifos
                 with exec_group.add_pipeline() as cutadapt_pipe:
                     # 3.1 command: Read from ALL fifos
@@ -486,25 +485,13 @@ class Cutadapt(AbstractStep):
                         % (run_id, read_types[read]),
                         input_paths)
 
-                    # 3.4 command: Compress output
-                    pigz = [self.get_tool('pigz'),
-                            '--processes', str(self.get_cores()),
-                            '--blocksize', self.get_option('pigz-blocksize'),
-                            '--stdout']
-                    # 3.5 command: Write to output file in 4MB chunks
+                    # 3.4 command: Compress output to file
                     clipped_fastq_file = run.add_output_file(
                         "%s" % read,
                         "%s_%s.fastq.gz" %
                         (run_id, read_types[read]),
                         input_paths)
 
-                    dd = [
-                        self.get_tool('dd'),
-                        'obs=%s' % self.get_option('dd-blocksize'),
-                        'of=%s' % clipped_fastq_file
-                    ]
-
                     cutadapt_pipe.add_command(cutadapt,
                                               stderr_path=cutadapt_log_file)
-                    cutadapt_pipe.add_command(pigz)
-                    cutadapt_pipe.add_command(dd)
+                    cutadapt_pipe.add_output_stream(clipped_fastq_file)
@@ -3,7 +3,6 @@ import sys
 from abstract_step import *
 import process_pool
 import yaml
-import os
 from logging import getLogger
 
 logger = getLogger('uap_logger')
@@ -20,6 +19,15 @@ class discardLargeSplitsAndPairs (AbstractStep):
     be discarded. All remaining reads are returned in SAM format. The
     discarded reads are also collected in a SAM formatted file and a
     statistic is returned.
+
+    Split reads are judged by the first skipped region of their CIGAR
+    string. Read pairs are only discarded because of their template
+    length, also if one of the mates is a split read.
+
+    Mates are matched in constant memory if the input is sorted by read
+    name or collated, which is detected from the SAM header. Otherwise,
+    reads waiting for their mate are moved to disk if there are more than
+    max-pending of them.
     '''
 
     def __init__(self, pipeline):
@@ -33,6 +41,7 @@ class discardLargeSplitsAndPairs (AbstractStep):
         self.add_connection('out/stats')      # contains a statistic
 
         self.require_tool('dd')
+        self.require_tool('mkdir')
         self.require_tool('pigz')
         self.require_tool('samtools')
         self.require_tool('discardLargeSplitsAndPairs')
@@ -47,6 +56,24 @@ class discardLargeSplitsAndPairs (AbstractStep):
             str,
             optional=False,
             description='Size of template (in nucleotides) that would arise from a read pair. Read pairs that exceed this value are discarded. ')
+        self.add_option(
+            'mode',
+            str,
+            optional=True,
+            default='auto',
+            choices=['auto', 'collated', 'spill'],
+            description='How mates are matched. collated: mates follow each '
+            'other (name sorted or collated input). spill: mates may be far '
+            'apart (e.g. coordinate sorted input) and waiting reads are '
+            'moved to disk. auto: collated if the SAM header declares name '
+            'sorted or collated input, spill otherwise.')
+        self.add_option(
+            'max-pending',
+            int,
+            optional=True,
+            default=1000000,
+            description='Maximal number of reads waiting for their mate in '
+            'memory in spill mode.')
 
     def runs(self, run_ids_connections_files):
 
@@ -59,27 +86,17 @@ class discardLargeSplitsAndPairs (AbstractStep):
                 elif len(input_paths) != 1:
                     raise StepError(
                         self, "Expected exactly one alignments file.")
-                else:
-                    is_gzipped = True if os.path.splitext(input_paths[0])[1]\
-                        in ['.gz', '.gzip'] else False
+
+                spill_dir = run.add_temporary_directory('spill')
+                with run.new_exec_group() as mkdir_exec_group:
+                    mkdir = [self.get_tool('mkdir'), spill_dir]
+                    mkdir_exec_group.add_command(mkdir)
 
                 with run.new_exec_group() as exec_group:
 
                     with exec_group.add_pipeline() as pipe:
-                        # 1. command: Read file in 4MB chunks
-                        dd_in = [self.get_tool('dd'),
-                                 'ibs=2M',
-                                 'if=%s' % input_paths[0]]
-                        pipe.add_command(dd_in)
-
-                        # 1.1 command: Uncompress file to fifo
-                        if is_gzipped:
-                            pigz = [self.get_tool('pigz'),
-                                    '--decompress',
-                                    '--processes', str(self.get_cores()),
-                                    '--stdout'
-                                    ]
-                            pipe.add_command(pigz)
+                        # 1. command: Read and uncompress file
+                        pipe.add_input_stream(input_paths[0])
 
                         # 1.2 call samtools to handle also .bam files
                         samtools_view = [self.get_tool('samtools'),
@@ -105,6 +122,12 @@ class discardLargeSplitsAndPairs (AbstractStep):
                             self.get_option('N_splits'),
                             '--M_mates',
                             self.get_option('M_mates'),
+                            '--mode',
+                            self.get_option('mode'),
+                            '--max-pending',
+                            str(self.get_option('max-pending')),
+                            '--tmpdir',
+                            spill_dir,
                             '--statsfile',
                             statsfile,
                             '--logfile',
@@ -1,7 +1,6 @@
 from uaperrors import StepError
 import sys
 from logging import getLogger
-import os
 from abstract_step import AbstractStep
 
 logger = getLogger('uap_logger')
@@ -90,59 +89,15 @@ class FastxQualityStats(AbstractStep):
                         temp_fifos = list()
                         exec_group = run.new_exec_group()
                         for input_path in input_paths:
-                            temp_fifo = run.add_temporary_file(
-                                "fifo-%s" %
-                                os.path.basename(input_path))
-                            temp_fifos.append(temp_fifo)
-                            mkfifo = [self.get_tool('mkfifo'), temp_fifo]
-                            exec_group.add_command(mkfifo)
-
-                            # 2. Output files to fifo
-                            if input_path.endswith('fastq.gz'):
-                                with exec_group.add_pipeline() as unzip_pipe:
-                                    # 2.1 command: Read file in 'dd-blocksize'
-                                    # chunks
-                                    dd_in = [
-                                        self.get_tool('dd'),
-                                        'ibs=%s' %
-                                        self.get_option('dd-blocksize'),
-                                        'if=%s' % input_path
-                                    ]
-                                    # 2.2 command: Uncompress file to fifo
-                                    pigz = [self.get_tool('pigz'),
-                                            '--decompress',
-                                            '--processes',
-                                            str(self.get_cores()),
-                                            '--blocksize',
-                                            self.get_option('pigz-blocksize'),
-                                            '--stdout']
-                                    # 2.3 Write file in 'dd-blocksize' chunks
-                                    # to fifo
-                                    dd_out = [
-                                        self.get_tool('dd'),
-                                        'obs=%s' %
-                                        self.get_option('dd-blocksize'),
-                                        'of=%s' % temp_fifo
-                                    ]
-
-                                    unzip_pipe.add_command(dd_in)
-                                    unzip_pipe.add_command(pigz)
-                                    unzip_pipe.add_command(dd_out)
-                            elif input_path.endswith('fastq'):
-                                # 2.1 command: Read file in 'dd-blocksize' chunks and
-                                # write to fifo in 'dd-blocksize' chunks
-                                dd_in = [
-                                    self.get_tool('dd'),
-                                    'bs=%s' % self.get_option('dd-blocksize'),
-                                    'if=%s' % input_path,
-                                    'of=%s' % temp_fifo
-                                ]
-                                exec_group.add_command(dd_in)
-                            else:
+                            if not input_path.endswith(('fastq', 'fastq.gz')):
                                 raise StepError(
                                     self, "File %s does not end with any "
                                     "expected suffix (fastq.gz or "
-                                    "fastq). Please fix that issue.")
+                                    "fastq). Please fix that issue." %
+                                    input_path)
+                            # 2. Stream (decompressed) files
+                            temp_fifos.append(
+                                exec_group.add_input_stream(input_path))
                         # 3. Read data from fifos and check quality stats
                         with exec_group.add_pipeline() as fastx_pipe:
                             # 3.1 command: Read from ALL fifos
@@ -1,7 +1,6 @@
 from uaperrors import StepError
 import sys
 from logging import getLogger
-import os
 from abstract_step import AbstractStep
 
 logger = getLogger('uap_logger')
@@ -11,6 +10,9 @@ class FixCutadapt(AbstractStep):
     '''
     This step takes FASTQ data and removes both reads of a paired-end read, if
     one of them has been completely removed by cutadapt (or any other software).
+    The reads are processed in large blocks. Gzipped input is decompressed
+    by the tool, gzipped output is compressed by ``pigz`` with the cores of
+    the step.
     '''
 
     def __init__(self, pipeline):
@@ -27,12 +29,13 @@ class FixCutadapt(AbstractStep):
             'out/second_read',
             optional = True)
 
-        # [Options for 'dd':]
+        self.add_option('compression-level', int, optional=True,
+                        default=6, choices=list(range(1, 10)),
+                        description="gzip compression level of the output")
+        # [Options for 'dd' and 'pigz':]
         self.add_option('dd-blocksize', str, optional=True, default="2M")
         self.add_option('pigz-blocksize', str, optional=True, default="2048")
 
-        # Step was tested for cat (GNU coreutils) release 8.25
-        self.require_tool('cat')
         # Step was tested for dd (coreutils) release 8.25
         self.require_tool('dd')
         self.require_tool('fix_cutadapt')
@@ -47,15 +50,14 @@ class FixCutadapt(AbstractStep):
         for run_id in cc.keys():
             cc.switch_run_id(run_id)
             with self.declare_run(run_id) as run:
-                temp_fifos = dict()
-                exec_group = run.new_exec_group()
+                paths = dict()
                 for read in read_types:
                     if not cc.exists_connection_for_run(f"in/{read}"):
                         continue
                     connection = f"in/{read}"
                     input_paths = cc[run_id][connection]
-                    temp_fifos[f"{read}_in"] = None
-                    temp_fifos[f"{read}_out"] = None
+                    paths[f"{read}_in"] = None
+                    paths[f"{read}_out"] = None
                     if input_paths == [None]:
                         run.add_empty_output_connection(f"{read}")
 
@@ -64,128 +66,37 @@ class FixCutadapt(AbstractStep):
                             self, "Expected single input file. Found files "
                             "%s for run: %s" %
                             (input_paths, run_id))
+                    elif not input_paths[0].endswith(('fastq.gz', 'fastq')):
+                        raise StepError(
+                            self, "File %s does not end with any "
+                            "expected suffix (fastq.gz or fastq). "
+                            "Please fix that issue." %
+                            input_paths[0])
                     else:
-                        # 1. Create temporary fifos
-                        # 1.1 Input fifo
-                        temp_fifos[f"{read}_in"] = run.add_temporary_file(
-                            "in-fifo-%s" %
-                            os.path.basename(input_paths[0]))
-                        mkfifo_in = [self.get_tool('mkfifo'),
-                                     temp_fifos[f"{read}_in"]]
-                        exec_group.add_command(mkfifo_in)
-                        # 1.2 Output fifo
-                        temp_fifos[f"{read}_out"] = run.add_temporary_file(
-                            f"{read}-out-fifo")
-                        mkfifo_out = [self.get_tool('mkfifo'),
-                                      temp_fifos[f"{read}_out"]]
-                        exec_group.add_command(mkfifo_out)
-
-                        # 2. Output files to fifo
-                        if input_paths[0].endswith('fastq.gz'):
-                            with exec_group.add_pipeline() as unzip_pipe:
-                                # 2.1 command: Read file in 'dd-blocksize'
-                                # chunks
-                                dd_in = [
-                                    self.get_tool('dd'),
-                                    'ibs=%s' % self.get_option('dd-blocksize'),
-                                    'if=%s' % input_paths[0]
-                                ]
-                                # 2.2 command: Uncompress file to fifo
-                                pigz = [self.get_tool('pigz'),
-                                        '--processes',
-                                        str(self.get_cores()),
-                                        '--decompress',
-                                        '--blocksize',
-                                        self.get_option('pigz-blocksize'),
-                                        '--stdout']
-                                # 2.3 Write file in 'dd-blocksize' chunks to
-                                # fifo
-                                dd_out = [
-                                    self.get_tool('dd'),
-                                    'obs=%s' % self.get_option('dd-blocksize'),
-                                    'of=%s' % temp_fifos["%s_in" % read]
-                                ]
-
-                                unzip_pipe.add_command(dd_in)
-                                unzip_pipe.add_command(pigz)
-                                unzip_pipe.add_command(dd_out)
-                        elif input_paths[0].endswith('fastq'):
-                            # 2.1 command: Read file in 'dd-blocksize' chunks and
-                            # write to fifo in 'dd-blocksize' chunks
-                            dd_in = [
-                                self.get_tool('dd'),
-                                'bs=%s' % self.get_option('dd-blocksize'),
-                                'if=%s' % input_paths[0],
-                                'of=%s' % temp_fifos["%s_in" % read]
-                            ]
-                            exec_group.add_command(dd_in)
-                        else:
-                            raise StepError(
-                                self, "File %s does not end with any "
-                                "expected suffix (fastq.gz or fastq). "
-                                "Please fix that issue." %
-                                input_paths[0])
-                # 3. Start fix_cutadapt
-                fix_cutadapt = [self.get_tool('fix_cutadapt'),
-                                temp_fifos["first_read_in"],
-                                temp_fifos["first_read_out"]]
-                if cc.connection_exists("in/second_read"):
-                    fix_cutadapt.extend([
-                        '--R2-in', temp_fifos["second_read_in"],
-                        '--R2-out', temp_fifos["second_read_out"]
-                    ])
-
-                exec_group.add_command(fix_cutadapt)
-
-                # 4. Read data from first_read fifo
-                with exec_group.add_pipeline() as fr_pigz_pipe:
-                    # 4.1  command: Read from first_read fifos
-                    cat = [self.get_tool('cat'),
-                           temp_fifos["first_read_out"]]
-                    # 4.2 Gzip output file
-                    pigz = [self.get_tool('pigz'),
-                            '--processes', str(self.get_cores()),
-                            '--blocksize', self.get_option('pigz-blocksize'),
-                            '--stdout']
-                    # 4.3 command: Write to output file in 'dd-blocksize'
-                    # chunks
-                    fr_stdout_path = run.add_output_file(
-                        "first_read",
-                        "%s%s.fastq.gz" %
-                        (run_id, read_types["first_read"]),
-                        cc[run_id]["in/first_read"])
-                    dd = [self.get_tool('dd'),
-                          'obs=%s' % self.get_option('dd-blocksize'),
-                          'of=%s' % fr_stdout_path]
-
-                    fr_pigz_pipe.add_command(cat)
-                    fr_pigz_pipe.add_command(pigz)
-                    fr_pigz_pipe.add_command(dd)
-
-                # 5. Read data from second_read fifo if there is one
-                if cc.connection_exists("in/second_read"):
-                    with exec_group.add_pipeline() as sr_pigz_pipe:
-                        # 5.1  command: Read from first_read fifos
-                        cat = [self.get_tool('cat'),
-                               temp_fifos["second_read_out"]]
-                        # 4.2 Gzip output file
-                        pigz = [self.get_tool('pigz'),
-                                '--processes',
-                                str(self.get_cores()),
-                                '--blocksize',
-                                self.get_option('pigz-blocksize'),
-                                '--stdout']
-                        # 4.3 command: Write to output file in 'dd-blocksize'
-                        # chunks
-                        sr_stdout_path = run.add_output_file(
-                            "second_read",
-                            "%s%s.fastq.gz" %
-                            (run_id, read_types["second_read"]),
-                            cc[run_id]["in/second_read"])
-                        dd = [self.get_tool('dd'),
-                              'obs=%s' % self.get_option('dd-blocksize'),
-                              'of=%s' % sr_stdout_path]
-
-                        sr_pigz_pipe.add_command(cat)
-                        sr_pigz_pipe.add_command(pigz)
-                        sr_pigz_pipe.add_command(dd)
+                        # fix_cutadapt decompresses the input itself
+                        paths[f"{read}_in"] = input_paths[0]
+                        paths[f"{read}_out"] = run.add_output_file(
+                            read,
+                            "%s%s.fastq.gz" % (run_id, read_types[read]),
+                            input_paths)
+
+                if paths.get("first_read_in") is None:
+                    continue
+                with run.new_exec_group() as exec_group:
+                    # pigz compresses the output in parallel
+                    for read in read_types:
+                        if paths.get(f"{read}_out") is not None:
+                            paths[f"{read}_out"] = \
+                                exec_group.add_output_stream(
+                                    paths[f"{read}_out"],
+                                    level=self.get_option('compression-level'))
+                    fix_cutadapt = [self.get_tool('fix_cutadapt'),
+                                    paths["first_read_in"],
+                                    paths["first_read_out"]]
+                    if paths.get("second_read_in") is not None:
+                        fix_cutadapt.extend([
+                            '--R2-in', paths["second_read_in"],
+                            '--R2-out', paths["second_read_out"]
+                        ])
+
+                    exec_group.add_command(fix_cutadapt)
@@ -13,6 +13,10 @@ class MergeFastaFiles(AbstractStep):
     '''
     This step concatenates all .fasta(.gz) files that belong to a certain
     sample.
+
+    If the input files are already in the output format, i.e. all gzipped
+    for compressed output or all plain otherwise, they are concatenated as
+    they are without decompressing and compressing them again.
     '''
 
     def __init__(self, pipeline):
@@ -27,6 +31,7 @@ class MergeFastaFiles(AbstractStep):
         self.require_tool('dd')
         self.require_tool('mkfifo')
         self.require_tool('pigz')
+        self.require_tool('concatenate_files')
 
         # [Options for the merging:]
         self.add_option('compress-output', bool, optional=True, default=True,
@@ -40,11 +45,43 @@ class MergeFastaFiles(AbstractStep):
             optional=True,
             default="",
             description="Name used as prefix for FASTA output.")
+        self.add_option(
+            'verify-gzip',
+            bool,
+            optional=True,
+            default=True,
+            description="Decompress gzipped input files while they are "
+            "concatenated without recompression to check that they are "
+            "complete. The decompressed data is discarded.")
 
         # [Options for 'dd':]
         self.add_option('dd-blocksize', str, optional=True, default="2M")
         self.add_option('pigz-blocksize', str, optional=True, default="2048")
 
+    def _concatenate(self, run, fasta_basename, input_paths):
+        '''
+        Concatenates *input_paths* as they are if they all match the output
+        format. Returns whether the files were handled.
+        '''
+        compress = self.get_option('compress-output')
+        suffixes = ['.gz', '.gzip'] if compress else \
+            ['.fastq', '.fq', '.fasta', '.fa', '.fna']
+        if not all(os.path.splitext(input_path)[1] in suffixes
+                   for input_path in input_paths):
+            return False
+        out_file = "%s.fasta.gz" % fasta_basename if compress \
+            else "%s.fasta" % fasta_basename
+        stdout_path = run.add_output_file("sequence", out_file, input_paths)
+        concat = [self.get_tool('concatenate_files')]
+        if compress:
+            concat.append('--gzip')
+            if self.get_option('verify-gzip'):
+                concat.append('--verify')
+        concat.extend(['--output', stdout_path])
+        concat.extend(input_paths)
+        run.new_exec_group().add_command(concat)
+        return True
+
     def runs(self, run_ids_connections_files):
         run_ids = set(run_ids_connections_files.keys())
         for run_id in run_ids_connections_files.keys():
@@ -70,6 +107,8 @@ class MergeFastaFiles(AbstractStep):
 
                 if input_paths == [None]:
                     run.add_empty_output_connection("sequence")
+                elif self._concatenate(run, fasta_basename, input_paths):
+                    continue
                 else:
                     temp_fifos = list()
                     exec_group = run.new_exec_group()
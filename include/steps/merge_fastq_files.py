@@ -12,6 +12,10 @@ class MergeFastqFiles(AbstractStep):
     This step concatenates all .fastq(.gz) files belonging to a certain sample.
     First and second read files are merged separately. The output files are
     gzipped.
+
+    If all input files of a read are gzipped, they are concatenated as they
+    are, since a concatenation of gzip files is a valid gzip file. Only
+    plain or mixed input is decompressed and compressed again.
     '''
 
     def __init__(self, pipeline):
@@ -36,11 +40,22 @@ class MergeFastqFiles(AbstractStep):
         self.require_tool('mkfifo')
         # Step was tested for pigz release 2.3.1
         self.require_tool('pigz')
+        self.require_tool('concatenate_files')
 
         # [Options for 'dd':]
         self.add_option('dd-blocksize', str, optional=True, default="2M")
         self.add_option('pigz-blocksize', str, optional=True, default="2048")
 
+        # [Options for the merging:]
+        self.add_option(
+            'verify-gzip',
+            bool,
+            optional=True,
+            default=True,
+            description="Decompress gzipped input files while they are "
+            "concatenated to check that they are complete. The decompressed "
+            "data is discarded.")
+
     def runs(self, cc):
 
         read_types = {'first_read': '_R1', 'second_read': '_R2'}
@@ -56,99 +71,43 @@ class MergeFastqFiles(AbstractStep):
                     if input_paths == [None]:
                         run.add_empty_output_connection("%s" % read)
                     else:
-                        temp_fifos = list()
-                        exec_group = run.new_exec_group()
                         for input_path in input_paths:
-                            # Gzipped files are unpacked first
-                            # !!! Might be worth a try to use fifos instead of
-                            #     temp files!!!
-                            # 1. Create temporary fifo
-                            temp_fifo = run.add_temporary_file(
-                                "fifo-%s" %
-                                os.path.basename(input_path))
-                            temp_fifos.append(temp_fifo)
-                            mkfifo = [self.get_tool('mkfifo'), temp_fifo]
-                            exec_group.add_command(mkfifo)
-
-                            is_gzipped = True if os.path.splitext(input_path)[1]\
-                                in ['.gz', '.gzip'] else False
-
-                            # 2. Output files to fifo
-                            if is_gzipped:
-                                with exec_group.add_pipeline() as unzip_pipe:
-                                    # 2.1 command: Read file in 'dd-blocksize'
-                                    # chunks
-                                    dd_in = [
-                                        self.get_tool('dd'),
-                                        'ibs=%s' %
-                                        self.get_option('dd-blocksize'),
-                                        'if=%s' % input_path
-                                    ]
-                                    # 2.2 command: Uncompress file to fifo
-                                    pigz = [self.get_tool('pigz'),
-                                            '--processes',
-                                            str(self.get_cores()),
-                                            '--decompress',
-                                            '--blocksize',
-                                            self.get_option('pigz-blocksize'),
-                                            '--stdout']
-                                    # 2.3 Write file in 'dd-blocksize' chunks
-                                    # to fifo
-                                    dd_out = [
-                                        self.get_tool('dd'),
-                                        'obs=%s' %
-                                        self.get_option('dd-blocksize'),
-                                        'of=%s' % temp_fifo
-                                    ]
-
-                                    unzip_pipe.add_command(dd_in)
-                                    unzip_pipe.add_command(pigz)
-                                    unzip_pipe.add_command(dd_out)
-                            elif os.path.splitext(input_path)[1] in\
-                                    ['.fastq', '.fq']:
-                                # 2.1 command: Read file in 'dd-blocksize' chunks and
-                                # write to fifo in 'dd-blocksize' chunks
-                                dd_in = [
-                                    self.get_tool('dd'),
-                                    'bs=%s' %
-                                    self.get_option('dd-blocksize'),
-                                    'if=%s' % input_path,
-                                    'of=%s' % temp_fifo
-                                ]
-                                exec_group.add_command(dd_in)
-                            else:
+                            if os.path.splitext(input_path)[1] not in \
+                                    ['.gz', '.gzip', '.fastq', '.fq']:
                                 raise StepError(
                                     self, "File %s does not end with any "
                                     "expected suffix (fastq.gz or "
                                     "fastq). Please fix that issue." %
                                     input_path)
-                        # 3. Read data from fifos
+                        stdout_path = run.add_output_file(
+                            "%s" % read,
+                            "%s%s.fastq.gz" %
+                            (run_id, read_types[read]),
+                            input_paths)
+                        exec_group = run.new_exec_group()
+                        if all(os.path.splitext(input_path)[1] in
+                               ['.gz', '.gzip'] for input_path in input_paths):
+                            # 1. Concatenate the gzip files without
+                            # recompression
+                            concat = [self.get_tool('concatenate_files'),
+                                      '--gzip']
+                            if self.get_option('verify-gzip'):
+                                concat.append('--verify')
+                            concat.extend(['--output', stdout_path])
+                            concat.extend(input_paths)
+                            exec_group.add_command(concat)
+                            continue
+                        temp_fifos = list()
+                        for input_path in input_paths:
+                            # 1. Stream (decompressed) files
+                            temp_fifos.append(
+                                exec_group.add_input_stream(input_path))
+                        # 2. Read data from fifos and gzip it
                         with exec_group.add_pipeline() as pigz_pipe:
-                            # 3.1 command: Read from ALL fifos
+                            # 2.1 command: Read from ALL fifos
                             cat = [self.get_tool('cat')]
                             cat.extend(temp_fifos)
                             pigz_pipe.add_command(cat)
 
-                            # 3.2 Gzip output file
-                            # if self.get_option('compress-output'):
-                            pigz = [self.get_tool('pigz'),
-                                    '--processes',
-                                    str(self.get_cores()),
-                                    '--blocksize',
-                                    self.get_option('pigz-blocksize'),
-                                    '--stdout']
-                            pigz_pipe.add_command(pigz)
-
-                            # 3.3 command: Write to output file in
-                            # 'dd-blocksize' chunks
-                            stdout_path = run.add_output_file(
-                                "%s" % read,
-                                "%s%s.fastq.gz" %
-                                (run_id, read_types[read]),
-                                input_paths)
-                            dd = [
-                                self.get_tool('dd'),
-                                'obs=%s' % self.get_option('dd-blocksize'),
-                                'of=%s' % stdout_path
-                            ]
-                            pigz_pipe.add_command(dd)
+                            # 2.2 command: Gzip to output file
+                            pigz_pipe.add_output_stream(stdout_path)
@@ -13,6 +13,9 @@ class MergeFastxFiles(AbstractStep):
     This step merges all .fastq/a(.gz) files belonging to a certain sample.
     First and second read files are merged separately. The output files are
     gzipped.
+
+    If all input files of a read are gzipped, they are concatenated as they
+    are, since a concatenation of gzip files is a valid gzip file.
     '''
 
     def __init__(self, pipeline):
@@ -28,6 +31,16 @@ class MergeFastxFiles(AbstractStep):
 
         self.require_tool('pigz')
         self.require_tool('echo')
+        self.require_tool('concatenate_files')
+
+        self.add_option(
+            'verify-gzip',
+            bool,
+            optional=True,
+            default=True,
+            description="Decompress gzipped input files while they are "
+            "concatenated to check that they are complete. The decompressed "
+            "data is discarded.")
 
     def _getFastFormat(self, fast_file, is_gzipped):
 
@@ -113,7 +126,16 @@ class MergeFastxFiles(AbstractStep):
                             (run_id, read_types[read], fast_format),
                             input_paths)
 
-                        if is_gzipped:
+                        if all(os.path.splitext(input_path)[1] in
+                               ['.gz', '.gzip'] for input_path in input_paths):
+                            concat = [self.get_tool('concatenate_files'),
+                                      '--gzip']
+                            if self.get_option('verify-gzip'):
+                                concat.append('--verify')
+                            concat.extend(['--output', p_out])
+                            concat.extend(input_paths)
+                            exec_group.add_command(concat)
+                        elif is_gzipped:
                             with exec_group.add_pipeline() as unzip_pipe:
                                 pigz_input = [self.get_tool('pigz'),
                                               '--decompress', '--stdout']
@@ -6,7 +6,9 @@ logger = getLogger('uap_logger')
 
 class MergeGenecounts(AbstractStep):
     '''
-
+    Merges the gene counts of all runs, produced by htseq-count or
+    featureCounts, into a single file. The counts are either summed up or
+    written as a genes x samples matrix.
     '''
 
     def __init__(self, pipeline):
@@ -29,6 +31,14 @@ class MergeGenecounts(AbstractStep):
             optional=False,
             description="tool name (htseq_count: htc, featureCounts: fc)")
 
+        self.add_option(
+            'matrix',
+            bool,
+            optional=True,
+            default=False,
+            description="Write a genes x samples matrix instead of the "
+            "summed counts.")
+
         # required tools
         self.require_tool('merge_genecounts')
 
@@ -56,5 +66,7 @@ class MergeGenecounts(AbstractStep):
                 '-p', file_name,
                 ' '.join(gc_files)
             ]
+            if self.get_option('matrix'):
+                merge_command.insert(-1, '--matrix')
             merge_exec_group = run.new_exec_group()
             merge_exec_group.add_command(merge_command)
@@ -10,69 +10,59 @@ logger = getLogger('uap_logger')
 class mergeNumpyZipArrays(AbstractStep):
     '''
     This step can be used to concatenate multiple zipped Numpy arrays which are
-    the output of deepTools multiBamSummary subcommand.
+    the output of deepTools multiBamSummary subcommand. The matrices of all
+    runs are copied column by column into a preallocated, memory mapped
+    result, so only one input matrix is held in memory.
 
     Usage example::
 
-        merge_numpy_arrays.py [-h] [file-1.npz file-2.npz ... file-n.npz]  files
+        merge_numpy_arrays.py [-h] [file-1.npz file-2.npz ... file-n.npz]  output
 
     '''
 
     def __init__(self, pipeline):
         super(mergeNumpyZipArrays, self).__init__(pipeline)
 
-        self.set_cores(10)
+        self.set_cores(1)
 
         self.add_connection('in/read-coverage')
         self.add_connection('out/read-coverage')
 
-        self.add_option('subcommand', str, optional=False,
-                        description='The arguments to multiBamSummary.')
+        self.add_option('subcommand', str, optional=True,
+                        description='DEPRECATED! Not used anymore.')
+        self.add_option('format', str, optional=True, default='npz',
+                        choices=['npz', 'npy'],
+                        description='npz: compressed matrix and labels as '
+                        'written by multiBamSummary. npy: uncompressed, '
+                        'memory mappable matrix with the labels in a '
+                        'separate text file.')
 
         self.require_tool('merge_numpy_arrays.py')
 
     def runs(self, run_ids_connections_files):
-        subcommand = self.get_option('subcommand')
+        input_paths = list()
         for run_id in run_ids_connections_files.keys():
-            # Collect input_paths and labels for multiBamSummary
-            input_paths = run_ids_connections_files[run_id]['in/alignments']
-            labels = list()
-            for f in input_paths:
-                if not f.endswith(".bam"):
-                    raise StepError(self, "Not a BAM file: %s" % f)
-                if len(input_paths) > 1:
-                    labels.append("%s-%s" % (run_id, input_paths.index(f)))
-                else:
-                    labels.append(run_id)
+            for f in run_ids_connections_files[run_id]['in/read-coverage']:
+                if f is None:
+                    continue
+                if not f.endswith(".npz"):
+                    raise StepError(self, "Not a .npz file: %s" % f)
+                input_paths.append(f)
 
-            with self.declare_run(run_id) as run:
-                # Let's compile the command
-                with run.new_exec_group() as multi_bam_summary_eg:
-                    # 1. multiBamSummary command
-                    multi_bam_summary = [
-                        self.get_tool('multiBamSummary'), subcommand]
-                    # Append list of input BAM files
-                    multi_bam_summary.append('--bamfiles')
-                    multi_bam_summary.extend(input_paths)
-                    # Append name of the output file
-                    multi_bam_summary.append('--outFileName')
-                    multi_bam_summary.append(
-                        run.add_output_file(
-                            'read-coverage',
-                            '%s.npz' % run_id,
-                            input_paths
-                        )
-                    )
-                    # Append list of BED files for BED-file subcommand
-                    if subcommand == "BED-file":
-                        multi_bam_summary.append('--BED')
-                        multi_bam_summary.extend(self.get_option('bed-file'))
-                    # Append list of labels
-                    multi_bam_summary.append('--labels')
-                    multi_bam_summary.extend(labels)
-                    # Append number of processors
-                    multi_bam_summary.extend(['--numberOfProcessors',
-                                              str(self.get_cores())])
+        if not input_paths:
+            return
 
-                    # Add multiBamSummary to execution group
-                    multi_bam_summary_eg.add_command(multi_bam_summary)
+        with self.declare_run('merged') as run:
+            merge = [self.get_tool('merge_numpy_arrays.py')]
+            merge.extend(input_paths)
+            if self.get_option('format') == 'npy':
+                merge.append(run.add_output_file(
+                    'read-coverage', 'merged.npy', input_paths))
+                run.add_output_file(
+                    'read-coverage', 'merged.labels.txt', input_paths)
+            else:
+                merge.append(run.add_output_file(
+                    'read-coverage', 'merged.npz', input_paths))
+            merge.extend(['--format', self.get_option('format')])
+            with run.new_exec_group() as merge_eg:
+                merge_eg.add_command(merge)
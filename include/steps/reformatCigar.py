@@ -43,13 +43,14 @@ class Reformatcigar(AbstractStep):
             int,
             optional=True,
             description='Number of threads 2B started. (Default: 1). '
-            'Beware that this is only for (un-)compressing, '
-            'the reformating is using a single CPU only.')
+            'Used for (un-)compressing and for reformatting blocks of '
+            'the alignments in parallel.')
         self.add_option(
             'blocksize',
             int,
             optional=True,
-            description='Blocksize to read the input file, in Megabytes.'
+            description='Blocksize to read the input file, in Megabytes. '
+            'Each block is reformatted by one process. '
             'Default: 2 (2,000,000 bytes)')
 
     def runs(self, run_ids_connections_files):
@@ -112,9 +112,6 @@ class SamtoolsSort(AbstractStep):
                 elif len(input_paths) != 1:
                     raise StepError(
                         self, "Expected exactly one alignments file.")
-                else:
-                    is_gzipped = True if os.path.splitext(input_paths[0])[1]\
-                        in ['.gz', '.gzip'] else False
 
                 if self.is_option_set_in_config('temp-sort-dir'):
                     if not os.path.isdir(self.get_option('temp-sort-dir')):
@@ -137,22 +134,9 @@ class SamtoolsSort(AbstractStep):
 
                 with run.new_exec_group() as exec_group:
                     with exec_group.add_pipeline() as pipe:
-                        # 0 use dd to read the data
+                        # 0 read and uncompress the data
                         if self.get_option('fifo'):
-                            dd_in = [
-                                self.get_tool('dd'),
-                                'ibs=%s' % self.get_option('dd-blocksize'),
-                                'if=%s' % input_paths[0]
-                            ]
-                            pipe.add_command(dd_in)
-
-                            # 0.1 command: Uncompress file to fifo
-                            if is_gzipped:
-                                pigz = [self.get_tool('pigz'),
-                                        '--decompress',
-                                        '--processes', '1',
-                                        '--stdout']
-                                pipe.add_command(pigz)
+                            pipe.add_input_stream(input_paths[0], cores=1)
                         # 1 command: Sort BAM input
                         samtools_sort = [
                             self.get_tool('samtools'), 'sort',
@@ -191,22 +175,10 @@ class SamtoolsSort(AbstractStep):
 
                         if self.get_option('fifo'):
                             samtools_sort.append('-')
-                            pipe.add_command(samtools_sort)
-                            samtools_sort = [
-                                self.get_tool('dd'),
-                                'obs=%s' % self.get_option('dd-blocksize')
-                            ]
                         else:
                             samtools_sort.extend(input_paths)
+                        pipe.add_command(samtools_sort)
 
-                        if suffix in ['CRAM', 'BAM']:
-                            # write output directly
-                            pipe.add_command(
-                                samtools_sort, stdout_path=out_path)
-                        else:
-                            # output is sam needs to be compressed
-                            pipe.add_command(samtools_sort)
-
-                            pigz = [self.get_tool('pigz'),
-                                    '--stdout']
-                            pipe.add_command(pigz, stdout_path=out_path)
+                        # CRAM and BAM are written directly, SAM is
+                        # compressed
+                        pipe.add_output_stream(out_path)
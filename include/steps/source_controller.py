@@ -9,9 +9,15 @@ logger = getLogger('uap_logger')
 
 class SourceController(AbstractStep):
     '''
-    This step combines all inputs, produces a symlink to each file
+    This step combines all inputs, produces a link to each file
     and hashes them. It may be use to inherit from source steps
     so changes in the source files can be detected later on.
+
+    By default the links are symbolic links. With ``link-type: hardlink``
+    the files are reflinked where the file system supports it and
+    hardlinked otherwise, falling back to symbolic links across file
+    systems. ``link-type: copy`` copies and hashes the data in the same
+    pass instead of that last fallback.
     '''
 
     def __init__(self, pipeline):
@@ -35,14 +41,37 @@ class SourceController(AbstractStep):
             optional=True,
             default=4,
             description='Number of threads used to calculate the hash sums.')
+        self.add_option(
+            'link-type',
+            str,
+            optional=True,
+            default='symlink',
+            choices=['symlink', 'hardlink', 'copy'],
+            description='symlink: create symbolic links, the outputs then '
+            'follow the source files if they are moved. hardlink: reflink or '
+            'hardlink the files, in this order of preference, and create '
+            'symbolic links where neither is possible. copy: like hardlink '
+            'but copy the data instead of creating symbolic links.')
 
     def runs(self, cc):
         self.set_cores(self.get_option('cores'))
+        link_type = self.get_option('link-type')
+        if link_type != 'symlink':
+            # only required here to keep the tool versions of symlink runs
+            self.require_tool('transfer_file')
         group = self.declare_run('links')
         execg = group.new_exec_group()
         for run_id, files in cc.connection_items('in/raw'):
             for file in files:
                 link_name = run_id + '-' + os.path.basename(file)
                 link = group.add_output_file('merged', link_name, [file])
-                ln = [self.get_tool('ln'), '-s', file, link_name]
-                execg.add_command(ln)
+                if link_type == 'symlink':
+                    ln = [self.get_tool('ln'), '-s', file, link_name]
+                    execg.add_command(ln)
+                    continue
+                transfer = [self.get_tool('transfer_file'), '--link']
+                if link_type == 'hardlink':
+                    transfer.append('--no-copy')
+                transfer.extend(self.get_hash_hint_args())
+                transfer.extend([file, link])
+                execg.add_command(transfer)
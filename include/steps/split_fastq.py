@@ -9,7 +9,10 @@ logger = getLogger('uap_logger')
 
 class SplitFastq(AbstractStep):
     '''
+    Splits FASTQ files into chunks of readcount reads, one run per chunk.
 
+    Every run copies the raw bytes of its chunk and stops reading the input
+    after it, the reads are not parsed.
     '''
 
     def __init__(self, pipeline):
@@ -37,7 +40,7 @@ class SplitFastq(AbstractStep):
                         description="Number of outfiles")
 
         # required tools
-        self.require_tool('split_fastqn')
+        self.require_tool('split_fastq')
 
     def get_line_count(self, filename):
         # TODO: if file is gzipped, first unzip!
@@ -97,7 +100,7 @@ class SplitFastq(AbstractStep):
                                                      input_fileset)
 
                     split_fastq_r1 = [
-                        self.get_tool('split_fastqn'),
+                        self.get_tool('split_fastq'),
                         '-i', r1,
                         '-n', str(readcount),
                         '-o', '.',
@@ -112,7 +115,7 @@ class SplitFastq(AbstractStep):
 
                     if paired_end:
                         split_fastq_r2 = [
-                            self.get_tool('split_fastqn'),
+                            self.get_tool('split_fastq'),
                             '-i', r2,
                             '-n', str(readcount),
                             '-o', '.',
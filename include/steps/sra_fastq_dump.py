@@ -287,25 +287,15 @@ class SraFastqDump (AbstractStep):
                                     "got this %s" % input_paths)
 
                 with run.new_exec_group() as exec_group:
-                    # 1. Create FIFO for reading sra file
-                    fifo_path_sra = run.add_temporary_file(
-                        'sra-fifo', designation='input')
-                    mkfifo_sra = [self.get_tool('mkfifo'), fifo_path_sra]
-                    exec_group.add_command(mkfifo_sra)
+                    # 1. Read (gzipped) sra file
+                    sra_path = exec_group.add_input_stream(input_paths[0])
 
-                    # 2. Read sra file and output to FIFO
-                    dd_sra = [self.get_tool('dd'),
-                              'bs=%s' % self.get_option('dd-blocksize'),
-                              'if=%s' % input_paths[0],
-                              'of=%s' % fifo_path_sra]
-                    exec_group.add_command(dd_sra)
-
-                    # 3. Run fastq-dump
+                    # 2. Run fastq-dump
 
                     # with exec_group.add_pipeline() as fastq_dump_pipe:
                     fastq_dump = [self.get_tool('fastq-dump'), '--stdout']
                     fastq_dump.extend(sra_option_list)
-                    fastq_dump.extend(fifo_path_sra)
+                    fastq_dump.append(sra_path)
 
                     exec_group.add_command(
                         fastq_dump,
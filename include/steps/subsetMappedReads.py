@@ -3,7 +3,6 @@ import sys
 from abstract_step import *
 import process_pool
 import yaml
-import os
 from logging import getLogger
 
 logger = getLogger('uap_logger')
@@ -58,9 +57,6 @@ class subsetMappedReads(AbstractStep):
                 elif len(input_paths) != 1:
                     raise StepError(
                         self, "Expected exactly one alignments file.")
-                else:
-                    is_gzipped = True if os.path.splitext(input_paths[0])[1]\
-                        in ['.gz', '.gzip'] else False
 
                 if not self.is_option_set_in_config('Nreads'):
                     raise StepError(
@@ -69,20 +65,8 @@ class subsetMappedReads(AbstractStep):
                 with run.new_exec_group() as exec_group:
 
                     with exec_group.add_pipeline() as pipe:
-                        # 1. command: Read file in 4MB chunks
-                        dd_in = [self.get_tool('dd'),
-                                 'ibs=4M',
-                                 'if=%s' % input_paths[0]]
-                        pipe.add_command(dd_in)
-
-                        # 1.1 command: Uncompress file to fifo
-                        if is_gzipped:
-                            pigz = [self.get_tool('pigz'),
-                                    '--decompress',
-                                    '--processes', str(self.get_cores()),
-                                    '--stdout'
-                                    ]
-                            pipe.add_command(pigz)
+                        # 1. command: Read and uncompress file
+                        pipe.add_input_stream(input_paths[0])
 
                         # 2. command: Read sam file
                         # extract only reads that were aligned and include only
@@ -112,9 +96,6 @@ class subsetMappedReads(AbstractStep):
                             self.get_tool('head'), '-%s' % N
                         ]
                         pipe.add_command(get_Nreads)
-
-                        dd_out = [self.get_tool('dd'), 'obs=4M']
-                        pipe.add_command(
-                            dd_out, stdout_path=run.add_output_file(
-                                'alignments', '%s.N%s.reads.sam' %
-                                (run_id, self.get_option('Nreads')), input_paths))
+                        pipe.add_output_stream(run.add_output_file(
+                            'alignments', '%s.N%s.reads.sam' %
+                            (run_id, self.get_option('Nreads')), input_paths))
@@ -11,6 +11,9 @@ class Tcount2gcount(AbstractStep):
     This step converts transcript based count files, e.g., from kallosto or
     salmon, into a gene base count files of the same format by summing
     counts of transcripts of the same gene.
+
+    The transcript to gene mapping is parsed once and cached in the step
+    output directory, where all runs share it.
     '''
 
     def __init__(self, pipeline):
@@ -41,6 +44,10 @@ class Tcount2gcount(AbstractStep):
         self.add_option('kallisto-extended', bool, optional=True,
                         description='writes extended format includign tpm. ')
 
+        self.add_option('cache-mapping', bool, optional=True, default=True,
+                        description='Cache the parsed mapping in the step '
+                        'output directory for all runs.')
+
         # required tools
         self.require_tool('tcount2gcount')
 
@@ -79,6 +86,10 @@ class Tcount2gcount(AbstractStep):
                 if self.is_option_set_in_config('kallisto-extended'):
                     cmd.append('--kallisto-extended')
 
+                if self.get_option('cache-mapping'):
+                    cmd.extend(['--cache-dir', os.path.join(
+                        self.get_output_directory(), '.mapping-cache')])
+
                 cmd.extend(['-i', counts,
                             '-t', tool_name,
                             '-o', file_name])
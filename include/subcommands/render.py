@@ -9,6 +9,7 @@ import os
 import re
 import socket
 import io
+import math
 import subprocess
 import textwrap
 import yaml
@@ -81,6 +82,40 @@ def gradient(x, gradient):
     return mix(colorA, colorB, amount)
 
 
+def throughput_colors(processes):
+    '''
+    Returns the edge attributes for the stdout stream of each process in
+    *processes*, colored by its throughput relative to the fastest and
+    slowest stream on a logarithmic scale, from red (slow) to green (fast).
+    '''
+    speeds = dict()
+    for proc_info in processes:
+        report = proc_info.get('stdout_copy', dict())
+        if report.get('length', 0) == 0:
+            continue
+        if 'bytes_per_second' in report:
+            speed = report['bytes_per_second']
+        else:
+            try:
+                speed = float(report['length']) / (
+                    report['end_time'] - report['start_time']).total_seconds()
+            except (KeyError, ZeroDivisionError):
+                continue
+        speeds[proc_info['pid']] = max(speed, 1.0)
+    if not speeds:
+        return dict()
+    low = math.log(min(speeds.values()))
+    high = math.log(max(speeds.values()))
+    colors = dict()
+    for pid, speed in speeds.items():
+        x = (math.log(speed) - low) / (high - low) if high > low else 1.0
+        colors[pid] = {
+            'color': gradient(x, GRADIENTS['traffic_lights']),
+            'penwidth': '%1.1f' % (1.0 + 2.0 * x),
+            'tooltip': '%s/s' % misc.bytes_to_str(speed)}
+    return colors
+
+
 def main(args):
     p = pipeline.Pipeline(arguments=args)
 
@@ -357,15 +392,21 @@ def create_dot_file_from_annotations(logs, args):
 
     f.write("    // edges\n")
     f.write("\n")
-    for edge_pair in hash['edges'].keys():
+    for edge_pair, edge_info in hash['edges'].items():
         if edge_pair[0] in hash['nodes'] and edge_pair[1] in hash['nodes']:
-            f.write("    _%s -> _%s;\n" % (edge_pair[0], edge_pair[1]))
+            f.write("    _%s -> _%s" % (edge_pair[0], edge_pair[1]))
+            if len(edge_info) > 0:
+                f.write(" [%s]" % ', '.join(
+                    ['%s = "%s"' % (k, edge_info[k])
+                     for k in edge_info.keys()]
+                ))
+            f.write(";\n")
 
     f.write("\n")
 
     if len(hash['graph_labels']) == 1:
         f.write("    graph [label=\"%s\"];\n" %
-                hash['graph_labels'].values()[0])
+                list(hash['graph_labels'].values())[0])
     f.write("}\n")
 
     result = f.getvalue()
@@ -379,13 +420,13 @@ def create_hash_from_annotation(log):
         hashtag = "%s/%s/%d/%s" % (log['step']['name'],
                                    log['run']['run_id'],
                                    pid, suffix)
-        return misc.str_to_sha256(hashtag)
+        return misc.str_to_sha256(hashtag.encode())
 
     def file_hash(path):
-        if path in log['step']['known_paths']:
-            if 'real_path' in log['step']['known_paths'][path]:
-                path = log['step']['known_paths'][path]['real_path']
-        return misc.str_to_sha256(path)
+        if path in log['run']['known_paths']:
+            if 'real_path' in log['run']['known_paths'][path]:
+                path = log['run']['known_paths'][path]['real_path']
+        return misc.str_to_sha256(path.encode())
 
     pipe_hash = dict()
     pipe_hash['nodes'] = dict()
@@ -394,25 +435,25 @@ def create_hash_from_annotation(log):
     pipe_hash['graph_labels'] = dict()
 
     def add_file_node(path):
-        if path not in log['step']['known_paths']:
+        if path not in log['run']['known_paths']:
             return
 
-        if 'real_path' in log['step']['known_paths'][path]:
-            path = log['step']['known_paths'][path]['real_path']
+        if 'real_path' in log['run']['known_paths'][path]:
+            path = log['run']['known_paths'][path]['real_path']
         label = os.path.basename(path)
         color = '#ffffff'
-        if log['step']['known_paths'][path]['type'] in ['fifo', 'directory']:
+        if log['run']['known_paths'][path]['type'] in ['fifo', 'directory']:
             color = '#c4f099'
-        elif log['step']['known_paths'][path]['type'] == 'file':
+        elif log['run']['known_paths'][path]['type'] == 'file':
             color = '#8ae234'
-        elif log['step']['known_paths'][path]['type'] == 'step_file':
+        elif log['run']['known_paths'][path]['type'] == 'step_file':
             color = '#97b7c8'
-            label = log['step']['known_paths'][path]['label']
-            if path in log['step']['known_paths']:
-                if 'size' in log['step']['known_paths'][path]:
+            label = log['run']['known_paths'][path]['label']
+            if path in log['run']['known_paths']:
+                if 'size' in log['run']['known_paths'][path]:
                     label += "\\nFilesize: %s" % misc.bytes_to_str(
-                        log['step']['known_paths'][path]['size'])
-        pipe_hash['nodes'][misc.str_to_sha256(path)] = {
+                        log['run']['known_paths'][path]['size'])
+        pipe_hash['nodes'][misc.str_to_sha256(path.encode())] = {
             'label': label,
             'fillcolor': color
         }
@@ -452,7 +493,7 @@ def create_hash_from_annotation(log):
                     is_output_file = False
                 elif name in ['mkdir', 'mkfifo']:
                     is_output_file = True
-                for known_path in log['step']['known_paths'].keys():
+                for known_path in log['run']['known_paths'].keys():
                     # Check if arg contains a known path ...
                     if known_path in arg:
                         # ... if so add this file to the graph
@@ -485,7 +526,7 @@ def create_hash_from_annotation(log):
                                arg in proc_info['hints']['writes']:
                                 io_type = 'output'
                             if io_type is None:
-                                io_type = log['step']['known_paths'][known_path]['designation']
+                                io_type = log['run']['known_paths'][known_path]['designation']
                                 if io_type is None:
                                     io_type = 'input'
 
@@ -584,14 +625,22 @@ def create_hash_from_annotation(log):
                 size_label = '(empty)'
                 if ('length' in proc_info[key]) and \
                    (proc_info[key]['length'] > 0):
-                    speed = float(proc_info[key]['length']) / (
-                        proc_info[key]['end_time'] -
-                        proc_info[key]['start_time']).total_seconds()
+                    if 'bytes_per_second' in proc_info[key]:
+                        speed = proc_info[key]['bytes_per_second']
+                    else:
+                        speed = float(proc_info[key]['length']) / (
+                            proc_info[key]['end_time'] -
+                            proc_info[key]['start_time']).total_seconds()
                     speed_label = "%s/s" % misc.bytes_to_str(speed)
                     size_label = "%s / %s lines (%s)" % (
                         misc.bytes_to_str(proc_info[key]['length']),
                         "{:,}".format(proc_info[key]['lines']),
                         speed_label)
+                    if 'read_blocked' in proc_info[key]:
+                        size_label += "\\nwaited %1.1fs reading, " \
+                            "%1.1fs writing" % (
+                                proc_info[key]['read_blocked'],
+                                proc_info[key]['write_blocked'])
                 label = "%s\\n%s" % (which, size_label)
 
                 something_went_wrong = False
@@ -632,31 +681,37 @@ def create_hash_from_annotation(log):
                     path = proc_info[key]['sink_full_path']
                     add_file_node(path)
 
+    stream_colors = throughput_colors(log['pipeline_log']['processes'])
     for proc_info in copy.deepcopy(log['pipeline_log']['processes']):
         pid = proc_info['pid']
         if 'use_stdin_of' in proc_info:
             other_pid = proc_info['use_stdin_of']
             key_value = (pid_hash(other_pid, 'stdout'), pid_hash(pid))
-            pipe_hash['edges'][key_value] = dict()
+            pipe_hash['edges'][key_value] = dict(
+                stream_colors.get(other_pid, {}))
         for which in ['stdout', 'stderr']:
             key = "%s_copy" % which
             if key in proc_info:
                 other_pid = proc_info[key]['pid']
+                edge_info = dict()
+                if which == 'stdout':
+                    edge_info = stream_colors.get(pid, {})
                 key_value = (pid_hash(pid), pid_hash(pid, which))
-                pipe_hash['edges'][key_value] = dict()
+                pipe_hash['edges'][key_value] = dict(edge_info)
                 if 'sink_full_path' in proc_info[key]:
                     pipe_hash['edges'][(
                         pid_hash(pid, which),
-                        file_hash(proc_info[key]['sink_full_path']))] = dict()
+                        file_hash(proc_info[key]['sink_full_path']))] = \
+                        dict(edge_info)
 
     # define nodes which go into subgraph
     step_file_nodes = dict()
-    for path, path_info in log['step']['known_paths'].items():
+    for path, path_info in log['run']['known_paths'].items():
         if path_info['type'] == 'step_file':
             step_file_nodes[file_hash(path)] = path_info['designation']
 
     task_name = "%s/%s" % (log['step']['name'], log['run']['run_id'])
-    cluster_hash = misc.str_to_sha256(task_name)
+    cluster_hash = misc.str_to_sha256(task_name.encode())
     pipe_hash['clusters'][cluster_hash] = dict()
     pipe_hash['clusters'][cluster_hash]['task_name'] = task_name
     pipe_hash['clusters'][cluster_hash]['group'] = list()
@@ -682,6 +737,12 @@ def create_hash_from_annotation(log):
             ),
             log['pipeline_log']['process_watcher']['max']['sum']['memory_percent'])
         pipe_hash['graph_labels'][task_name] += text
+    for summary in log['pipeline_log'].get('pipelines', list()):
+        if len(summary['stages']) > 1 and summary['bottleneck']:
+            pipe_hash['graph_labels'][task_name] += \
+                "Bottleneck of %s: %s\\l" % (
+                    ' | '.join(stage['name'] for stage in summary['stages']),
+                    summary['bottleneck'])
     if 'signal' in log:
         pipe_hash['graph_labels'][task_name] += "Caught signal: %s\\l" % (
             process_pool.ProcessPool.SIGNAL_NAMES[log['signal']])
@@ -7,6 +7,7 @@ import logging
 import os
 import errno
 import re
+import shlex
 import subprocess
 import yaml
 from tqdm import tqdm
@@ -172,14 +173,22 @@ def main(args):
         submit_script = submit_script.replace(
             "#{UAP_CONFIG}", yaml.dump(p.config))
 
+        task_id = p.get_cluster_command('array_task_id')
         command = ['exec', os.path.join(p.get_uap_path(), 'uap'), '-vv']
         if p.args.debugging:
             command.append('--debugging')
+        if p.args.trace:
+            # one trace per job, e.g. trace.json -> trace.step.3.json
+            root, ext = os.path.splitext(p.args.trace)
+            command.extend([
+                '--trace', shlex.quote('%s.%s.' % (root, step_name)) +
+                '"${' + task_id + '}"' + shlex.quote(ext or '.json')])
+            if p.args.profile:
+                command.append('--profile')
         command.extend(['<(cat <&123)', 'run-locally'])
         if p.args.force:
             command.append('--force')
 
-        task_id = p.get_cluster_command('array_task_id')
         command.append('"${array_jobs[$' + task_id + ']}"')
 
         submit_script = submit_script.replace("#{COMMAND}", ' '.join(command))
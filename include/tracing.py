@@ -0,0 +1,166 @@
+'''
+Records timed spans of a uap invocation in the trace event format of
+Chrome, to tell the time uap spends on bookkeeping from the time of the
+tools. The trace can be opened in ``chrome://tracing`` or
+https://ui.perfetto.dev.
+
+Tracing is off until :func:`enable` is called (``uap --trace <file>``), so
+spans cost a function call otherwise. Usage example::
+
+    import tracing
+
+    with tracing.span('read_config', 'pipeline', profile=True):
+        ...
+
+    @tracing.traced('get_state', 'state',
+                    lambda run: {'run': run.get_run_id()})
+    def get_state(self):
+        ...
+
+Spans marked with *profile* are additionally recorded with cProfile if
+``--profile`` is given, each into its own ``<trace>.<span>.<n>.cprof``.
+Spans nested in a profiled span are not profiled separately.
+'''
+
+import cProfile
+import functools
+import json
+import os
+import re
+import threading
+import time
+from logging import getLogger
+
+logger = getLogger('uap_logger')
+
+_trace_path = None
+_events = None
+_profile = False
+_profiling = False
+_profile_counts = dict()
+# perf_counter is precise, time since the epoch lines up several traces
+_origin = time.time() - time.perf_counter()
+
+
+def enable(path, profile=False):
+    '''
+    Starts recording spans which are written to *path* by :func:`write`.
+    With *profile*, the spans marked for it are profiled too.
+    '''
+    global _trace_path, _events, _profile
+    _trace_path = path
+    _events = list()
+    _profile = profile
+    _events.append({
+        'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+        'args': {'name': 'uap %d' % os.getpid()}})
+
+
+def enabled():
+    return _events is not None
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    def __init__(self, name, category, profile, args):
+        self.name = name
+        self.category = category
+        self.profile = profile and _profile
+        self.args = args
+
+    def __enter__(self):
+        global _profiling
+        self.profiler = None
+        if self.profile and not _profiling:
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler is active, e.g. from --profiling
+                self.profiler = None
+            else:
+                _profiling = True
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        global _profiling
+        end = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profiling = False
+            _dump_profile(self.name, self.profiler)
+        event = {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': (_origin + self.start) * 1e6,
+            'dur': (end - self.start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()}
+        if self.args:
+            event['args'] = self.args
+        if type is not None:
+            event.setdefault('args', dict())['error'] = type.__name__
+        # forked children share the list but never write it
+        if _events is not None:
+            _events.append(event)
+        return False
+
+
+def span(name, category='uap', profile=False, args=None):
+    '''
+    Returns a context manager that records the time spent in it as span
+    *name* of *category*. *args* is a dictionary shown with the span.
+    '''
+    if _events is None:
+        return _NO_SPAN
+    return _Span(name, category, profile, args)
+
+
+def traced(name, category='uap', describe=None, profile=False):
+    '''
+    Decorator that records each call of a method as span. *describe* is
+    called with the object and returns the args of the span.
+    '''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if _events is None:
+                return method(self, *args, **kwargs)
+            span_args = describe(self) if describe else None
+            with _Span(name, category, profile, span_args):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _dump_profile(name, profiler):
+    name = re.sub(r'[^\w.-]+', '_', name)
+    count = _profile_counts.get(name, 0) + 1
+    _profile_counts[name] = count
+    path = '%s.%s.%d.cprof' % (_trace_path, name, count)
+    profiler.dump_stats(path)
+    logger.debug('Wrote profile of %s to %s.' % (name, path))
+
+
+def write():
+    '''
+    Writes the recorded spans as trace event JSON.
+    '''
+    if _events is None:
+        return
+    with open(_trace_path, 'w') as f:
+        json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms'}, f)
+    logger.info('Wrote trace of %d spans to %s.' % (len(_events) - 1,
+                                                     _trace_path))
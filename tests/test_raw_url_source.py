@@ -0,0 +1,143 @@
+'''
+Runs the raw_url_source step against a local HTTP server and checks the
+single pass download, i.e. curl | compare_secure_hashes | [pigz -d] | dd.
+
+Run from the uap directory with:
+
+    python -m unittest discover -s tests
+'''
+import functools
+import gzip
+import hashlib
+import http.server
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import yaml
+
+uap_path = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..'))
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RawUrlSourceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.served = tempfile.mkdtemp(prefix='uap-served-')
+        # larger than the pipe and dd buffers, so the data is streamed
+        cls.data = b''.join(b'line %d of the download\n' % i
+                            for i in range(200000))
+        with open(os.path.join(cls.served, 'data.txt'), 'wb') as f:
+            f.write(cls.data)
+        with gzip.open(os.path.join(cls.served, 'data.txt.gz'), 'wb') as f:
+            f.write(cls.data)
+        handler = functools.partial(QuietHandler, directory=cls.served)
+        cls.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.served)
+
+    def setUp(self):
+        self.work = tempfile.mkdtemp(prefix='uap-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.work)
+
+    def url(self, filename):
+        return 'http://127.0.0.1:%d/%s' % (self.server.server_port, filename)
+
+    def run_download(self, **options):
+        '''
+        Runs a pipeline with a single raw_url_source step configured with
+        *options* and returns the path of its output and the uap process.
+        '''
+        destination = os.path.join(self.work, 'out')
+        os.mkdir(destination)
+        config = {
+            'destination_path': destination,
+            'steps': {'download (raw_url_source)': options},
+            'tools': {
+                'curl': {'ignore_version': True},
+                'pigz': {'ignore_version': True},
+            },
+        }
+        config_path = os.path.join(self.work, 'config.yaml')
+        with open(config_path, 'w') as f:
+            yaml.dump(config, f, default_flow_style=False)
+        uap = subprocess.run(
+            [sys.executable, os.path.join(uap_path, 'uap.py'), config_path,
+             'run-locally', '--even-if-dirty'],
+            cwd=self.work, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out_dir = os.path.join(destination, 'download', 'download')
+        filename = os.path.basename(options['url'])
+        if options.get('uncompress'):
+            filename = os.path.splitext(filename)[0]
+        return os.path.join(out_dir, filename), uap
+
+    def assertSucceeded(self, uap):
+        self.assertEqual(uap.returncode, 0, uap.stdout.decode())
+
+    def test_matching_hash(self):
+        out_file, uap = self.run_download(
+            url=self.url('data.txt'),
+            **{'hashing-algorithm': 'sha256',
+               'secure-hash': hashlib.sha256(self.data).hexdigest()})
+        self.assertSucceeded(uap)
+        with open(out_file, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_mismatching_hash(self):
+        out_file, uap = self.run_download(
+            url=self.url('data.txt'),
+            **{'hashing-algorithm': 'sha256',
+               'secure-hash': hashlib.sha256(b'other').hexdigest()})
+        self.assertNotEqual(uap.returncode, 0, uap.stdout.decode())
+        self.assertIn(b'Mismatching secure hashes', uap.stdout)
+        self.assertFalse(os.path.exists(out_file))
+
+    def test_mismatching_hash_uncompressed(self):
+        out_file, uap = self.run_download(
+            url=self.url('data.txt.gz'), uncompress=True,
+            **{'hashing-algorithm': 'sha256',
+               'secure-hash': hashlib.sha256(b'other').hexdigest()})
+        self.assertNotEqual(uap.returncode, 0, uap.stdout.decode())
+        self.assertIn(b'Mismatching secure hashes', uap.stdout)
+        self.assertFalse(os.path.exists(out_file))
+
+    def test_gzipped_download(self):
+        with open(os.path.join(self.served, 'data.txt.gz'), 'rb') as f:
+            secure_hash = hashlib.sha256(f.read()).hexdigest()
+        out_file, uap = self.run_download(
+            url=self.url('data.txt.gz'), uncompress=True,
+            **{'hashing-algorithm': 'sha256', 'secure-hash': secure_hash})
+        self.assertSucceeded(uap)
+        with open(out_file, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_gzipped_download_kept_compressed(self):
+        out_file, uap = self.run_download(url=self.url('data.txt.gz'))
+        self.assertSucceeded(uap)
+        with gzip.open(out_file, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
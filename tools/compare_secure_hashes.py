@@ -1,15 +1,22 @@
 #! /usr/bin/env python
-import hashlib
 import sys
 import argparse
 import os
 
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import file_io
+
+
 def main():
 
     parser = argparse.ArgumentParser(
         description='This script computes a secure hash and compares it ' +
         'with a given hash value. If they do not fit the input file will be ' +
-        'renamed and a error message is output.',
+        'renamed and a error message is output.\n' +
+        'If the input file is - the data is read from stdin and can be ' +
+        'passed on\nto --output and --stdout while it is hashed, so a ' +
+        'download is\nchecked in a single pass at the end of the stream.',
         prog='compare_checksums.py',
         formatter_class=argparse.RawTextHelpFormatter)
 
@@ -19,8 +26,8 @@ def main():
                         )
 
     parser.add_argument("file_to_hash",
-                        help="file to compare checksums for",
-                        type=argparse.FileType('rb')
+                        help="file to compare checksums for, - for stdin",
+                        type=str
                         )
 
     parser.add_argument("--algorithm",
@@ -39,42 +46,92 @@ def main():
                         type=str,
                         help="secure hash used for comparision")
 
+    parser.add_argument("--block-size",
+                        dest="block_size",
+                        default=file_io.BLOCK_SIZE,
+                        type=int,
+                        help="number of bytes read at once")
+
+    parser.add_argument("--mmap",
+                        dest="mmap",
+                        action="store_true",
+                        default=False,
+                        help="read the file through a memory map")
+
+    parser.add_argument("--keep-cache",
+                        dest="keep_cache",
+                        action="store_true",
+                        default=False,
+                        help="do not drop the read file from the page cache")
+
+    parser.add_argument("--output",
+                        dest="output",
+                        default=None,
+                        type=str,
+                        help="write the data read from stdin to this file")
+
+    parser.add_argument("--stdout",
+                        dest="stdout",
+                        action="store_true",
+                        default=False,
+                        help="pass the data read from stdin on to stdout")
+
     # get arguments and call the appropriate function
     args = parser.parse_args()
 
-    computed_hash_value = hashfile(args.file_to_hash,
-                                   getattr(hashlib, args.hash_alg)()
-                                   )
-    print("Provided hash value: %s" % args.provided_hash_value)
-    print("Computed hash value: %s" % computed_hash_value)
+    file_io.configure(block_size=args.block_size, use_mmap=args.mmap,
+                      drop_cache=not args.keep_cache)
+    if args.file_to_hash == '-':
+        computed_hash_value, hashed_file = hash_stdin(args)
+    else:
+        if args.output or args.stdout:
+            parser.error("--output and --stdout require reading from stdin")
+        computed_hash_value = file_io.hash_file(args.file_to_hash,
+                                                args.hash_alg)
+        hashed_file = args.file_to_hash
+    # stdout may carry the data, so the report goes to stderr
+    report = sys.stderr if args.stdout else sys.stdout
+    print("Provided hash value: %s" % args.provided_hash_value, file=report)
+    print("Computed hash value: %s" % computed_hash_value, file=report)
 
-    file_to_hash_abspath = os.path.abspath(args.file_to_hash.name)
+    if args.provided_hash_value == computed_hash_value:
+        sys.exit()
+    if hashed_file is None:
+        sys.exit("Mismatching secure hashes!")
+    file_to_hash_abspath = os.path.abspath(hashed_file)
     abspath, filename = os.path.split(file_to_hash_abspath)
     file_to_hash_new_path = os.path.join(
         abspath, "%s.mismatching.%s" % (filename, args.hash_alg))
-    if args.provided_hash_value == computed_hash_value:
-        sys.exit()
-    else:
-        if os.path.exists(file_to_hash_new_path):
-            raise Exception("File %s already exists. Couldn't rename %s "
-                            "to %s." % (file_to_hash_new_path,
-                                        file_to_hash_abspath,
-                                        file_to_hash_new_path)
-                            )
-        os.rename(file_to_hash_abspath, file_to_hash_new_path)
-        sys.exit("Mismatching secure hashes! File %s was renamed to %s" %
-                 (file_to_hash_abspath, file_to_hash_new_path))
-
-# Copied from
-# http://stackoverflow.com/questions/3431825/generating-a-md5-checksum-of-a-file
-
-
-def hashfile(file_handle, hasher, blocksize=65536):
-    buf = file_handle.read(blocksize)
-    while len(buf) > 0:
-        hasher.update(buf)
-        buf = file_handle.read(blocksize)
-    return hasher.hexdigest()
+    if os.path.exists(file_to_hash_new_path):
+        raise Exception("File %s already exists. Couldn't rename %s "
+                        "to %s." % (file_to_hash_new_path,
+                                    file_to_hash_abspath,
+                                    file_to_hash_new_path)
+                        )
+    os.rename(file_to_hash_abspath, file_to_hash_new_path)
+    sys.exit("Mismatching secure hashes! File %s was renamed to %s" %
+             (file_to_hash_abspath, file_to_hash_new_path))
+
+
+def hash_stdin(args):
+    '''
+    Hashes stdin while copying it to the requested targets. Returns the
+    computed hash and the written file, if any.
+    '''
+    targets = list()
+    if args.stdout:
+        targets.append(sys.stdout.buffer)
+    output = None
+    try:
+        if args.output:
+            output = open(args.output, 'wb')
+            targets.append(output)
+        computed_hash_value = file_io.tee_hash(
+            sys.stdin.buffer, targets, args.hash_alg)
+    finally:
+        if output is not None:
+            output.close()
+    return computed_hash_value, args.output
 
 
 if __name__ == '__main__':
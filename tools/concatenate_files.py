@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import file_io
+
+'''
+Concatenates files byte by byte. Concatenated gzip files form a valid gzip
+file with one member per input, so gzipped files are merged without
+decompressing and compressing them again. The data is copied inside the
+kernel where possible.
+
+With --verify every gzip member is decompressed (and the output
+discarded) while the file is copied, which checks the CRC and length of
+all members.
+
+With --hash-hint the output is hashed while it is written and the hashes
+are left next to it, so uap does not have to read it again.
+'''
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def read_args():
+    parser = argparse.ArgumentParser(
+        description='concatenates files, e.g. gzipped files without '
+        'recompression')
+    parser.add_argument(
+        'infiles',
+        nargs='+',
+        help='input files')
+    parser.add_argument(
+        '--output',
+        '-o',
+        required=True,
+        help='output file')
+    parser.add_argument(
+        '--gzip',
+        action='store_true',
+        default=False,
+        help='fail unless all non-empty input files are gzipped')
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        default=False,
+        help='scan all gzip members of the inputs while copying '
+        '(implies --gzip)')
+    parser.add_argument(
+        '--hash-hint',
+        action='store_true',
+        default=False,
+        help='hash the output and store the hash next to it')
+    parser.add_argument(
+        '--tree-chunk-size',
+        type=int,
+        default=file_io.tree_chunk_size_from_env(),
+        help='also hash chunks of this size for a tree hash. Default: '
+        '$%s set by uap or 0' % file_io.TREE_CHUNK_SIZE_VARIABLE)
+    return parser.parse_args()
+
+
+class MemberScanner(object):
+    '''
+    Decompresses a stream of concatenated gzip members fed in blocks and
+    raises zlib.error on corrupt data.
+    '''
+
+    def __init__(self):
+        self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        self.members = 0
+        self.in_member = False
+
+    def feed(self, block):
+        data = block
+        while data:
+            self.in_member = True
+            # the decompressed data is discarded in bounded pieces
+            self.decompressor.decompress(data, file_io.BLOCK_SIZE)
+            data = self.decompressor.unconsumed_tail
+            if self.decompressor.eof:
+                self.members += 1
+                self.in_member = False
+                data = self.decompressor.unused_data + data
+                self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+    def finish(self, path):
+        if self.in_member:
+            raise zlib.error('%s ends within a gzip member' % path)
+
+
+def check_magic(path):
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic and magic != GZIP_MAGIC:
+        sys.exit('%s is not gzipped.' % path)
+    return bool(magic)
+
+
+def copy_verified(path, target, hasher=None):
+    scanner = MemberScanner()
+    for block in file_io.read_blocks(path):
+        scanner.feed(block)
+        if hasher is not None:
+            hasher.update(block)
+        view = memoryview(block)
+        while view:
+            view = view[os.write(target, view):]
+    scanner.finish(path)
+    return scanner.members
+
+
+def main(args):
+    if args.verify:
+        args.gzip = True
+    hasher = None
+    if args.hash_hint:
+        hasher = file_io.StreamHasher(args.tree_chunk_size)
+    fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        for path in args.infiles:
+            if args.gzip and not check_magic(path):
+                # empty files add nothing
+                continue
+            if args.verify:
+                try:
+                    copy_verified(path, fd, hasher)
+                except zlib.error as e:
+                    sys.exit('%s is corrupt: %s' % (path, e))
+            else:
+                file_io.append_file(path, fd, hasher)
+    finally:
+        os.close(fd)
+    if hasher is not None:
+        file_io.write_hash_hint(args.output, hasher)
+
+
+if __name__ == '__main__':
+    main(read_args())
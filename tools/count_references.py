@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import argparse
+import collections
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import record_io
+
+'''
+Counts the alignments of a (gzipped) SAM file per reference in a single
+pass and writes the counts sorted ascending, in the format of
+``cut -f 2,3,4 | cut -f 1 -d '|' | grep -v '*' | cut -f 1 -d '_' | sort |
+uniq -c | sort``:
+
+- the key of an alignment are its FLAG, RNAME and POS columns, cut before
+  the first '|' (so reference names like gi|123|... are reduced to their
+  first part) and before the first '_',
+- keys containing a '*' (unmapped reads) are not counted.
+
+Only the distinct keys are held in memory.
+'''
+
+
+def read_args():
+    parser = argparse.ArgumentParser(
+        description='counts the alignments of a SAM file per reference')
+    parser.add_argument(
+        'infile',
+        nargs='?',
+        default='-',
+        help='SAM input, may be gzipped. Default: stdin')
+    parser.add_argument(
+        '--output',
+        '-o',
+        default='-',
+        help='output file. Default: stdout')
+    return parser.parse_args()
+
+
+def reference_key(line):
+    key = b'\t'.join(line.split(b'\t', 4)[1:4]).split(b'|', 1)[0]
+    if b'*' in key:
+        return None
+    return key.split(b'_', 1)[0]
+
+
+def count_references(reader):
+    counts = collections.Counter()
+    for lines in reader.batches():
+        counts.update(map(reference_key, lines))
+    counts.pop(None, None)
+    return counts
+
+
+def main(args):
+    counts = count_references(record_io.SamReader(args.infile))
+    with record_io.LineWriter(args.output) as writer:
+        writer.write_lines(
+            b'%7d %s' % (count, key)
+            for key, count in sorted(counts.items(),
+                                     key=lambda item: (item[1], item[0])))
+
+
+if __name__ == '__main__':
+    main(read_args())
@@ -1,12 +1,19 @@
-#!/usr/local/python/2.7.9-2/bin/python
-# discarLargeSplitsAndPairs.py
+#!/usr/bin/env python
+# discardLargeSplitsAndPairs.py
 
 import sys
 import argparse
-import pprint
+import os
 import re
+import shutil
+import tempfile
+import zlib
 
-pp = pprint.PrettyPrinter(indent=4)
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import record_io
+
+SKIP_PATTERN = re.compile(rb'(\d+)N')
 
 ### --- read_arguments() ---------------------------------------------------- ###
 
@@ -14,24 +21,21 @@ pp = pprint.PrettyPrinter(indent=4)
 def read_arguments():
     parser = argparse.ArgumentParser(
         description="Discards split reads that skip more than N nucleotides and read pairs with final template length larger then M")
-    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+    parser.add_argument('--version', action='version', version='%(prog)s 2.0')
     parser.add_argument(
         'infile',
         nargs='?',
-        type=argparse.FileType('r'),
-        default=sys.stdin,
+        default='-',
         help="Infile: in .SAM format, default=stdin")
     parser.add_argument(
         'outfile',
         nargs='?',
-        type=argparse.FileType('w'),
-        default=sys.stdout,
+        default='-',
         help="Outfile: in .SAM format, default=stdout")
     parser.add_argument(
         '--logfile',
         nargs='?',
-        type=argparse.FileType('w'),
-        default=sys.stderr,
+        default=sys.stderr.buffer,
         help="Discarded reads in .SAM format, default=stderr")
     parser.add_argument(
         '--statsfile',
@@ -45,177 +49,276 @@ def read_arguments():
         '--M_mates',
         type=int,
         help="Size of template (in nucleotides) that would arise from a read pair. Read pairs that exceed this value are discarded.")
+    parser.add_argument(
+        '--mode',
+        choices=['auto', 'collated', 'spill'],
+        default='auto',
+        help="collated: mates follow each other (name sorted or collated "
+        "input), only the reads of one name are kept in memory. "
+        "spill: mates may be far apart (e.g. coordinate sorted input), "
+        "waiting reads are moved to disk if there are more than "
+        "--max-pending of them. auto: collated if the @HD header line "
+        "declares SO:queryname or GO:query, spill otherwise. default=auto")
+    parser.add_argument(
+        '--max-pending',
+        type=int,
+        default=1000000,
+        help="Maximal number of reads waiting for their mate in memory "
+        "in spill mode, default=1000000")
+    parser.add_argument(
+        '--spill-buckets',
+        type=int,
+        default=64,
+        help="Number of files waiting reads are distributed to in spill "
+        "mode, default=64")
+    parser.add_argument(
+        '--tmpdir',
+        default=None,
+        help="Directory for the spilled reads, default=system temp dir")
     return parser.parse_args()
 
-### --- main() -------------------------------------------------------------- ###
+### --- Filter --------------------------------------------------------------- ###
 
 
-def main(args):
+class Filter(object):
+    '''
+    Decides about single reads and read pairs and collects the statistics.
+    Output is buffered and written by flush().
+    '''
+
+    def __init__(self, args, outfile, logfile):
+        self.args = args
+        self.outfile = outfile
+        self.logfile = logfile
+        self.kept = []
+        self.discarded = []
+        self.readlinesN = 0
+        self.matesN = 0  # number of read pairs
+        self.splitsN = 0  # number of single reads that are split reads
+        self.otherN = 0  # reads that are neither single nor paired
+        self.discardsN = 0  # number of discarded split reads
+        self.discardsM = 0  # number of discarded read pairs
 
-    # dictionary containing all R1 reads that are waiting for their R2 mate
-    # if R2 is found, the read pair is processed and deleted from the
-    # dictionary
-    R1s = {}
-
-    readlinesN = 0
-    matesN = 0
-    singleN = 0  # number of single reads
-    pairedN = 0  # number of read pairs
-    splitsSingleN = 0  # number of single reads that are split reads
-    # number of paired split reads (R1 or R2 of a pair is a split read)
-    splitsPairedN = 0
-    splitsSingleNd = 0  # number of discarded single split reads
-    splitsPairedNd = 0  # number of discarded paired split reads
-    otherN = 0
-    discardsN = 0
-    discardsM = 0
-
-    for line in args.infile:
-
-        lineBR = line  # line incl. linebreak
-        line = line.rstrip('\n')  # line excl. linebreak
-        x = line.split()  # line split based on ' '
-
-        # Header lines
-        if '@' in x[0]:
-            # collect the header lines for the output SAM files
-            args.outfile.write(lineBR)
-            args.logfile.write(lineBR)
-            # don't do anything else with the header lines
-            continue
-
-        # Read lines
-        readlinesN += 1
-
-        if '*' == x[6]:  # this is a single read
-            singleN += 1
-            if 'N' in x[5]:  # this is a single read that is a split read
-                splitsSingleN += 1
-                y = re.search(r'(\d+)N', x[5])
-                # if skipped region in range
-                if int(y.group(1)) <= args.N_splits:
-                    args.outfile.write(lineBR)  # write R it to outfile
-                else:  # otherwise
-                    args.logfile.write(lineBR)  # log its dismissal
-                    splitsSingleNd += 1
-            else:  # this is not a split read
-                args.outfile.write(lineBR)
-
-        elif '=' == x[6]:  # this read is part of a mate pair
-            value1 = int(x[8])  # TLEN for R1
-            value2 = int(x[8]) * (-1)  # TLEN for R2
-            # uniq identification of a read
-            key1 = '%s_%s_%s_%d' % (x[0], x[3], x[7], value1)
-            # if this is R2 we need to switch POS and RNEXT and *(-1) TLEN
-            key2 = '%s_%s_%s_%d' % (x[0], x[7], x[3], value2)
-            if key2 in R1s.keys():  # mate found, process read pair
-                pairedN += 1
-
-            else:  # no R1 found, so this is it
-                R1s[key1] = lineBR
-                # if TLEN too large
-                if abs(value1) > args.M_mates:  # log the dismissal of this read pair
-                    args.logfile.write(R1s[key2])
-                    args.logfile.write(lineBR)
-                    splitsPairedNd += 1
-                else:  # TLEN is in range
-                    if 'N' in x[5]:  # this is a paired read that is a split read
-                        splitsPairedN += 1
-                    else:  # nope, R2 is not a split read, check R1
-                        # split the line from R1 again and check if it is a
-                        # split read
-                        pass
-        else:  # this read is neither single read nor part of mate pair.. just keep it
-            otherN += 1
-            args.outfile.write(lineBR)
-
-        # old part
-        # 1. if split read
-        if 'N' in x[5]:
-            # is this split read part of a mate pair?
-            if '=' == x[6]:  # yes
-                pass
-            else:  # no
-                splitsN += 1
-                y = re.search(r'(\d+)N', x[5])
-                # if skipped region in range
-                if int(y.group(1)) <= args.N_splits:
-                    args.outfile.write(lineBR)  # write it to outfile
-                else:  # otherwise
-                    args.logfile.write(lineBR)  # log its dismissal
-                    discardsN += 1
-
-        # 2. if read 1 of mate pair
-        elif '=' == x[6]:  # this read is part of a read pair
-            value1 = int(x[8])  # TLEN for R1
-            value2 = int(x[8]) * (-1)  # TLEN for R2
-            # uniq identification of a read
-            key1 = '%s_%s_%s_%d' % (x[0], x[3], x[7], value1)
-            # if this is R2 we need to switch POS and RNEXT and *(-1) TLEN
-            key2 = '%s_%s_%s_%d' % (x[0], x[7], x[3], value2)
-            if key2 in R1s.keys():  # mate found, process read pair
-                matesN += 1
-                # if TLEN is in range
-                if abs(value1) <= args.M_mates:  # write read pair to output file
-                    args.outfile.write(R1s[key2])
-                    args.outfile.write(lineBR)
-                else:  # otherwise
-                    # log the dismissal of this read pair
-                    args.logfile.write(R1s[key2])
-                    args.logfile.write(lineBR)
-                    discardsM += 1
-                del R1s[key2]  # delete R1 from hash
-            else:  # no R1 found, so this is it
-                R1s[key1] = lineBR
-
-        # 3. all other reads are printed to outfile
+    def flush(self):
+        self.outfile.write_lines(self.kept)
+        self.logfile.write_lines(self.discarded)
+        self.kept = []
+        self.discarded = []
+
+    def header(self, line):
+        self.kept.append(line)
+        self.discarded.append(line)
+
+    def single(self, line, cigar):
+        # split reads are judged by their first skipped region
+        if b'N' in cigar:
+            self.splitsN += 1
+            if int(SKIP_PATTERN.search(cigar).group(1)) > self.args.N_splits:
+                self.discardsN += 1
+                self.discarded.append(line)
+                return
+        self.kept.append(line)
+
+    def other(self, line):
+        self.otherN += 1
+        self.kept.append(line)
+
+    def pair(self, line1, cigar1, line2, cigar2, tlen):
+        # read pairs are only judged by their template length
+        self.matesN += 1
+        if abs(tlen) > self.args.M_mates:
+            self.discardsM += 1
+            self.discarded.append(line1)
+            self.discarded.append(line2)
         else:
-            otherN += 1
-            args.outfile.write(lineBR)
+            self.kept.append(line1)
+            self.kept.append(line2)
 
-    # print the final info into stats file
-    args.statsfile.write('# of processed reads:       %10d\n' % (readlinesN))
-    if readlinesN > 0:
-        args.statsfile.write(
-            '# of mapped read pairs:     %10d\t (%5.2f%% of the reads)\n' %
-            (matesN, 100.0 / readlinesN * matesN * 2))
-        args.statsfile.write(
-            '# of split reads:           %10d\t (%5.2f%% of the reads)\n' %
-            (splitsN, 100.0 / readlinesN * splitsN))
-        args.statsfile.write(
-            '# of other reads:           %10d\t (%5.2f%% of the reads)\n' %
-            (otherN, 100.0 / readlinesN * otherN))
-    else:
-        args.statsfile.write(
-            '# of mapped read pairs:     %10d\t (%5.2f%% of the reads)\n' %
-            (0, 0.0))
-        args.statsfile.write(
-            '# of split reads:           %10d\t (%5.2f%% of the reads)\n' %
-            (0, 0.0))
-        args.statsfile.write(
-            '# of other reads:           %10d\t (%5.2f%% of the reads)\n' %
-            (0, 0.0))
-
-    if splitsN > 0:
-        args.statsfile.write(
+    def write_stats(self, statsfile):
+        readlinesN = self.readlinesN
+        statsfile.write('# of processed reads:       %10d\n' % (readlinesN))
+        for name, count, share in [
+                ('mapped read pairs:    ', self.matesN, self.matesN * 2),
+                ('split reads:          ', self.splitsN, self.splitsN),
+                ('other reads:          ', self.otherN, self.otherN)]:
+            statsfile.write(
+                '# of %s %10d\t (%5.2f%% of the reads)\n' %
+                (name, count, 100.0 / readlinesN * share if readlinesN else
+                 0.0))
+        statsfile.write(
             '# of discarded split reads: %10d\t (%5.2f%% of the split reads)\n' %
-            (discardsN, 100.0 / splitsN * discardsN))
-    else:
-        args.statsfile.write(
-            '# of discarded split reads: %10d\t (%5.2f%% of the split reads)\n' %
-            (0, 0.0))
-    if matesN > 0:
-        args.statsfile.write(
+            (self.discardsN, 100.0 / self.splitsN * self.discardsN
+             if self.splitsN else 0.0))
+        statsfile.write(
             '# of discarded read pairs:  %10d\t (%5.2f%% of the read pairs)\n' %
-            (discardsM, 100.0 / matesN * discardsM))
+            (self.discardsM, 100.0 / self.matesN * self.discardsM
+             if self.matesN else 0.0))
+
+### --- mate matching ------------------------------------------------------- ###
+
+
+def mate_keys(fields):
+    '''
+    Returns the key of a paired read and the key its mate has.
+    '''
+    tlen = int(fields[8])
+    return ((fields[0], fields[3], fields[7], tlen),
+            (fields[0], fields[7], fields[3], -tlen))
+
+
+def match(pending, line, fields, sam_filter):
+    '''
+    Processes the pair if the mate of the read is pending, otherwise the
+    read becomes pending. Returns True if a pair was processed.
+    '''
+    key, mate_key = mate_keys(fields)
+    mate = pending.pop(mate_key, None)
+    if mate is None:
+        pending[key] = (line, fields[5])
+        return False
+    sam_filter.pair(mate[0], mate[1], line, fields[5], key[3])
+    return True
+
+
+class CollatedPairs(object):
+    '''
+    Mates of name sorted or collated input follow each other, so only the
+    reads of the current name are pending.
+    '''
+
+    def __init__(self, sam_filter):
+        self.sam_filter = sam_filter
+        self.name = None
+        self.pending = {}
+
+    def add(self, line, fields):
+        if fields[0] != self.name:
+            self.close()
+            self.name = fields[0]
+        match(self.pending, line, fields, self.sam_filter)
+
+    def close(self):
+        # reads whose mate is missing are kept
+        for line, cigar in self.pending.values():
+            self.sam_filter.other(line)
+        self.pending.clear()
+
+
+class SpilledPairs(object):
+    '''
+    Mates may be far apart. Up to max_pending reads wait in memory for their
+    mate, the oldest are moved to bucket files beyond that. Mates always end
+    up in the same bucket, which are resolved one after the other at the
+    end.
+    '''
+
+    def __init__(self, sam_filter, max_pending, buckets, tmpdir):
+        self.sam_filter = sam_filter
+        self.max_pending = max_pending
+        self.pending = {}
+        self.tmpdir = tmpdir
+        self.buckets = [None] * buckets
+
+    def add(self, line, fields):
+        if not match(self.pending, line, fields, self.sam_filter) and \
+           len(self.pending) > self.max_pending:
+            self.spill(len(self.pending) // 2)
+
+    def spill(self, count):
+        # dicts keep their insertion order, so the oldest reads go first
+        keys = list(self.pending)[:count]
+        for key in keys:
+            line = self.pending.pop(key)[0]
+            self.bucket(key[0]).write(line + b'\n')
+
+    def bucket(self, name):
+        index = zlib.crc32(name) % len(self.buckets)
+        if self.buckets[index] is None:
+            self.buckets[index] = open(os.path.join(
+                self.tmpdir, 'bucket-%d.sam' % index), 'w+b')
+        return self.buckets[index]
+
+    def close(self):
+        if not any(self.buckets):
+            for line, cigar in self.pending.values():
+                self.sam_filter.other(line)
+            self.pending.clear()
+            return
+        self.spill(len(self.pending))
+        for index, bucket in enumerate(self.buckets):
+            if bucket is None:
+                continue
+            bucket.seek(0)
+            pending = {}
+            for line in bucket:
+                line = line.rstrip(b'\n')
+                match(pending, line, line.split(b'\t', 9), self.sam_filter)
+            for line, cigar in pending.values():
+                self.sam_filter.other(line)
+            bucket.close()
+            self.buckets[index] = None
+            self.sam_filter.flush()
+
+### --- main() -------------------------------------------------------------- ###
+
+
+def choose_mode(header):
+    for line in header:
+        if line.startswith(b'@HD'):
+            fields = line.split(b'\t')
+            if b'SO:queryname' in fields or b'GO:query' in fields:
+                return 'collated'
+    return 'spill'
+
+
+def main(args):
+    reader = record_io.SamReader(args.infile)
+    outfile = record_io.LineWriter(args.outfile)
+    logfile = record_io.LineWriter(args.logfile)
+    sam_filter = Filter(args, outfile, logfile)
+    mode = args.mode
+    if mode == 'auto':
+        mode = choose_mode(reader.header)
+    for line in reader.header:
+        sam_filter.header(line)
+    tmpdir = None
+    if mode == 'collated':
+        pairs = CollatedPairs(sam_filter)
     else:
-        args.statsfile.write(
-            '# of discarded read pairs:  %10d\t (%5.2f%% of the read pairs)\n' %
-            (0, 0.0))
+        tmpdir = tempfile.mkdtemp(prefix='discardLargeSplitsAndPairs-',
+                                  dir=args.tmpdir)
+        pairs = SpilledPairs(sam_filter, args.max_pending,
+                             args.spill_buckets, tmpdir)
+
+    try:
+        for lines in reader.batches():
+            for line in lines:
+                # Read lines
+                sam_filter.readlinesN += 1
+                fields = line.split(b'\t', 9)
+                rnext = fields[6]
+                if rnext == b'*':  # this is a single read
+                    sam_filter.single(line, fields[5])
+                elif rnext == b'=':  # this read is part of a mate pair
+                    pairs.add(line, fields)
+                else:  # mate on another reference, just keep it
+                    sam_filter.other(line)
+            sam_filter.flush()
+        pairs.close()
+        sam_filter.flush()
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    outfile.close()
+    logfile.close()
+
+    # print the final info into stats file
+    if args.statsfile:
+        sam_filter.write_stats(args.statsfile)
 
 
 if __name__ == '__main__':
     args = read_arguments()
     main(args)
 
-__version__ = '1.0'
+__version__ = '2.0'
@@ -20,18 +20,45 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+sys.path.insert(0, os.path.join(seq_pipeline_path, '..', 'include'))
+import record_io
+from uaperrors import UAPError
+
+
+def write_records(writers, lines_of_mates, count):
+    '''
+    Writes *count* records of every mate unless one of the mates has an
+    empty sequence. Returns the number of written records.
+    '''
+    keep = [True] * count
+    for lines in lines_of_mates:
+        sequences = lines[1::4]
+        if b'' in sequences:
+            for index, sequence in enumerate(sequences):
+                if not sequence:
+                    keep[index] = False
+    if all(keep):
+        for writer, lines in zip(writers, lines_of_mates):
+            writer.write_lines(lines)
+        return count
+    for writer, lines in zip(writers, lines_of_mates):
+        writer.write_lines([line for index in range(count) if keep[index]
+                            for line in lines[4 * index:4 * index + 4]])
+    return sum(keep)
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description='This script reads one or two fastq files, line-by-line ' +
-        'and removes reads or read pairs if at least one read is empty.',
+        description='This script reads one or two fastq files in large ' +
+        'blocks and removes reads or read pairs if at least one read is ' +
+        'empty.\nGzipped input is detected and decompressed, output files ' +
+        'ending\non .gz are compressed.',
         prog='fix_cutadapt',
         formatter_class=argparse.RawTextHelpFormatter)
 
     parser.add_argument('--version',
                         action='version',
-                        version='%(prog)s 0.01')
+                        version='%(prog)s 0.02')
 
     parser.add_argument("r1_in",
                         help="This file or fifo contains the " +
@@ -53,57 +80,41 @@ def main():
                         help="This file or fifo contains the " +
                         "second set of reads.")
 
+    parser.add_argument("--compression-level",
+                        dest="level",
+                        default=None,
+                        type=int,
+                        choices=range(1, 10),
+                        help="Compress the output with this gzip level. " +
+                        "Default: 6 if the output ends on .gz,\n" +
+                        "no compression otherwise.")
+
     args = parser.parse_args()
 
-    fin1 = open(args.r1_in, 'r')
-    fin2 = None
-    fout1 = open(args.r1_out, 'w')
-    fout2 = None
+    if (args.r2_in is None) != (args.r2_out is None):
+        parser.error("--R2-in and --R2-out have to be used together.")
 
+    inputs = [args.r1_in]
+    outputs = [args.r1_out]
     if args.r2_in is not None:
-        fin2 = open(args.r2_in, 'r')
+        inputs.append(args.r2_in)
+        outputs.append(args.r2_out)
 
-    if args.r2_out is not None:
-        fout2 = open(args.r2_out, 'w')
+    mates = [record_io.FastqReader(path) for path in inputs]
+    writers = [record_io.LineWriter(path, args.level) for path in outputs]
 
     rcount = 0
     wcount = 0
-    if fin2 is not None and fout2 is not None:
-        while True:
-            lines1 = []
-            lines2 = []
-            for _ in range(4):
-                lines1.append(fin1.readline())
-                lines2.append(fin2.readline())
-            if (len(lines1[0]) == 0):
-                break
-            if not (lines1[1] == "\n" or lines2[1] == "\n"):
-                for _ in range(4):
-                    fout1.write(lines1[_])
-                    fout2.write(lines2[_])
-                wcount += 1
-            rcount += 1
-
-        fin1.close()
-        fin2.close()
-        fout1.close()
-        fout2.close()
-
-    else:
-        while True:
-            lines1 = []
-            for _ in range(4):
-                lines1.append(fin1.readline())
-            if (len(lines1[0]) == 0):
-                break
-            if not (lines1[1] == "\n"):
-                for _ in range(4):
-                    fout1.write(lines1[_])
-                wcount += 1
-            rcount += 1
-            sys.stderr.write(
-                "Read %d entries, wrote %d entries.\n" %
-                (rcount, wcount))
+    try:
+        for lines_of_mates in record_io.paired_batches(mates):
+            count = len(lines_of_mates[0]) // 4
+            wcount += write_records(writers, lines_of_mates, count)
+            rcount += count
+    except UAPError as e:
+        sys.exit("%s (after %d entries)" % (e, rcount))
+
+    for writer in writers:
+        writer.close()
 
     sys.stderr.write("Read %d entries, wrote %d entries.\n" % (rcount, wcount))
 
@@ -20,6 +20,8 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+sys.path.insert(0, os.path.join(seq_pipeline_path, '..', 'include'))
+import record_io
 
 
 def main():
@@ -33,16 +35,14 @@ def main():
     parser.add_argument(
         "input_file",
         nargs='?',
-        type=argparse.FileType('r'),
-        default=sys.stdin,
+        default='-',
         help="Name of input file where QNAMES need to be "
         "fixed. Reads by default from STDIN.")
 
     parser.add_argument(
         "output_file",
         nargs='?',
-        type=argparse.FileType('w'),
-        default=sys.stdout,
+        default='-',
         help="Name of output file to which corrected data is written to. "
         "Reads by default from STDOUT.",
     )
@@ -61,30 +61,25 @@ def main():
     # Parse the arguments
     args = parser.parse_args()
 
-    if args.filetype == 'FASTQ':
-        while True:
-            lines = []
-            for _ in range(4):
-                lines.append(args.input_file.readline())
-            if (len(lines[0]) == 0):
-                break
-            lines[0] = lines[0].split(' ')[0]
-            if lines[0][-1] != "\n":
-                lines[0] += "\n"
-            for _ in range(4):
-                args.output_file.write(lines[_])
-
-    elif args.filetype == 'SAM':
-        for l in args.input_file:
-            if l.startswith('@'):
-                args.output_file.write(l)
-            else:
-                line = l.split('\t')
-                line[0] = line[0].split(' ')[0]
-                args.output_file.write("\t".join(line))
-
-    args.input_file.close()
-    args.output_file.close()
+    with record_io.LineWriter(args.output_file) as writer:
+        if args.filetype == 'FASTQ':
+            reader = record_io.FastqReader(args.input_file)
+            for lines in reader.batches():
+                lines[0::4] = [line.split(b' ', 1)[0] for line in lines[0::4]]
+                writer.write_lines(lines)
+
+        elif args.filetype == 'SAM':
+            reader = record_io.SamReader(args.input_file)
+            writer.write_lines(reader.header)
+            for lines in reader.batches():
+                for index, line in enumerate(lines):
+                    tab = line.find(b'\t')
+                    if tab == -1:
+                        tab = len(line)
+                    space = line.find(b' ', 0, tab)
+                    if space != -1:
+                        lines[index] = line[:space] + line[tab:]
+                writer.write_lines(lines)
 
 
 if __name__ == '__main__':
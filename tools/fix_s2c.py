@@ -23,6 +23,8 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+sys.path.insert(0, os.path.join(seq_pipeline_path, '..', 'include'))
+import record_io
 
 pp = pprint.PrettyPrinter(indent=4)
 
@@ -31,84 +33,47 @@ def read_arguments():
     parser = argparse.ArgumentParser(
         description="Reads s2c sam (converter from segemehl) and repairs some entries to pass picard validate sam")
     parser.add_argument('--version', action='version', version='%(prog)s 1.0')
-    parser.add_argument('infile', nargs='?', type=argparse.FileType(
-        'r'), default=sys.stdin, help="Infile default reads from stdin")
-    parser.add_argument('outfile', nargs='?', type=argparse.FileType(
-        'w'), default=sys.stdout, help="Outfile default writes to stdout")
+    parser.add_argument('infile', nargs='?', default='-',
+                        help="Infile default reads from stdin")
+    parser.add_argument('outfile', nargs='?', default='-',
+                        help="Outfile default writes to stdout")
     return parser.parse_args()
 
 
-def read_samline(line):
-    fields = line.split('\t')
-    keylist = 'qname, flag, rname, pos, mapq, cigar, mrnm, mpos, isize, seq, qual'.split(
-        ', ')
-
-    optional_fields = fields[11:]
-    samdict = dict(zip(keylist, fields[0:11]))
-    samdict['flag'] = int(samdict['flag'])
-
-    for optEntry in optional_fields:
-        (optID, optDEF, optVal) = optEntry.split(':')
-        samdict[optID] = [optVal, optDEF]
-
-    return samdict
-
-
-def make_samline(samdict):
-    # should have impleneted opt fields in sep sub hash  opt future enhancement
-    # this would spare me the fucking iterations
-    keylist = 'qname, flag, rname, pos, mapq, cigar, mrnm, mpos, isize, seq, qual'.split(
-        ', ')
-
-    opt_keys = []
-    for key in samdict:
-        if key not in keylist:
-            opt_keys.append(key)
-
-    opt_keys.sort()
-
-    pre_line = []
-    for i in keylist:
-        pre_line.append(samdict[i])
-
-    for i in opt_keys:
-        opt = ':'.join([i, samdict[i][1], samdict[i][0]])
-        pre_line.append(opt)
-
-    samline = "\t".join(str(v) for v in pre_line)
-
-    return samline
-
-
-def collect(sam_hits, samdict, ID):
-    if ID is None:
-        ID = samdict['qname']
-
-    if ID == samdict['qname']:
-        sam_hits.append(samdict)
-        process_switch = 0
-    else:
-        process_switch = 1
-        ID = samdict['qname']
-
-    return sam_hits, samdict, ID, process_switch
+def read_sam_hits(reader):
+    """
+    Yields the SamRecords of one read name at a time.
+    """
+    sam_hits = []
+    ID = None
+    for line in reader:
+        line = line.decode()
+        qname = line[:line.find('\t')]
+        if qname != ID:
+            if sam_hits:
+                yield sam_hits
+            sam_hits = []
+            ID = qname
+        sam_hits.append(record_io.SamRecord(line))
+    if sam_hits:
+        yield sam_hits
 
 
 def pre_process_sam_hits(sam_hits):
     # see if paired end or single and no mixture, multiple
 
     for samdict in sam_hits:
-        if 'XI' not in samdict:
+        if not samdict.has_tag('XI'):
             sys.stderr.write("Samline entry without XI entry")
-            pp.pprint(samdict)
+            pp.pprint(samdict.to_line())
             exit(1)
 
          # sort all segemehl entries by XI
-        sam_hits = sorted(sam_hits, key=lambda k: int(k['XI'][0]))
+        sam_hits = sorted(sam_hits, key=lambda k: int(k.get_tag('XI')))
 
         temporary_list = []
         for samdict in sam_hits:
-            temporary_list.append(samdict['XI'][0])
+            temporary_list.append(samdict.get_tag('XI'))
         counter_list = Counter(temporary_list)
 
         info = dict()
@@ -126,7 +91,7 @@ def pre_process_sam_hits(sam_hits):
             sys.stderr.write("empty list something went wrong dying")
             exit(1)
         elif info['single'] > 0 and info['paired'] > 0:
-            pp.pprint(sam_hits)
+            pp.pprint([samdict.to_line() for samdict in sam_hits])
             pp.pprint(info)
             sys.stderr.write(
                 "mixed reads of type info['single'] and info['paired'] wtf dying srsly")
@@ -147,11 +112,11 @@ def process_sam_hits(info, sam_hits):
             # set clear and set multiple flag ### for now just removing
             if info['NH'] > 1:
                 "temp"
-                # samdict['flag'] = setBit(samdict['flag'],8)
+                # samdict.flag = setBit(samdict.flag,8)
             else:
-                samdict['flag'] = clearBit(samdict['flag'], 8)
+                samdict.flag = clearBit(samdict.flag, 8)
             # if  paired set mate unmapped
-            samdict['flag'] = test_set_flag(samdict['flag'], 0, 0, 3)
+            samdict.flag = test_set_flag(samdict.flag, 0, 0, 3)
             return_list.append(samdict)
 
     elif info['type'] == 'paired':
@@ -163,37 +128,37 @@ def process_sam_hits(info, sam_hits):
             samdict_A = sam_hits.popleft()
             samdict_B = sam_hits.popleft()
 
-            if samdict_A['XI'][0] != samdict_B['XI'][0]:
+            if samdict_A.get_tag('XI') != samdict_B.get_tag('XI'):
                 sys.stderr.write("XI fields mixed up forgot sorting ??")
                 exit(1)
             if info['NH'] > 1:
                 "temp"
-                # samdict_A['flag'] = setBit(samdict_A['flag'],8)
-                # samdict_B['flag'] = setBit(samdict_B['flag'],8)
+                # samdict_A.flag = setBit(samdict_A.flag,8)
+                # samdict_B.flag = setBit(samdict_B.flag,8)
             else:
-                samdict_A['flag'] = clearBit(samdict_A['flag'], 8)
-                samdict_B['flag'] = clearBit(samdict_B['flag'], 8)
+                samdict_A.flag = clearBit(samdict_A.flag, 8)
+                samdict_B.flag = clearBit(samdict_B.flag, 8)
 
             # set mate info
 
                 # not fail safe assuming there are no unmapped ones
                 # fix later should not happen in segemehl
-            if (samdict_A['rname'] == samdict_B['rname']):
-                samdict_A['mrnm'] = '='
-                samdict_B['mrnm'] = '='
+            if (samdict_A.rname == samdict_B.rname):
+                samdict_A.mrnm = '='
+                samdict_B.mrnm = '='
             else:
-                samdict_A['mrnm'] = samdict_B['rname']
-                samdict_B['mrnm'] = samdict_A['rname']
+                samdict_A.mrnm = samdict_B.rname
+                samdict_B.mrnm = samdict_A.rname
 
-            samdict_A['mpos'] = samdict_B['pos']
-            samdict_B['mpos'] = samdict_A['pos']
+            samdict_A.mpos = samdict_B.pos
+            samdict_B.mpos = samdict_A.pos
 
             # if mate reverse set mat reverse flag in my info
-            if testBit(samdict_B['flag'], 4) > 0:
-                samdict_A['flag'] = setBit(samdict_A['flag'], 5)
+            if testBit(samdict_B.flag, 4) > 0:
+                samdict_A.flag = setBit(samdict_A.flag, 5)
 
-            if testBit(samdict_A['flag'], 4) > 0:
-                samdict_B['flag'] = setBit(samdict_B['flag'], 5)
+            if testBit(samdict_A.flag, 4) > 0:
+                samdict_B.flag = setBit(samdict_B.flag, 5)
 
             return_list.append(samdict_A)
             return_list.append(samdict_B)
@@ -239,47 +204,22 @@ def toggleBit(int_type, offset):
     return(int_type ^ mask)
 
 
-def output(sam_hits, outfile):
+def output(sam_hits, writer):
     for samdict in sam_hits:
-        samline = make_samline(samdict)
-        outline = ''.join([samline, "\n"])
-        outfile.write(outline)
+        writer.write_line(samdict.to_line().encode())
 
 
 def main(args):
-    ID = None
-    # print(args)
-    out = args.outfile
-    sam_hits = []
-
-    for line in args.infile:
-        if line[0] == '@':
-            args.outfile.write(line)
-            continue
-        line = line.rstrip('\n')
-        # args.outfile.write(line)
-        samdict = read_samline(line)
-
+    reader = record_io.SamReader(args.infile)
+    with record_io.LineWriter(args.outfile) as writer:
+        writer.write_lines(reader.header)
         # take all reads same name
-        (sam_hits, samdict, ID, process_switch) = collect(sam_hits, samdict, ID)
-
-        # new readname  encountered start processeing
-        if process_switch == 1:
+        for sam_hits in read_sam_hits(reader):
             # look at XI paires and determine if only paired or single are in
             # the collection
             info, sam_hits = pre_process_sam_hits(sam_hits)
-            #
             sam_hits = process_sam_hits(info, sam_hits)
-            output(sam_hits, args.outfile)
-            #
-            sam_hits = []
-            sam_hits.append(samdict)
-
-    # last block after while iteration
-    info, sam_hits = pre_process_sam_hits(sam_hits)
-    sam_hits = process_sam_hits(info, sam_hits)
-    output(sam_hits, args.outfile)
-
+            output(sam_hits, writer)
 
 if __name__ == '__main__':
     args = read_arguments()
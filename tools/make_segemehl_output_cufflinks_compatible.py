@@ -10,7 +10,6 @@
 # mymap_cufflinks_compatible_sorted.bam
 
 
-from Bio import SeqIO
 import argparse
 import tempfile
 import re
@@ -27,6 +26,9 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import indexed_fasta
 
 
 parser = argparse.ArgumentParser(
@@ -136,10 +138,10 @@ def bestOnly(mappingList):
     global bestOnlyCounter
     NM_index = -1
     NH_index = -1
-    for i in range(11, (len(mappingList[0]))):
-        if "NM:i" in mappingList[0][i]:
+    for i in range(11, (len(mappingList[0][0]))):
+        if "NM:i" in mappingList[0][0][i]:
             NM_index = i
-        if "NH:i" in mappingList[0][i]:
+        if "NH:i" in mappingList[0][0][i]:
             NH_index = i
     mymappingDist = []
     for i in range(0, len(mappingList)):
@@ -335,10 +337,10 @@ def processLines(eingabe):
             newCigar += 'N'
             if not strandSpecific:
                 if(not xaIsSet):
-                    subseq = str(record_dict[eingabe[0][2]].seq[(
-                        startOld + laenge) - 1:startOld + laenge + 1])
-                    subseq += str(record_dict[eingabe[0][2]].seq[int(
-                        eingabe[i][3]) - 3:int(eingabe[i][3]) - 1])
+                    subseq = record_dict[eingabe[0][2]][(
+                        startOld + laenge) - 1:startOld + laenge + 1]
+                    subseq += record_dict[eingabe[0][2]][int(
+                        eingabe[i][3]) - 3:int(eingabe[i][3]) - 1]
                     if(subseq == "GTAG"or subseq == "GCAG" or subseq == "ATAC"):
                         xaIsSet = True
                         xaSet = True
@@ -422,9 +424,9 @@ if strandSpecific:
 else:
     sys.stderr.write(
         'since you specified a path to a reference genome it is assumed that the protocol is not strand specific!  \n')
-temp = tempfile.NamedTemporaryFile(dir=outPath)
+temp = tempfile.NamedTemporaryFile(mode='w+', dir=outPath)
 mytempName = temp.name
-temp_mate = tempfile.NamedTemporaryFile(dir=outPath)
+temp_mate = tempfile.NamedTemporaryFile(mode='w+', dir=outPath)
 mytemp_mateName = temp_mate.name
 sys.stderr.write('collect all split reads.  \n')
 # for line in fileinput.input():
@@ -466,7 +468,7 @@ for line in args.my_sam:
 
 temp.flush()
 temp.seek(0)
-temp2 = tempfile.TemporaryFile(dir=outPath)
+temp2 = tempfile.TemporaryFile(mode='w+', dir=outPath)
 p = subprocess.Popen(['sort',
                       '-t',
                       '\t',
@@ -477,7 +479,7 @@ p = subprocess.Popen(['sort',
                       mytempName],
                      stdin=subprocess.PIPE,
                      stdout=subprocess.PIPE)
-temp2.write(p.communicate()[0])
+temp2.write(p.communicate()[0].decode())
 temp.close()
 temp2.flush()
 temp2.seek(0)
@@ -488,10 +490,8 @@ fusion = False
 losgehts = False
 if not strandSpecific:
     sys.stderr.write(
-        'read fasta records into memory (for strand unspecific protocols only).  \n')
-    handle = open(refGenome, "rU")
-    record_dict = SeqIO.to_dict(SeqIO.parse(handle, "fasta"))
-    handle.close()
+        'open indexed fasta file (for strand unspecific protocols only).  \n')
+    record_dict = indexed_fasta.open_fasta(refGenome)
 sys.stderr.write('process the sorted split reads.  \n')
 
 
@@ -556,7 +556,7 @@ temp2.close()
 
 temp_mate.flush()
 temp_mate.seek(0)
-temp2_mate = tempfile.TemporaryFile(dir=outPath)
+temp2_mate = tempfile.TemporaryFile(mode='w+', dir=outPath)
 p_mate = subprocess.Popen(['sort',
                            '-t',
                            '\t',
@@ -567,7 +567,7 @@ p_mate = subprocess.Popen(['sort',
                            mytemp_mateName],
                           stdin=subprocess.PIPE,
                           stdout=subprocess.PIPE)
-temp2_mate.write(p_mate.communicate()[0])
+temp2_mate.write(p_mate.communicate()[0].decode())
 temp_mate.close()
 temp2_mate.flush()
 temp2_mate.seek(0)
@@ -1,6 +1,4 @@
 #!/bin/bash
-import re
-import fileinput
 import argparse
 import sys
 "exec" "`dirname $0`/../python_env/bin/python" "$0" "$@"
@@ -22,6 +20,8 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+sys.path.insert(0, os.path.join(seq_pipeline_path, '..', 'include'))
+import record_io
 
 
 def main():
@@ -34,19 +34,25 @@ def main():
     parser.add_argument('--version',
                         action='version',
                         version='%(prog)s 0.01 alpha')
-    parser.add_argument('infile', nargs='?', type=argparse.FileType(
-        'r'), default=sys.stdin, help="Infile default reads from stdin")
-    parser.add_argument('outfile', nargs='?', type=argparse.FileType(
-        'w'), default=sys.stdout, help="Outfile default writes to stdout")
+    parser.add_argument('infile', nargs='?', default='-',
+                        help="Infile default reads from stdin")
+    parser.add_argument('outfile', nargs='?', default='-',
+                        help="Outfile default writes to stdout")
 
     args = parser.parse_args()
 
-    for bed_line in args.infile:
-        bed_line = bed_line.rstrip()
-        columns = bed_line.split('\t')
-        if re.search(r'2$', columns[3]):
-            columns[5] = '-' if columns[5] == '+' else '+'
-        sys.stdout.write('\t'.join(columns) + '\n')
+    reader = record_io.BedReader(args.infile)
+    with record_io.LineWriter(args.outfile) as writer:
+        writer.write_lines(reader.header)
+        for lines in reader.batches():
+            for index, bed_line in enumerate(lines):
+                bed_line = bed_line.rstrip()
+                columns = bed_line.split(b'\t')
+                if columns[3].endswith(b'2'):
+                    columns[5] = b'-' if columns[5] == b'+' else b'+'
+                    bed_line = b'\t'.join(columns)
+                lines[index] = bed_line
+            writer.write_lines(lines)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,6 @@
 import argparse
 import os
+import sys
 seq_pipeline_path = os.path.dirname(os.path.realpath(__file__))
 activate_this_file = '%s/../python_env/bin/activate_this.py' % seq_pipeline_path
 exec(
@@ -10,8 +11,15 @@ exec(
     dict(
         __file__=activate_this_file))
 
-'''
+import numpy as np
 
+'''
+Merges gene counts of featureCounts or htseq-count output files, either by
+summing them up or into a genes x samples matrix. Every file is parsed
+line by line into its gene IDs and a NumPy array of counts, which are
+validated against the first file, so only the counts of one file and the
+result are held in memory. The annotation columns of featureCounts are
+only kept for the first file.
 '''
 
 ######################
@@ -19,97 +27,191 @@ exec(
 ######################
 
 
-def get_cleaned_line(line):
-    line = line.split('\t')
-    gene = line[0]
-    count = line[-1].rstrip('\n')
-    return [gene, float(count)]
+class MergeError(Exception):
+    pass
 
 
-def is_headline(line):
-    if line[0] == '#':
-        return True
-    if line[0:6] == 'Geneid':
-        return True
-    return False
+def read_table(lines, columns, first_count, path, keep_annotation=False):
+    '''
+    Returns the gene IDs, the counts and, with *keep_annotation*, the
+    fields before the counts of the tab separated *lines* that have
+    *columns* fields each. Counts start at field *first_count*.
+    '''
+    genes = []
+    counts = []
+    annotation = [] if keep_annotation else None
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line:
+            continue
+        fields = line.split('\t')
+        if len(fields) != columns:
+            raise MergeError('%s does not have %d columns in every line.'
+                             % (path, columns))
+        genes.append(fields[0])
+        counts.append(fields[first_count:])
+        if keep_annotation:
+            annotation.append(fields[:first_count])
+    # an object array does not pad the gene IDs to the longest one
+    genes = np.array(genes, dtype=object)
+    return genes, to_counts(counts, path), annotation
+
+
+def to_counts(fields, path):
+    '''
+    Returns the count *fields* as int64 array. Fractional counts, e.g. of
+    featureCounts --fraction, are rejected instead of being truncated.
+    '''
+    try:
+        return np.array(fields, dtype=np.int64)
+    except (ValueError, OverflowError) as e:
+        raise MergeError('%s contains counts that are not integers: %s'
+                         % (path, e))
+
+
+class Template(object):
+    '''
+    Gene IDs of the first file. align() returns the counts of further files
+    in the order of the template.
+    '''
+
+    def __init__(self, genes, path):
+        self.genes = genes
+        self.path = path
+        self.positions = None
+
+    def align(self, genes, counts, path):
+        if len(genes) == len(self.genes) and \
+           np.array_equal(genes, self.genes):
+            return counts
+        # same genes in another order
+        if self.positions is None:
+            self.positions = {gene: i for i, gene in enumerate(self.genes)}
+        if len(genes) != len(self.genes) or \
+           len(set(genes)) != len(genes):
+            raise MergeError('The genes of %s differ from the genes of %s.'
+                             % (path, self.path))
+        try:
+            order = np.fromiter((self.positions[gene] for gene in genes),
+                                dtype=np.int64, count=len(genes))
+        except KeyError as e:
+            raise MergeError('Gene %s of %s is missing in %s.'
+                             % (str(e.args[0]), path, self.path))
+        aligned = np.empty_like(counts)
+        aligned[order] = counts
+        return aligned
+
+
+class Merger(object):
+    '''
+    Adds the count columns of one file after the other, either to a sum
+    or to a matrix with one column per sample.
+    '''
+
+    def __init__(self, files, matrix):
+        self.files = files
+        self.matrix = matrix
+        self.template = None
+        self.samples = []
+        self.result = None
+
+    def add(self, genes, counts, samples, path):
+        if self.template is None:
+            self.template = Template(genes, path)
+            if self.matrix:
+                # columns are added when files have more than one sample
+                self.result = np.zeros((len(genes), len(self.files)),
+                                       dtype=np.int64)
+            else:
+                self.result = np.zeros(len(genes), dtype=np.int64)
+        counts = self.template.align(genes, counts, path)
+        if not self.matrix:
+            self.result += counts.sum(axis=1)
+            return
+        used = len(self.samples)
+        missing = used + counts.shape[1] - self.result.shape[1]
+        if missing > 0:
+            self.result = np.hstack([
+                self.result,
+                np.zeros((self.result.shape[0], missing), dtype=np.int64)])
+        self.result[:, used:used + counts.shape[1]] = counts
+        self.samples.extend(samples)
+
+    def get_matrix(self):
+        return self.result[:, :len(self.samples)]
 
 #####################
 ### featureCounts ###
 #####################
 
 
-def fc_merge(files):
-    basic_data = []
-    for i, infile in enumerate(files):
-        # take the first as template
-        if i == 0:
-            with open(infile, 'r') as f:
-                for i, line in enumerate(f):
-                    # first and second line in featureCounts output file are
-                    # headlines
-                    if i == 0:
-                        new_line = '# merged featureCounts output files: %s' % (
-                            ' '.join(files))
-                        basic_data.append(new_line)
-                        continue
-
-                    if i == 1:
-                        # remove filename at the end
-                        new_line = line.rstrip('\n').split('\t')
-                        new_line = new_line[0:-1]
-                        basic_data.append('\t'.join(new_line))
-                        continue
-
-                    basic_data.append(line.rstrip('\n').split('\t'))
-            continue
-
-        with open(infile, 'r') as f:
-            for i, line in enumerate(f):
-                # continue if headline
-                if is_headline(line):
-                    continue
-
-                line = line.strip('\n').split('\t')
-                basic_data[i][-1] = str(int(basic_data[i][-1]) + int(line[-1]))
-
-    return basic_data
-
-
-def fc_write_to_file(out_file, data):
+def fc_read(path, keep_annotation):
+    '''
+    Returns the header, gene IDs, counts and sample names of a
+    featureCounts output file and, with *keep_annotation*, the annotation
+    columns.
+    '''
+    with open(path, 'r') as f:
+        # the first line is the command line of featureCounts
+        f.readline()
+        header = f.readline().rstrip('\n').split('\t')
+        # Geneid, Chr, Start, End, Strand and Length precede the counts
+        genes, counts, annotation = read_table(
+            f, len(header), 6, path, keep_annotation)
+    return header, genes, counts, header[6:], annotation
+
+
+def fc_merge(files, matrix):
+    merger = Merger(files, matrix)
+    first = None
+    for infile in files:
+        header, genes, counts, samples, annotation = fc_read(
+            infile, first is None)
+        if first is None:
+            first = (header, annotation)
+        merger.add(genes, counts, samples, infile)
+    return first, merger
+
+
+def fc_write_to_file(out_file, files, first, merger):
+    header, annotation = first
     with open(out_file, 'w') as f:
-        for i, line in enumerate(data):
-            if i == 0 or i == 1:
-                f.write(line + '\n')
-                continue
-
-            f.write('\t'.join(map(str, line)) + '\n')
+        f.write('# merged featureCounts output files: %s\n' %
+                (' '.join(files)))
+        if merger.matrix:
+            f.write('\t'.join(header[:6] + merger.samples) + '\n')
+            counts = merger.get_matrix()
+        else:
+            # the file name column is removed
+            f.write('\t'.join(header[:6]) + '\n')
+            counts = merger.result[:, np.newaxis]
+        f.writelines('\t'.join(fields + row) + '\n' for fields, row in
+                     zip(annotation, counts.astype(str).tolist()))
 
 ###################
 ### htseq_count ###
 ###################
 
 
-def htc_merge(files):
-    basic_data = []
-    for i, file in enumerate(files):
-        if i == 0:
-            with open(file, 'r') as f:
-                for line in f:
-                    basic_data.append(get_cleaned_line(line))
-            continue
-
-        with open(file, 'r') as f:
-            for i, line in enumerate(f):
-                line = get_cleaned_line(line)
-                basic_data[i][1] += line[1]
-
-    return basic_data
+def htc_merge(files, matrix):
+    merger = Merger(files, matrix)
+    for infile in files:
+        with open(infile, 'r') as f:
+            genes, counts, annotation = read_table(f, 2, 1, infile)
+        sample = os.path.basename(infile)
+        merger.add(genes, counts, [sample], infile)
+    return merger
 
 
-def htc_write_to_file(out_file, data):
+def htc_write_to_file(out_file, merger):
     with open(out_file, 'w') as f:
-        for i, line in enumerate(data):
-            f.write('\t'.join(map(str, line)) + '\n')
+        if merger.matrix:
+            f.write('\t'.join(['gene'] + merger.samples) + '\n')
+            counts = merger.get_matrix()
+        else:
+            counts = merger.result[:, np.newaxis]
+        f.writelines('\t'.join([gene] + row) + '\n' for gene, row in
+                     zip(merger.template.genes, counts.astype(str).tolist()))
 
 ###############
 ### merging ###
@@ -123,12 +225,15 @@ def read_args():
         '--tool_name',
         '-t',
         nargs=1,
+        choices=['htc', 'fc'],
+        required=True,
         help='tool name (htseq_count: htc, featureCounts: fc)'
     )
     parser.add_argument(
         '--outpath',
         '-o',
         nargs=1,
+        required=True,
         help='output path'
     )
     parser.add_argument(
@@ -137,8 +242,14 @@ def read_args():
         nargs='?',
         help='file name pattern for output files, a counter will be added automatically at the end (<pattern>_1.fastq)'
     )
+    parser.add_argument(
+        '--matrix',
+        '-m',
+        action='store_true',
+        default=False,
+        help='write a genes x samples matrix instead of the summed counts'
+    )
 
-    # TODO: catch missing args
     args, other_args = parser.parse_known_args()
 
     return [args, other_args]
@@ -146,33 +257,33 @@ def read_args():
 
 def main(args):
     options, raw_file_list = args
-    file_list = raw_file_list[0].split(' ')
+    # the files may be passed as a single space separated argument
+    file_list = [path for arg in raw_file_list for path in arg.split(' ')
+                 if path]
+    if not file_list:
+        sys.exit('No input files given.')
 
     tool_name = options.tool_name[0]
     outpath = options.outpath[0]
-    if outpath != '' and outpath[-1] != '/':
-        outpath += '/'
-
     out_file_pattern = options.out_file_pattern
 
-    data = []
-    if tool_name == 'fc':
-        data = fc_merge(file_list)
-        default_filename = 'featureCounts_merged.txt'
-        # write data to file
-        out_file = outpath + \
-            out_file_pattern if out_file_pattern is not None else outpath + default_filename
-        fc_write_to_file(out_file, data)
-    elif tool_name == 'htc':
-        data = htc_merge(file_list)
-        default_filename = 'htseq_count_merged.txt'
-        # write data to file
-        out_file = outpath + \
-            out_file_pattern if out_file_pattern is not None else outpath + default_filename
-        htc_write_to_file(out_file, data)
-    else:
-        # TODO: throw exception
-        pass
+    try:
+        if tool_name == 'fc':
+            first, merger = fc_merge(file_list, options.matrix)
+            default_filename = 'featureCounts_merged.txt'
+            out_file = os.path.join(outpath, out_file_pattern
+                                    if out_file_pattern is not None
+                                    else default_filename)
+            fc_write_to_file(out_file, file_list, first, merger)
+        else:
+            merger = htc_merge(file_list, options.matrix)
+            default_filename = 'htseq_count_merged.txt'
+            out_file = os.path.join(outpath, out_file_pattern
+                                    if out_file_pattern is not None
+                                    else default_filename)
+            htc_write_to_file(out_file, merger)
+    except MergeError as e:
+        sys.exit(str(e))
 
 
 if __name__ == '__main__':
@@ -3,9 +3,23 @@
 import argparse
 import os
 import sys
+import tempfile
+import zipfile
 import numpy as np
 from scipy import sparse
 
+'''
+Merges the matrices of .npz files written by deepTools multiBamSummary (or
+scipy.sparse.save_npz) column by column. Shorter matrices are padded with
+zeros.
+
+The shapes are read from the file headers first, so the result is
+preallocated once as a memory mapped .npy file and every input matrix is
+copied into its columns. The result is stored column major, so the columns
+of one input are a contiguous part of the file which is written
+sequentially. Only one input matrix is held in memory.
+'''
+
 parser = argparse.ArgumentParser(
     add_help=True,
     formatter_class=argparse.RawTextHelpFormatter
@@ -25,46 +39,166 @@ parser.add_argument(
     help="Output file basename"
 )
 
-args = parser.parse_args()
-
-ma = None
-labels = list()
-for f in args.files:
-    print("Reading .npz-file: %s" % f)
-    with np.load(f, mmap_mode='r') as arr:
-        labels.append(str(arr['labels'][0]))
-        if not isinstance(ma, np.ndarray):
-            ma = arr['matrix']
-            print("Length arr['matrix']: %s" % len(arr['matrix']))
-            print("Length ma: %s" % len(ma))
+parser.add_argument(
+    "--format",
+    choices=['npz', 'npy'],
+    default='npz',
+    help="npz: compressed file with the arrays 'matrix' and 'labels' (as\n"
+    "     written by multiBamSummary), compressed in chunks from the\n"
+    "     memory mapped result.\n"
+    "npy: the uncompressed memory mapped matrix and the labels in a\n"
+    "     .labels.txt file next to it. Default: npz"
+)
+
+parser.add_argument(
+    "--tmpdir",
+    type=str,
+    default=None,
+    help="Directory of the memory mapped result for the npz format.\n"
+    "Default: the directory of the output file"
+)
+
+
+def read_header(npz, name):
+    '''
+    Returns shape and dtype of the array *name* in the open zip file *npz*
+    without reading its data.
+    '''
+    with npz.open(name + '.npy') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
         else:
-            readMatrix = arr['matrix']
-            if len(readMatrix) < len(ma):
-                print("%s" % (len(ma) - len(readMatrix)))
-                a = np.array([[0]] * (len(ma) - len(readMatrix)))
-                print("%s %s" % (a.shape, readMatrix.shape))
-                readMatrix = np.vstack((readMatrix, a))
-                print("%s %s" % (a.shape, readMatrix.shape))
-            ma = np.concatenate((ma, readMatrix), axis=1)
-
-        print("Matrix shape: %s" % str(ma.shape))
-        print("Labels: %s" % ", ".join(labels))
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    return shape, dtype
+
 
-    print(ma.size)
+def inspect(path):
+    '''
+    Returns (shape, dtype, is_sparse) of the matrix stored in *path*.
+    '''
+    with zipfile.ZipFile(path) as npz:
+        names = set(os.path.splitext(name)[0] for name in npz.namelist())
+    if 'matrix' in names:
+        with zipfile.ZipFile(path) as npz:
+            shape, dtype = read_header(npz, 'matrix')
+        if len(shape) != 2:
+            sys.exit("Matrix in %s is not two dimensional." % path)
+        return shape, dtype, False
+    if {'format', 'shape', 'data'} <= names:
+        with np.load(path) as arr:
+            shape = tuple(int(x) for x in arr['shape'])
+        with zipfile.ZipFile(path) as npz:
+            shape_data, dtype = read_header(npz, 'data')
+        return shape, dtype, True
+    sys.exit("%s contains neither a matrix nor a sparse matrix." % path)
 
-outFile = args.output
-n = 0
-while os.path.exists(outFile):
-    n += 1
-    head, tail = os.path.split(outFile)
-    tail = "%s-%s" % (n, tail)
-    outFile = os.path.join(head, tail)
 
-print("Output file: %s" % outFile)
-np.savez_compressed(outFile, matrix=ma, labels=labels)
+def read_labels(path, is_sparse, columns):
+    with np.load(path) as arr:
+        if 'labels' in arr.files:
+            return [str(label) for label in arr['labels']]
+    # sparse matrices have no labels
+    name = os.path.splitext(os.path.basename(path))[0]
+    if columns == 1:
+        return [name]
+    return ["%s-%d" % (name, i) for i in range(columns)]
 
-# print(arr)
 
-# check array dimensions if they are equal merge them by column
+def read_matrix(path, is_sparse):
+    if is_sparse:
+        return sparse.load_npz(path)
+    with np.load(path) as arr:
+        return arr['matrix']
+
+
+def unused_path(outFile):
+    n = 0
+    while os.path.exists(outFile):
+        n += 1
+        head, tail = os.path.split(outFile)
+        tail = "%s-%s" % (n, tail)
+        outFile = os.path.join(head, tail)
+    return outFile
+
+
+def main(args):
+    # 1. pass: shapes and types
+    inputs = list()
+    rows = 0
+    columns = 0
+    dtypes = list()
+    for f in args.files:
+        print("Reading header of .npz-file: %s" % f)
+        shape, dtype, is_sparse = inspect(f)
+        inputs.append((f, shape, is_sparse))
+        rows = max(rows, shape[0])
+        columns += shape[1]
+        dtypes.append(dtype)
+    if not inputs:
+        sys.exit("No input files given.")
+    dtype = np.result_type(*dtypes)
+    print("Matrix shape: %s" % str((rows, columns)))
+
+    outFile = args.output
+    if args.format == 'npy':
+        if not outFile.endswith('.npy'):
+            outFile += '.npy'
+        outFile = unused_path(outFile)
+        result_path = outFile
+        temp_dir = None
+    else:
+        if not outFile.endswith('.npz'):
+            outFile += '.npz'
+        outFile = unused_path(outFile)
+        temp_dir = tempfile.mkdtemp(
+            dir=args.tmpdir or os.path.dirname(os.path.abspath(outFile)))
+        result_path = os.path.join(temp_dir, 'matrix.npy')
+
+    try:
+        # the new file is filled with zeros, so short matrices are padded
+        ma = np.lib.format.open_memmap(result_path, mode='w+', dtype=dtype,
+                                       shape=(rows, columns),
+                                       fortran_order=True)
+
+        # 2. pass: copy the matrices into their columns
+        labels = list()
+        column = 0
+        for f, shape, is_sparse in inputs:
+            print("Reading .npz-file: %s" % f)
+            matrix = read_matrix(f, is_sparse)
+            if is_sparse:
+                # densify in blocks of columns to limit the memory
+                matrix = matrix.tocsc()
+                step = max(1, (64 * 1024 * 1024) //
+                           max(1, shape[0] * dtype.itemsize))
+                for start in range(0, shape[1], step):
+                    end = min(start + step, shape[1])
+                    ma[:shape[0], column + start:column + end] = \
+                        matrix[:, start:end].toarray()
+            else:
+                ma[:shape[0], column:column + shape[1]] = matrix
+            del matrix
+            labels.extend(read_labels(f, is_sparse, shape[1]))
+            column += shape[1]
+        print("Labels: %s" % ", ".join(labels))
+        ma.flush()
+
+        print("Output file: %s" % outFile)
+        if args.format == 'npy':
+            with open(os.path.splitext(outFile)[0] + '.labels.txt',
+                      'w') as fl:
+                fl.writelines("%s\n" % label for label in labels)
+        else:
+            # numpy writes memory mapped arrays in chunks
+            np.savez_compressed(outFile, matrix=ma, labels=labels)
+        del ma
+    finally:
+        if temp_dir is not None:
+            if os.path.exists(result_path):
+                os.remove(result_path)
+            os.rmdir(temp_dir)
+
 
-# np.load()
+if __name__ == '__main__':
+    main(parser.parse_args())
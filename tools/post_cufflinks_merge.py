@@ -22,7 +22,6 @@ import pprint
 from collections import OrderedDict
 from collections import defaultdict
 import numpy
-from Bio import SeqIO
 
 pp = pprint.PrettyPrinter(indent=4)
 
@@ -106,7 +105,7 @@ def write_t_obj(t_obj):
 
     for i in gtf_dicts:
         t_list = []
-        keys = i.keys()
+        keys = list(i.keys())
         for key in keys[8:]:
             opt_id = key
             opt_val = str(i[key])
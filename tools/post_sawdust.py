@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # post_sawdust.py
 
+import os
 import sys
 import re
 import argparse
@@ -8,17 +9,26 @@ from argparse import RawTextHelpFormatter
 import pprint
 import yaml
 from collections import OrderedDict
-import numpy
-from Bio import SeqIO
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import indexed_fasta
+import record_io
 
 pp = pprint.PrettyPrinter(indent=4)
 
+# number of output lines written at once
+OUTPUT_BATCH_SIZE = 10000
+CIGAR_OPERATION = re.compile(r'(\d+)(\D)')
+# cigar operations counted by get_genomic_sequence_length
+SEQUENCE_OPERATIONS = frozenset('MIS=X')
+
 
 def read_arguments():
     parser = argparse.ArgumentParser(
         description="takes segemehl SAM output and merges split reads into one SAM line in addition some entries are tinkered with")
-    parser.add_argument('infile', nargs='?', type=argparse.FileType('r'),
-                        default=sys.stdin, help="Infile: default=stdin")
+    parser.add_argument('infile', nargs='?', default='-',
+                        help="Infile: default=stdin")
 
     parser.add_argument('outfile', nargs='?', type=argparse.FileType('w'),
                         default=sys.stdout, help="Outfile: default=stdout")
@@ -55,6 +65,13 @@ def read_arguments():
         default=None,
         help="Fasta file, like: hg19.fa Only necessary for unstranded RNA Libraries")
 
+    parser.add_argument(
+        '--packed-genome',
+        action='store_true',
+        default=False,
+        help="Hold the genome 2-bit packed in memory instead of reading it "
+        "from the memory mapped fasta file")
+
     parser.add_argument(
         '--read-type',
         choices=[
@@ -102,9 +119,9 @@ def eval_arguments(args):
         if args.genome is None:
             raise Exception(
                 'Argument --genome is {0}; please specify fasta file '.format(args.genome))
-        handle = open(args.genome, "rU")
-        args.genome_dict = SeqIO.to_dict(SeqIO.parse(handle, "fasta"))
-        handle.close()
+        # sequences are read on demand via the .fai index
+        args.genome_dict = indexed_fasta.open_fasta(
+            args.genome, packed=args.packed_genome)
 
 
 # called from main
@@ -157,20 +174,6 @@ def init_metrics():
     return metrics
 
 
-def collect(sam_hits, samdict, ID):
-    if ID is None:
-        ID = samdict['qname']
-
-    if ID == samdict['qname']:
-        sam_hits.append(samdict)
-        process_switch = 0
-    else:
-        process_switch = 1
-        ID = samdict['qname']
-
-    return sam_hits, samdict, ID, process_switch
-
-
 def group_sam_hits_by_mappings(sam_hits):
     """
     Returns  a dictionary with:
@@ -187,21 +190,19 @@ def group_sam_hits_by_mappings(sam_hits):
     aln_dict = dict()
 
     for samdict in sam_hits:
-        if 'XI' not in samdict['opt']:
-            # pp.pprint(samdict)
+        XI_val = samdict.get_tag('XI')
+        if XI_val is None:
             raise Exception('XI flag missing')
 
-        XI_val = samdict['opt']['XI'][0]
-
         if XI_val not in aln_dict:
             for i in [0, 1]:
                 aln_dict.setdefault(XI_val, {})[i] = []
 
         if args.read_type == 'single':
-            samdict['flag'] = setBit(samdict['flag'], 6)
-            samdict['flag'] = clearBit(samdict['flag'], 7)
+            samdict.flag = setBit(samdict.flag, 6)
+            samdict.flag = clearBit(samdict.flag, 7)
 
-        fstsnd = first_or_second_read(samdict['flag'])
+        fstsnd = first_or_second_read(samdict.flag)
         aln_dict[XI_val][fstsnd].append(samdict)
 
     return aln_dict
@@ -247,9 +248,9 @@ def correct_flags_and_mate_information(aln_dict):
                 suitable.append(XI)
                 single_read_placement[XI] = 1
 
+    NH = len(aln_dict)
     for i in suitable:
         template = aln_dict[i]
-        NH = len(aln_dict.keys())
 
         if args.read_type == 'single':
             samdict = template[single_read_placement[i]][0]
@@ -297,9 +298,7 @@ def collect_metrics(aln_dict, metrics):
     indict = metrics[0]
     outdict = metrics[1]
 
-    XI = aln_dict.keys()
-    XI.remove('suitable')
-    XI.remove('single_read_placement')
+    XI = mapping_numbers(aln_dict)
     XI_len = len(XI)
 
     suitable = aln_dict['suitable']
@@ -364,7 +363,8 @@ def collect_metrics(aln_dict, metrics):
     return (aln_dict, [indict, outdict])
 
 
-def output(aln_dict):
+def output(aln_dict, out_lines):
+    """ appends the SAM lines of the suitable mappings to out_lines """
     single_read_placement = aln_dict['single_read_placement']
     suitable = aln_dict['suitable']
 
@@ -379,14 +379,11 @@ def output(aln_dict):
 
         for read in tlist:
             sam_line = make_sam_line(template[read][0])
-            args.outfile.write(sam_line + '\n')
+            out_lines.append(sam_line + '\n')
 
 
 def output_splits(aln_dict):
-    XI = aln_dict.keys()
-    XI.remove('suitable')
-    XI.remove('single_read_placement')
-    XI_len = len(XI)
+    XI = mapping_numbers(aln_dict)
 
     for entry in XI:
         template = aln_dict[entry]
@@ -402,30 +399,47 @@ def output_splits(aln_dict):
 # called by functions used in main
 
 
-def read_sam_line(line):
+class SamRecord(record_io.SamRecord):
     """
-    Returns the SAM line in a dictionary with optional fields
-    stored in a seprate dictionary under samdict['opt']
+    SamRecord with the number of hits of its read.
     """
-    fields = line.split('\t')
-    keylist = 'qname, flag, rname, pos, mapq, cigar, mrnm, mpos, isize, seq, qual'.split(
-        ', ')
+    __slots__ = ('NH',)
 
-    optional_fields = fields[11:]
-    samdict = dict(zip(keylist, fields[0:11]))
+    def __init__(self, line):
+        super(SamRecord, self).__init__(line)
+        self.NH = None
 
-    for numbers in ['flag', 'pos', 'mapq', 'isize']:
-        samdict[numbers] = int(samdict[numbers])
 
-    for opt_entry in optional_fields:
-        (opt_id, opt_def, opt_val) = opt_entry.split(':')
-        if opt_def == 'i':
-            opt_val = int(opt_val)
-        if opt_def == 'f':
-            opt_val = float(opt_val)
-        samdict.setdefault('opt', {})[opt_id] = [opt_val, opt_def]
+def read_templates(infile, outfile):
+    """
+    Yields the SamRecords of one read name at a time. Header lines are
+    written to *outfile* as they are.
+    """
+    reader = record_io.SamReader(infile)
+    # in case the SAM header is piped
+    for line in reader.header:
+        outfile.write(line.decode() + '\n')
+    sam_hits = []
+    ID = None
+    for line in reader:
+        line = line.decode()
+        qname = line[:line.find('\t')]
+        if qname != ID:
+            if sam_hits:
+                yield sam_hits
+            sam_hits = []
+            ID = qname
+        sam_hits.append(SamRecord(line))
+    if sam_hits:
+        yield sam_hits
 
-    return samdict
+
+def mapping_numbers(aln_dict):
+    """
+    Returns the XI values of aln_dict without the bookkeeping keys.
+    """
+    return [XI for XI in aln_dict
+            if XI not in ('suitable', 'single_read_placement')]
 
 
 def make_sam_line(samdict):
@@ -433,29 +447,11 @@ def make_sam_line(samdict):
     Takes a samdict and glues all the variables together to produce a SAM line
     """
 
-    keylist = 'qname, flag, rname, pos, mapq, cigar, mrnm, mpos, isize, seq, qual'.split(
-        ', ')
-    pre_line = []
-
     # quick fix for single
     if args.read_type == 'single':
-        samdict['flag'] = clearBit(samdict['flag'], 6)
-
-    for key in keylist:
-        pre_line.append(samdict[key])
-
-    opt_dict = samdict['opt']
-    for key in sorted(opt_dict.iterkeys()):
-        tlist = [key,
-                 opt_dict[key][1],
-                 str(opt_dict[key][0])
-                 ]
-        opt = ':'.join(tlist)
-        pre_line.append(opt)
+        samdict.flag = clearBit(samdict.flag, 6)
 
-    samline = "\t".join(str(v) for v in pre_line)
-
-    return samline
+    return samdict.to_line()
 
 
 def check_split_read(list_of_fragments):
@@ -478,7 +474,7 @@ def check_split_read(list_of_fragments):
     # all frags should be on the same chr
     tlist = []
     for samdict in list_of_fragments:
-        tlist.append(samdict['rname'])
+        tlist.append(samdict.rname)
 
     if not all_same(tlist):
         info['type'] = 'not_same_chr'
@@ -487,7 +483,7 @@ def check_split_read(list_of_fragments):
     if info['type'] == 'OK':
         tlist = []
         for samdict in list_of_fragments:
-            tlist.append(testBit(samdict['flag'], 4))
+            tlist.append(testBit(samdict.flag, 4))
 
         if not all_same(tlist):
             info['type'] = 'not_same_strand'
@@ -495,14 +491,14 @@ def check_split_read(list_of_fragments):
     # all frags should be in args.distance
     # all frags should not overlap with each other
     list_of_fragments_by_pos = sorted(
-        list_of_fragments, key=lambda k: k['pos'])
+        list_of_fragments, key=lambda k: k.pos)
     if info['type'] == 'OK':
         tlist_start = []
         tlist_end = []
         for samdict in list_of_fragments_by_pos:
-            tlist_start.append(samdict['pos'])
-            seq_length = get_genomic_sequence_length(samdict['cigar'])
-            tlist_end.append(samdict['pos'] + seq_length)
+            tlist_start.append(samdict.pos)
+            seq_length = get_genomic_sequence_length(samdict.cigar)
+            tlist_end.append(samdict.pos + seq_length)
 
         tlist_start.pop(0)
         tlist_end.pop()
@@ -520,10 +516,10 @@ def check_split_read(list_of_fragments):
 
         tlist = []
         for samdict in list_of_fragments_by_pos:
-            tlist.append(samdict['opt']['XQ'][0])
+            tlist.append(samdict.get_tag('XQ'))
 
         samdict = list_of_fragments_by_pos[0]
-        some_number = testBit(samdict['flag'], 4)
+        some_number = testBit(samdict.flag, 4)
 
         if some_number > 0:
             tlist.reverse()
@@ -545,8 +541,8 @@ def combinde_md_field(new_samdict, samdict):
     """
     md_new = []
 
-    md_pf = new_samdict['opt']['MD'][0]
-    md_nf = samdict['opt']['MD'][0]
+    md_pf = new_samdict.get_tag('MD')
+    md_nf = samdict.get_tag('MD')
 
     prog = re.compile(r'\d+')
     pattern_pf = prog.finditer(md_pf)
@@ -555,7 +551,7 @@ def combinde_md_field(new_samdict, samdict):
     if pattern_pf is None:
         raise Exception(
             'No integer found in MD: {0} of previous Fragment \nreadname: {1}'.format(
-                md_pf, new_samdict['qname']))
+                md_pf, new_samdict.qname))
 
     # get last match through iterator
     last_match_pf = None
@@ -566,18 +562,18 @@ def combinde_md_field(new_samdict, samdict):
     if last_match_pf.end() != len(md_pf):
         raise Exception(
             'No integer found at  end of MD: {0} of previous Fragment \nreadname: {1}'.format(
-                md_pf, new_samdict['qname']))
+                md_pf, new_samdict.qname))
 
     pattern_nf = prog.match(md_nf)
     if pattern_nf is None:
         raise Exception(
             'No integer found in MD: {0} of next Fragment \nreadname: {1}'.format(
-                md_nf, samdict['qname']))
+                md_nf, samdict.qname))
 
     if pattern_nf.start() > 0:
         raise Exception(
             'MD: {0} of next Fragment starts not with integer in \nreadname: {1}'.format(
-                md_nf, samdict['qname']))
+                md_nf, samdict.qname))
 
     # now go through the cases
     # keeping remains of md prev and next
@@ -606,7 +602,7 @@ def combinde_md_field(new_samdict, samdict):
     else:
         raise Exception(
             'pf {2} nf {3} unexpected MD case:\n{0}\n {1}'.format(
-                new_samdict, samdict, pf, nf))
+                new_samdict.to_line(), samdict.to_line(), pf, nf))
 
     return md_new
 
@@ -619,11 +615,11 @@ def combine_split_reads(list_of_fragments, info):
     if info['type'] != 'OK':
         # mark not combinable split read in samdict
         for samdict in list_of_fragments:
-            samdict.setdefault('opt', {})['YS'] = [info['type'], 'Z']
+            samdict.set_tag('YS', info['type'], 'Z')
         return list_of_fragments
     else:
         list_of_fragments_by_pos = sorted(
-            list_of_fragments, key=lambda k: k['pos'])
+            list_of_fragments, key=lambda k: k.pos)
         new_samdict = list_of_fragments_by_pos[0]
 
         # need to set
@@ -634,31 +630,32 @@ def combine_split_reads(list_of_fragments, info):
         ##NH  ['opt']['NM'][0]
 
         mapq = []
-        mapq.append(new_samdict['mapq'])
+        mapq.append(new_samdict.mapq)
         XS_list = []
         for i, samdict in enumerate(list_of_fragments_by_pos[1:]):
          #       pp.pprint(i)
           #      pp.pprint(samdict)
 
-            new_samdict['seq'] += samdict['seq']
-            new_samdict['qual'] += samdict['qual']
-            new_samdict['opt']['NM'][0] += samdict['opt']['NM'][0]
+            new_samdict.seq += samdict.seq
+            new_samdict.qual += samdict.qual
+            new_samdict.set_tag('NM', new_samdict.get_tag('NM') +
+                                samdict.get_tag('NM'), 'i')
 
-            seq_length = get_genomic_sequence_length(new_samdict['cigar'])
-            diff = samdict['pos'] - (new_samdict['pos'] + seq_length)
-            new_samdict['cigar'] = ''.join(
-                [new_samdict['cigar'], str(diff), 'N', samdict['cigar']])
+            seq_length = get_genomic_sequence_length(new_samdict.cigar)
+            diff = samdict.pos - (new_samdict.pos + seq_length)
+            new_samdict.cigar = ''.join(
+                [new_samdict.cigar, str(diff), 'N', samdict.cigar])
 
             if (args.library_type == 'fr-unstranded' and args.seq_type == 'RNA'):
                 record_dict = args.genome_dict
-                rname = new_samdict['rname']
-                spliceA_start = (new_samdict['pos'] + seq_length - 1)
+                rname = new_samdict.rname
+                spliceA_start = (new_samdict.pos + seq_length - 1)
                 spliceA_end = spliceA_start + 2
-                spliceB_start = samdict['pos'] - 3
-                spliceB_end = samdict['pos'] - 1
+                spliceB_start = samdict.pos - 3
+                spliceB_end = samdict.pos - 1
 
-                subseq = str(record_dict[rname].seq[spliceA_start:spliceA_end])
-                subseq += str(record_dict[rname].seq[spliceB_start:spliceB_end])
+                subseq = record_dict[rname][spliceA_start:spliceA_end]
+                subseq += record_dict[rname][spliceB_start:spliceB_end]
 
                 # splice sites are found on the plus strand so transcript comes
                 # from +
@@ -673,18 +670,18 @@ def combine_split_reads(list_of_fragments, info):
                 else:
                     XS_list.append('dunno')
 
-            mapq.append(samdict['mapq'])
+            mapq.append(samdict.mapq)
             # MD fields suck  ....
-            new_samdict['opt']['MD'][0] = combinde_md_field(
-                new_samdict, samdict)
+            new_samdict.set_tag('MD', combinde_md_field(
+                new_samdict, samdict), 'Z')
 
         new_samdict = clean_dict(new_samdict)
 
         new_samdict = add_XS_field(new_samdict, XS_list)
 
-        mapq_mean = numpy.mean(mapq)
-        new_samdict['mapq'] = int(numpy.floor(mapq_mean))
-        new_samdict.setdefault('opt', {})['YS'] = [info['type'], 'Z']
+        # floor of the mean
+        new_samdict.mapq = sum(mapq) // len(mapq)
+        new_samdict.set_tag('YS', info['type'], 'Z')
         # print('samdict')
 
         return [new_samdict]
@@ -693,9 +690,9 @@ def combine_split_reads(list_of_fragments, info):
 def add_XS_field(samdict, XS_list):
 
     # 0 = fst 1 =snd
-    fstsnd = str(first_or_second_read(samdict['flag']))
+    fstsnd = str(first_or_second_read(samdict.flag))
     # 0 = sense 1 = reverse
-    direction = str(read_orientation(samdict['flag']))
+    direction = str(read_orientation(samdict.flag))
 
     XS_type = ''.join([fstsnd, direction])
     XS_dict = dict()
@@ -718,7 +715,7 @@ def add_XS_field(samdict, XS_list):
         elif not all_same(XS_list):
             pass
         else:
-            samdict.setdefault('opt', {})['XS'] = [XS_list[0], 'A']
+            samdict.set_tag('XS', XS_list[0], 'A')
 
     elif (args.library_type == 'fr-firststrand' and args.seq_type == 'RNA'):
         # by definition
@@ -727,7 +724,7 @@ def add_XS_field(samdict, XS_list):
         # second read reverse -> comes from -
         # second not read reverse -> comes from +
 
-        samdict.setdefault('opt', {})['XS'] = [XS_val, 'A']
+        samdict.set_tag('XS', XS_val, 'A')
 
     elif (args.library_type == 'fr-secondstrand' and args.seq_type == 'RNA'):
         # by definition
@@ -737,7 +734,7 @@ def add_XS_field(samdict, XS_list):
         # second not read reverse -> comes from -
         # since its the opposite outcome of fr-firstrand +/- are swapped
 
-        samdict.setdefault('opt', {})['XS'] = [XS_dict[XS_val], 'A']
+        samdict.set_tag('XS', XS_dict[XS_val], 'A')
 
     else:
         pass
@@ -753,17 +750,16 @@ def clean_dict(samdict):
 
     tags = ['XA', 'XX', 'XY', 'XQ', 'XL', 'XP', 'XU', 'XS', 'XC', 'XV', 'XT']
     for tag in tags:
-        if tag in samdict['opt']:
-            del samdict['opt'][tag]
+        samdict.remove_tag(tag)
 
     return samdict
 
 
 def samdict_set_mate_unmapped(samdict):
-    samdict['flag'] = setBit(samdict['flag'], 3)
-    samdict['mrnm'] = '*'
-    samdict['mpos'] = 0
-    samdict['isize'] = 0
+    samdict.flag = setBit(samdict.flag, 3)
+    samdict.mrnm = '*'
+    samdict.mpos = 0
+    samdict.isize = 0
     return samdict
 
 
@@ -781,12 +777,12 @@ def samdict_set_pe_mate(samdict_A, samdict_B):
 
     tdict = dict()
 
-    if (samdict_A['rname'] == samdict_B['rname']):
-        samdict_A['mrnm'] = '='
-        samdict_B['mrnm'] = '='
+    if (samdict_A.rname == samdict_B.rname):
+        samdict_A.mrnm = '='
+        samdict_B.mrnm = '='
 
         # set isize
-        if samdict_A['pos'] < samdict_B['pos']:
+        if samdict_A.pos < samdict_B.pos:
             tdict['left'] = samdict_A
             tdict['right'] = samdict_B
         else:
@@ -794,50 +790,50 @@ def samdict_set_pe_mate(samdict_A, samdict_B):
             tdict['right'] = samdict_A
             tdict['left'] = samdict_B
 
-        seq_length = get_genomic_sequence_length(tdict['right']['cigar'])
-        isize = tdict['right']['isize'] + seq_length - tdict['left']['isize']
+        seq_length = get_genomic_sequence_length(tdict['right'].cigar)
+        isize = tdict['right'].isize + seq_length - tdict['left'].isize
 
-        tdict['right']['isize'] = isize
-        tdict['left']['isize'] = isize * (-1)
+        tdict['right'].isize = isize
+        tdict['left'].isize = isize * (-1)
 
     else:
-        samdict_A['mrnm'] = samdict_B['rname']
-        samdict_B['mrnm'] = samdict_A['rname']
+        samdict_A.mrnm = samdict_B.rname
+        samdict_B.mrnm = samdict_A.rname
 
-        samdict_A['isize'] = 0
-        samdict_B['isize'] = 0
+        samdict_A.isize = 0
+        samdict_B.isize = 0
 
-    samdict_A['mpos'] = samdict_B['pos']
-    samdict_B['mpos'] = samdict_A['pos']
+    samdict_A.mpos = samdict_B.pos
+    samdict_B.mpos = samdict_A.pos
 
     # if mate reverse set mate reverse flag in my info
-    if testBit(samdict_B['flag'], 4) > 0:
-        samdict_A['flag'] = setBit(samdict_A['flag'], 5)
+    if testBit(samdict_B.flag, 4) > 0:
+        samdict_A.flag = setBit(samdict_A.flag, 5)
 
-    if testBit(samdict_A['flag'], 4) > 0:
-        samdict_B['flag'] = setBit(samdict_B['flag'], 5)
+    if testBit(samdict_A.flag, 4) > 0:
+        samdict_B.flag = setBit(samdict_B.flag, 5)
 
     # proper pair
     # same chr read orientation must face each other ---> <---
-    samdict_A['flag'] = clearBit(samdict_A['flag'], 1)
-    samdict_B['flag'] = clearBit(samdict_B['flag'], 1)
+    samdict_A.flag = clearBit(samdict_A.flag, 1)
+    samdict_B.flag = clearBit(samdict_B.flag, 1)
 
     # same chr:
-    if (samdict_A['rname'] == samdict_B['rname']):
+    if (samdict_A.rname == samdict_B.rname):
         one_reverse = None
         # reverse read sholud always be after unreversed read
-        if (testBit(samdict_A['flag'], 4) >
-                0 and testBit(samdict_A['flag'], 5) == 0):
-            if (samdict_B['pos'] <= samdict_A['pos']):
+        if (testBit(samdict_A.flag, 4) >
+                0 and testBit(samdict_A.flag, 5) == 0):
+            if (samdict_B.pos <= samdict_A.pos):
                 one_reverse = 1
 
-        elif (testBit(samdict_A['flag'], 4) == 0 and testBit(samdict_A['flag'], 5) > 0):
-            if (samdict_A['pos'] <= samdict_B['pos']):
+        elif (testBit(samdict_A.flag, 4) == 0 and testBit(samdict_A.flag, 5) > 0):
+            if (samdict_A.pos <= samdict_B.pos):
                 one_reverse = 1
 
         if (one_reverse):
-            samdict_A['flag'] = setBit(samdict_A['flag'], 1)
-            samdict_B['flag'] = setBit(samdict_B['flag'], 1)
+            samdict_A.flag = setBit(samdict_A.flag, 1)
+            samdict_B.flag = setBit(samdict_B.flag, 1)
 
     return (samdict_A, samdict_B)
 
@@ -848,19 +844,10 @@ def get_genomic_sequence_length(cigar):
     doing the cigar opeartions.
     Does not catch malformed cigarlines
     """
-    cigar_strings = ['M', 'I', 'D', 'N', 'S', 'H', 'P', '=', 'X']
-    cigar_dict = dict.fromkeys(cigar_strings, 0)
-
-    tlist = re.findall(r'\d+\D', cigar, flags=0)
-    for i in tlist:
-        cigar_type = i[-1:]
-        count = int(i[:-1])
-        cigar_dict[cigar_type] += count
-
-    list_sum_of_length = ['M', 'I', 'S', '=', 'X']
     seq_length = 0
-    for i in list_sum_of_length:
-        seq_length += cigar_dict[i]
+    for count, cigar_type in CIGAR_OPERATION.findall(cigar):
+        if cigar_type in SEQUENCE_OPERATIONS:
+            seq_length += int(count)
 
     return seq_length
 
@@ -892,24 +879,24 @@ def read_orientation(flag):
 
 
 def samdict_set_mapq(samdict):
-    NH = samdict['NH']
+    NH = samdict.NH
     if (NH == 1):
-        samdict['mapq'] = 50
+        samdict.mapq = 50
     elif (NH == 2):
-        samdict['mapq'] = 5
+        samdict.mapq = 5
     else:
-        samdict['mapq'] = 0
+        samdict.mapq = 0
 
     return samdict
 
 
 def samdict_set_NH(samdict, NH):
 
-    samdict['flag'] = clearBit(samdict['flag'], 8)
-    samdict['NH'] = NH
+    samdict.flag = clearBit(samdict.flag, 8)
+    samdict.NH = NH
 
     if (NH > 1):
-        samdict['flag'] = setBit(samdict['flag'], 8)
+        samdict.flag = setBit(samdict.flag, 8)
 
     return samdict
 
@@ -962,10 +949,7 @@ def toggleBit(int_type, offset):
 def is_split(samdicts):
     samdict = samdicts[0]
 
-    if 'YS' in samdict['opt']:
-        return samdict['opt']['YS'][0]
-    else:
-        return None
+    return samdict.get_tag('YS')
 
 
 def output_metrics(metrics):
@@ -985,9 +969,7 @@ def check_sort_order_sam_file(lst):
 
 def filter_for_snp_calling(aln_dict):
 
-    XI = aln_dict.keys()
-    XI.remove('suitable')
-    XI.remove('single_read_placement')
+    XI = mapping_numbers(aln_dict)
     NH = len(XI)
     if NH > 1:
         aln_dict['suitable'] = []
@@ -1000,7 +982,7 @@ def filter_for_snp_calling(aln_dict):
     n_snd = len(snd)
 
     if n_fst == n_snd:
-        if fst[0]['mrnm'] != '=':
+        if fst[0].mrnm != '=':
             aln_dict['suitable'] = []
             return aln_dict
 
@@ -1008,58 +990,31 @@ def filter_for_snp_calling(aln_dict):
 
 
 def main(args):
-    ID = None
-    # print(args)
-    out = args.outfile
-    sam_hits = []
     metrics = init_metrics()
+    out_lines = []
 
-    for line in args.infile:
-        # in case the SAM header is piped
-        if line[0] == '@':
-            args.outfile.write(line)
-            continue
-        line = line.rstrip('\n')
-        samdict = read_sam_line(line)
-
-        # take all reads same name and put them into a list "sam_hits"
-        (sam_hits, samdict, ID, process_switch) = collect(sam_hits, samdict, ID)
-
-        # new readname  encountered start processesing
-        if process_switch == 1:
-            # check_sort_order_sam_file([sam_hits[0]['qname'],ID])
-            # look at XI paires and determine if only paired or single are in
-            # the collection
-            aln_dict = group_sam_hits_by_mappings(sam_hits)
-            aln_dict = process_split_reads(aln_dict)
-            aln_dict = correct_flags_and_mate_information(aln_dict)
-
-            if (args.filter_snp_calling):
-                aln_dict = filter_for_snp_calling(aln_dict)
-            aln_dict, metrics = collect_metrics(aln_dict, metrics)
-            # pp.pprint((aln_dict))
-
-            output(aln_dict)
-
-            if (args.outfile_splits):
-                output_splits(aln_dict)
-            aln_dict = []
-            sam_hits = []
-            sam_hits.append(samdict)
-
-    # last block after while iteration
-    aln_dict = group_sam_hits_by_mappings(sam_hits)
-    aln_dict = process_split_reads(aln_dict)
-    aln_dict = correct_flags_and_mate_information(aln_dict)
-    if (args.filter_snp_calling):
-        aln_dict = filter_for_snp_calling(aln_dict)
-
-    aln_dict, metrics = collect_metrics(aln_dict, metrics)
-    output(aln_dict)
-    if (args.outfile_splits):
-        output_splits(aln_dict)
-    output_metrics(metrics)
+    # take all reads same name and put them into a list "sam_hits"
+    for sam_hits in read_templates(args.infile, args.outfile):
+        # look at XI paires and determine if only paired or single are in
+        # the collection
+        aln_dict = group_sam_hits_by_mappings(sam_hits)
+        aln_dict = process_split_reads(aln_dict)
+        aln_dict = correct_flags_and_mate_information(aln_dict)
 
+        if (args.filter_snp_calling):
+            aln_dict = filter_for_snp_calling(aln_dict)
+        aln_dict, metrics = collect_metrics(aln_dict, metrics)
+
+        output(aln_dict, out_lines)
+        if len(out_lines) >= OUTPUT_BATCH_SIZE:
+            args.outfile.writelines(out_lines)
+            out_lines = []
+
+        if (args.outfile_splits):
+            output_splits(aln_dict)
+
+    args.outfile.writelines(out_lines)
+    output_metrics(metrics)
 
 if __name__ == '__main__':
     args = read_arguments()
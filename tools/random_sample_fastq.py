@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 import gzip
 import argparse
+import array
+import itertools
+import math
+import os
 import random
+import struct
 import sys
-import os
 seq_pipeline_path = os.path.dirname(os.path.realpath(__file__))
 activate_this_file = '%s/../python_env/bin/activate_this.py' % seq_pipeline_path
 exec(
@@ -14,10 +18,20 @@ exec(
     dict(
         __file__=activate_this_file))
 
+# number of bytes read at once
+BLOCK_SIZE = 4 * 1024 * 1024
+
+INDEX_MAGIC = b'UAPRIDX1'
+# magic, size and modification time of the indexed file, lines per record
+INDEX_HEADER = struct.Struct('<8sQQQ')
+
 
 def read_args():
     parser = argparse.ArgumentParser(
-        description='randomly sample from [s]ingle or [p]aired end fastq file')
+        description='randomly sample from [s]ingle or [p]aired end fastq '
+        'file. The input is read once and can be a pipe (-). With --index '
+        'the record offsets of uncompressed files are stored, so that '
+        'further samples of the same files only read the sampled records.')
     parser.add_argument('readtype', type=str, metavar='type', nargs=1, choices=[
                         'single', 'paired'], help='single or paired, default = None')
     parser.add_argument(
@@ -26,7 +40,8 @@ def read_args():
         type=int,
         nargs=1,
         help='Number of reads to sample')
-    parser.add_argument('--infiles', '-i', nargs='+', help='Fastq input')
+    parser.add_argument('--infiles', '-i', nargs='+',
+                        help='Fastq input, - for stdin')
     parser.add_argument('--outfiles', '-o', nargs='+', help='Fastq output')
     parser.add_argument('--read-gz', nargs='?', const=True,
                         help='input is gzipped: infile.fastq.gz')
@@ -41,6 +56,14 @@ def read_args():
         default='fastq',
         const='fasta',
         help='fasta or fastq file default is set to fastq')
+    parser.add_argument(
+        '--index',
+        nargs='+',
+        default=None,
+        help='record offset index per input file. It is created if it '
+        'does not exist or does not fit the input file anymore.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the random number generator')
 
     args = parser.parse_args()
 
@@ -50,6 +73,10 @@ def read_args():
         args.divideby = 4
 
     # some checking
+    if args.sample_size is None or args.sample_size[0] < 1:
+        sys.stderr.write("sample size has to be at least 1\n")
+        exit(1)
+
     if args.readtype[0] == 'single':
         if not (len(args.infiles) == 1 and len(args.outfiles) == 1):
             sys.stderr.write(
@@ -67,72 +94,250 @@ def read_args():
         sys.stderr.write("duplicate filename\n")
         exit(1)
 
+    if args.index is not None:
+        if len(args.index) != len(args.infiles):
+            sys.stderr.write("one index per input file required\n")
+            exit(1)
+        if args.read_gz or '-' in args.infiles:
+            sys.stderr.write("an index requires uncompressed input files\n")
+            exit(1)
+
     return args
 
 
 def provide_FH(args):
-    my_range = {'single': 1, 'paired': 2}
     files = {'in': [], 'out': []}
 
-    for i in range(my_range[args.readtype[0]]):
-        infilename = args.infiles[i]
-        outfilename = args.outfiles[i]
-
-        if args.read_gz:
-            f = gzip.open(infilename, 'rb')
+    for infilename, outfilename in zip(args.infiles, args.outfiles):
+        if infilename == '-':
+            f = sys.stdin.buffer
         else:
-            f = open(infilename, 'r')
+            f = open(infilename, 'rb')
+        if args.read_gz:
+            f = gzip.open(f, 'rb')
         files['in'].append(f)
 
         if args.write_gz:
             f = gzip.open(outfilename, 'wb')
         else:
-            f = open(outfilename, 'w')
+            f = open(outfilename, 'wb')
         files['out'].append(f)
     return files
 
 
-def main(args):
-    files = provide_FH(args)
+def uniform():
+    '''
+    Returns a random number in the open interval (0, 1).
+    '''
+    while True:
+        u = random.random()
+        if u > 0.0:
+            return u
+
+
+class Reservoir(object):
+    '''
+    Reservoir sampling with Algorithm L (Li 1994): after the reservoir is
+    filled, the number of records to skip until the next replacement is
+    drawn directly, so only sampled records are touched.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.records = []
+        self.w = math.exp(math.log(uniform()) / size)
+        self.next = size - 1
+        self.advance()
+
+    def advance(self):
+        self.next += int(math.log(uniform()) / math.log(1 - self.w)) + 1
+
+    def wanted(self, first, end):
+        '''
+        Yields the indices of the records in [first, end) that enter the
+        reservoir. Each yielded index has to be passed to add() before the
+        next one is requested.
+        '''
+        while len(self.records) < self.size and first < end:
+            yield first
+            first += 1
+        while self.next < end:
+            yield self.next
 
-    # read number of lines
+    def add(self, index, record):
+        if len(self.records) < self.size:
+            self.records.append((index, record))
+            return
+        self.records[random.randrange(self.size)] = (index, record)
+        self.w *= math.exp(math.log(uniform()) / self.size)
+        self.advance()
 
-    lines = 0
-    buf_size = 1024 * 1024
-    read_f = files['in'][0].read
 
-    buf = read_f(buf_size)
-    while buf:
-        lines += buf.count('\n')
-        buf = read_f(buf_size)
+def blocks_of_lines(fin, divideby):
+    '''
+    Yields lists of lines holding complete records, read in large blocks.
+    '''
+    rest = b''
+    while True:
+        block = fin.read(BLOCK_SIZE)
+        if not block:
+            break
+        lines = (rest + block).split(b'\n')
+        rest = lines.pop()
+        complete = len(lines) - len(lines) % divideby
+        rest = b'\n'.join(lines[complete:] + [rest])
+        if complete:
+            yield lines[:complete]
+    if rest:
+        lines = rest.split(b'\n')
+        if len(lines) % divideby:
+            sys.stderr.write("incomplete record at the end of the input\n")
+            exit(1)
+        yield lines
+
+
+def mates_of_lines(fins, divideby):
+    '''
+    Yields lists with the lines of the same number of records of every
+    mate.
+    '''
+    readers = [blocks_of_lines(fin, divideby) for fin in fins]
+    pending = [[] for _ in fins]
+    while True:
+        for i, reader in enumerate(readers):
+            if not pending[i]:
+                pending[i] = next(reader, [])
+        count = min(len(lines) for lines in pending)
+        if count == 0:
+            if any(pending):
+                sys.stderr.write("paired files differ in length\n")
+                exit(1)
+            return
+        yield [lines[:count] for lines in pending]
+        pending = [lines[count:] for lines in pending]
+
+
+def record_offsets(lines, offset, divideby):
+    '''
+    Returns the byte offsets of the records in *lines* following *offset*
+    and the offset after the last record.
+    '''
+    lengths = map(len, lines)
+    sizes = map(sum, zip(*[lengths] * divideby))
+    offsets = list(itertools.accumulate(itertools.chain([offset], sizes),
+                                        lambda a, b: a + b + divideby))
+    end = offsets.pop()
+    return offsets, end
+
+
+def sample_stream(args, files, indices):
+    '''
+    Samples in a single pass over all inputs. Fills the offset lists in
+    *indices* if they are given.
+    '''
+    divideby = args.divideby
+    reservoir = Reservoir(args.sample_size[0])
+    records = 0
+    positions = [0 for _ in files['in']]
+    for mates in mates_of_lines(files['in'], divideby):
+        count = len(mates[0]) // divideby
+        for index in reservoir.wanted(records, records + count):
+            line = (index - records) * divideby
+            reservoir.add(index, [lines[line:line + divideby]
+                                  for lines in mates])
+        if indices is not None:
+            for i, lines in enumerate(mates):
+                offsets, positions[i] = record_offsets(
+                    lines, positions[i], divideby)
+                indices[i].extend(offsets)
+        records += count
+    if indices is not None:
+        for i, offsets in enumerate(indices):
+            offsets.append(positions[i])
+    return records, sorted(reservoir.records, key=lambda entry: entry[0])
+
+
+def write_records(files, sample):
+    for i, fout in enumerate(files['out']):
+        for index, record in sample:
+            fout.write(b'\n'.join(record[i]))
+            fout.write(b'\n')
+        fout.close()
+
 
-    files['in'][0].seek(0, 0)
+def read_index(index_path, infile, divideby):
+    '''
+    Returns the record offsets stored in *index_path* or None if the index
+    does not exist or belongs to another version of *infile*.
+    '''
+    try:
+        with open(index_path, 'rb') as fidx:
+            header = fidx.read(INDEX_HEADER.size)
+            magic, size, mtime, lines = INDEX_HEADER.unpack(header)
+            stat = os.stat(infile)
+            if magic != INDEX_MAGIC or size != stat.st_size or \
+               mtime != stat.st_mtime_ns or lines != divideby:
+                return None
+            offsets = array.array('Q')
+            offsets.frombytes(fidx.read())
+            return offsets
+    except (OSError, struct.error):
+        return None
 
-    records = int(lines / args.divideby)
 
+def write_index(index_path, infile, divideby, offsets):
+    stat = os.stat(infile)
+    with open(index_path, 'wb') as fidx:
+        fidx.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size,
+                                     stat.st_mtime_ns, divideby))
+        offsets.tofile(fidx)
+
+
+def sample_indexed(args, files, indices):
+    '''
+    Reads only the sampled records at the offsets of the indices.
+    '''
+    records = len(indices[0]) - 1
+    if any(len(offsets) - 1 != records for offsets in indices):
+        sys.stderr.write("paired files differ in length\n")
+        exit(1)
     if records < args.sample_size[0]:
         sys.stderr.write("sample bigger than records aboarting\n")
         exit(1)
+    chosen = sorted(random.sample(range(records), args.sample_size[0]))
+    for offsets, fin, fout in zip(indices, files['in'], files['out']):
+        fd = fin.fileno()
+        for index in chosen:
+            start = offsets[index]
+            fout.write(os.pread(fd, offsets[index + 1] - start, start))
+        fout.close()
+
+
+def main(args):
+    random.seed(args.seed)
+    files = provide_FH(args)
 
-    rand_records = sorted(random.sample(range(records), args.sample_size[0]))
+    indices = None
+    if args.index is not None:
+        indices = [read_index(index_path, infile, args.divideby)
+                   for index_path, infile in zip(args.index, args.infiles)]
+        if all(offsets is not None for offsets in indices):
+            sample_indexed(args, files, indices)
+            return
+        indices = [array.array('Q') for _ in args.infiles]
 
-    rec_no = 0
+    records, sample = sample_stream(args, files, indices)
 
-    for rr in rand_records:
-        while rec_no < rr:
-            rec_no += 1
-            for i in range(args.divideby):
-                files['in'][0].readline()
-            if args.readtype[0] == 'paired':
-                for i in range(args.divideby):
-                    files['in'][1].readline()
+    if records < args.sample_size[0]:
+        sys.stderr.write("sample bigger than records aboarting\n")
+        exit(1)
 
-        for i in range(args.divideby):
-            files['out'][0].write(files['in'][0].readline())
-            if args.readtype[0] == 'paired':
-                files['out'][1].write(files['in'][1].readline())
+    write_records(files, sample)
 
-        rec_no += 1
+    if indices is not None:
+        for index_path, infile, offsets in zip(args.index, args.infiles,
+                                               indices):
+            write_index(index_path, infile, args.divideby, offsets)
 
 
 if __name__ == '__main__':
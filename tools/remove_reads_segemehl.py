@@ -11,6 +11,8 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+sys.path.insert(0, os.path.join(seq_pipeline_path, '..', 'include'))
+import record_io
 CHECK_QNAMES = False
 
 
@@ -46,14 +48,14 @@ class Filter:
                     for line in self.lines:
                         fixed_line = line
                         if len(self.lines) == 1:
-                            line_array = line.split("\t")
+                            line_array = line.split(b"\t", 2)
                             flags = int(line_array[1])
                             if (flags & 0x8) == 0:
                                 flags |= 0x8
-                            line_array[1] = str(flags)
-                            fixed_line = "\t".join(line_array)
+                            line_array[1] = b"%d" % flags
+                            fixed_line = b"\t".join(line_array)
 
-                        self.destination.write(fixed_line)
+                        self.destination.write_line(fixed_line)
                     self.wcount += len(self.lines)
             else:
                 self.discard_gt_2 += 1
@@ -63,14 +65,11 @@ class Filter:
         self.flags_or = 0
 
     def run(self):
+        self.destination.write_lines(self.source.header)
         for line in self.source:
-            if line[0] == '@':
-                self.destination.write(line)
-                continue
-
             self.rcount += 1
 
-            line_array = line.split('\t')
+            line_array = line.split(b'\t', 2)
             flags = int(line_array[1])
 
             if (flags & 0x100) != 0:
@@ -101,8 +100,9 @@ class Filter:
 def main():
     parser = argparse.ArgumentParser(description='No documentation available.')
     args = parser.parse_args()
-    filter = Filter(sys.stdin, sys.stdout)
-    filter.run()
+    with record_io.LineWriter('-') as destination:
+        filter = Filter(record_io.SamReader('-'), destination)
+        filter.run()
 
 
 if __name__ == '__main__':
@@ -24,7 +24,10 @@ import re
 import tempfile
 import argparse
 import os
-from Bio import SeqIO
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import indexed_fasta
 
 parser = argparse.ArgumentParser(description='python script for parsing the output of segemehl (remapper/realigner) into a cufflinks-compatible (tophat-like) output.     Usage: reads the segemehl-output-file (SAM format) either from stdin or from a file given as the first script argument.    Writes the output to stout.   Example1: python s2c.py -s mymap.sam -g ref_genome.fa > mymap_cufflinks_compatible.sam   Example2:  samtools view -h mymap.bam | python s2c.py -s - -g ref_genome.fa | samtools view -Sb - | samtools sort - mymap_cufflinks_compatible_sorted.bam')
 parser.add_argument('--version', action='version', version='%(prog)s 1.0')
@@ -302,10 +305,10 @@ def processLines(eingabe):
             newCigar += 'N'
             if not strandSpecific:
                 if(not xaIsSet):
-                    subseq = str(record_dict[eingabe[0][2]].seq[(
-                        startOld + laenge) - 1:startOld + laenge + 1])
-                    subseq += str(record_dict[eingabe[0][2]].seq[int(
-                        eingabe[i][3]) - 3:int(eingabe[i][3]) - 1])
+                    subseq = record_dict[eingabe[0][2]][(
+                        startOld + laenge) - 1:startOld + laenge + 1]
+                    subseq += record_dict[eingabe[0][2]][int(
+                        eingabe[i][3]) - 3:int(eingabe[i][3]) - 1]
                     subseq = subseq.upper()
                     if(subseq == "GTAG"or subseq == "GCAG" or subseq == "ATAC"):
                         xaIsSet = True
@@ -447,10 +450,8 @@ fusion = False
 losgehts = False
 if not strandSpecific:
     sys.stderr.write(
-        'read fasta records into memory (for strand unspecific protocols only).  \n')
-    handle = open(refGenome, "rU")
-    record_dict = SeqIO.to_dict(SeqIO.parse(handle, "fasta"))
-    handle.close()
+        'open indexed fasta file (for strand unspecific protocols only).  \n')
+    record_dict = indexed_fasta.open_fasta(refGenome)
 sys.stderr.write('process the sorted split reads.  \n')
 for line in temp2.readlines():
     columns = line.strip().split('\t')
@@ -16,13 +16,17 @@
 # description: Reformat the cigar string such that htseq-count is able to process
 #              the according SAM files. Consecutive values for 'ix', 'j=' and 'kM'
 # are summed up and replaced by nM with n being the sum of i, j and k.
+#
+# The input is read as bytes in blocks that end on a line boundary. The
+# workers only rewrite the cigar column of each line and return the whole
+# block, which the main process writes out in input order.
 
 
 import argparse
-import sys
+import collections
 import re
+import sys
 from multiprocessing import Pool
-import itertools
 
 parser = argparse.ArgumentParser(
     description='Python script to process a large file '
@@ -32,9 +36,9 @@ parser.add_argument(
     '--in-file',
     dest='my_file_in',
     required=True,
-    type=argparse.FileType('r'),
+    type=str,
     help='A large file whose lines are independent from each other and '
-    'can be processed separately.')
+    'can be processed separately. - reads from stdin.')
 parser.add_argument('--threads', dest='my_cores', default=1,
                     type=int,
                     help='Number of CPUs 2B used. Default: 1')
@@ -45,127 +49,122 @@ parser.add_argument(
     type=int,
     help='Size of buffer to read the input file (in MB). Default: 2')
 
-args = parser.parse_args()
+# a cigar operation: its length and the operation character
+CIGAR_OPERATION = re.compile(rb'(\d*)(\D)')
+MATCH_OPERATIONS = frozenset(b'=XM')
+# the number of rewritten cigar strings remembered per worker
+CACHE_SIZE = 100000
 
 ##########################################################################
-# my_range(start, end, step)
+# reformat_cigar(cigar)
 #
-# This function creates a range with a user defined step to walk through.
-# returns: the respective new start values
-
-
-def my_range(start, end, step):
-    while start <= end:
-        yield start
-        start += step
+# sums up consecutive values for '=', 'X' and 'M' (match and mismatch)
+# and leaves values as they are for all other operations, e.g. 'I', 'D',
+# 'N' or 'S' (ins, del, split, soft clip)
+
+cigar_cache = dict()
+
+
+def reformat_cigar(cigar):
+    new_cigar = cigar_cache.get(cigar)
+    if new_cigar is not None:
+        return new_cigar
+
+    parts = []
+    M = 0
+    for length, operation in CIGAR_OPERATION.findall(cigar):
+        if operation[0] in MATCH_OPERATIONS:
+            M += int(length)
+        else:
+            if M > 0:
+                parts.append(b'%dM' % M)
+                M = 0
+            parts.append(length + operation)
+    if M > 0:
+        parts.append(b'%dM' % M)
+    new_cigar = b''.join(parts) or b'*'
+
+    if len(cigar_cache) >= CACHE_SIZE:
+        cigar_cache.clear()
+    cigar_cache[cigar] = new_cigar
+    return new_cigar
 
 ##########################################################################
 
 ##########################################################################
-# process_line(line)
+# process_block(block)
 #
-# function that does something with the line:
-# in this case:
-# - split the line into columns by tab
-# - returns the columns separated by tab
-
+# rewrites column 6 of all alignment lines in a block of complete lines,
+# header lines and all other columns are passed through unchanged
 
-def process_line(lines):
 
-    newlines = list()
-
-    c = 0
-    for line in lines:
-        c += 1
-
-        columns = line.strip().split('\t')
-
-        # don't process header lines
-        if(columns[0][:1] == "@"):
-            newlines.append(line.strip())
+def process_block(block):
+    lines = block.split(b'\n')
+    # the block ends with a newline, so the last element is empty
+    for i in range(len(lines) - 1):
+        line = lines[i]
+        if line[:1] == b'@':
             continue
+        columns = line.split(b'\t', 6)
+        if len(columns) < 6:
+            continue
+        columns[5] = reformat_cigar(columns[5])
+        lines[i] = b'\t'.join(columns)
+    return b'\n'.join(lines)
 
-        cigar = columns[5]
-        x = re.split(r'(\D)', cigar)
-
-        # split cigar string and sum up consecutive values
-        # for '=' and 'X' (match and mismatch)
-        # leave values as they are for 'I','D' and 'N' (del, insertion, split)
-        M = 0
-        cigar_new = ''
-        for j in range(1, len(x) - 1, 2):
-            # match or mismatch
-            if x[j] == '=' or x[j] == 'X' or x[j] == 'M':
-                M = M + int(x[j - 1])
-            else:  # del or ins
-                if M > 0:
-                    # print the previous match/mismatch
-                    cigar_new += str(M) + "M"
-                    M = 0
-                    # anything else but '=', 'X' or 'M'
-                    cigar_new += x[j - 1] + x[j]
-
-        if M > 0:
-            cigar_new += str(M) + "M"
-
-        if cigar_new == "0M*":
-            cigar_new = "*"
-
-        # print the sam line with the new cigar string to stdout
-        new_line = ""
-        for k in range(0, 5):
-            new_line += "%s\t" % columns[k]
-
-        new_line += "%s\t" % cigar_new
-
-        for k in range(6, len(columns)):
-            new_line += "%s" % columns[k]
-            if(not k == len(columns)):
-                new_line += "\t"
-
-        newlines.append(new_line)
-
-    return newlines
-
-# END: process_line(line)
+# END: process_block(block)
 ##########################################################################
 
 
-if __name__ == '__main__':
+def read_blocks(file_in, bufsize):
+    '''
+    Yields blocks of about *bufsize* bytes which end on a line boundary.
+    '''
+    rest = b''
+    while True:
+        data = file_in.read(bufsize)
+        if not data:
+            break
+        data = rest + data
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            rest = data
+            continue
+        rest = data[end:]
+        yield data[:end]
+    if rest:
+        yield rest + b'\n'
+
 
-    # create my_cores -1 pools, 1 control + the remaining for processing the
-    # lines
-    p = Pool(args.my_cores)
+def open_input(path):
+    if path == '-':
+        return sys.stdin.buffer
+    return open(path, 'rb')
 
-    a = list()
 
-    eof_reached = False
+if __name__ == '__main__':
+    args = parser.parse_args()
 
     # bufsize needs to be provided in bytes
     # argument provided megabytes
     bufsize = args.my_bufsize * 1000000
 
-    while not eof_reached:
-        for i in range(args.my_cores - 1):
-            linelist = args.my_file_in.readlines(bufsize)
-            if len(linelist) == 0:
-                eof_reached = True
-            else:
-                a.append(linelist)  # ~ 2MB chunks
-
-        l = p.map(process_line, a)
-
-        for j in l:
-            print('\n'.join(j))
-
-        a[:] = []  # delete processed lines from the list
-
-
-# this works in principle.. too much i/o
-#    for line in p.imap(process_line, args.my_file_in):
-#        print line, # the coma prevents printing an additional new line
-
-
-# idea for mp:
-# read file in chunks of the size 1/args.my_cores
-# --> each chunk in one process
+    file_in = open_input(args.my_file_in)
+    out = sys.stdout.buffer
+    blocks = read_blocks(file_in, bufsize)
+
+    if args.my_cores <= 1:
+        for block in blocks:
+            out.write(process_block(block))
+    else:
+        # the results are written in input order, the number of blocks in
+        # flight is limited to bound the memory
+        with Pool(args.my_cores) as p:
+            pending = collections.deque()
+            for block in blocks:
+                pending.append(p.apply_async(process_block, (block,)))
+                if len(pending) >= 2 * args.my_cores:
+                    out.write(pending.popleft().get())
+            while pending:
+                out.write(pending.popleft().get())
+    out.flush()
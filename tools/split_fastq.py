@@ -1,6 +1,11 @@
-from Bio import SeqIO
+#!/usr/bin/env python
 import argparse
+import concurrent.futures
+import fcntl
+import gzip
 import os
+import sys
+import zlib
 seq_pipeline_path = os.path.dirname(os.path.realpath(__file__))
 activate_this_file = '%s/../python_env/bin/activate_this.py' % seq_pipeline_path
 exec(
@@ -12,9 +17,20 @@ exec(
         __file__=activate_this_file))
 
 '''
+Splits a FASTQ file into chunks of a fixed number of reads. Records are
+copied as raw bytes, the file is never parsed into record objects.
 
+- Without --sindex all chunks are written in a single pass.
+- With --sindex only the given chunk is written. With --index the byte
+  offsets of all chunk boundaries are stored once, so that every further
+  split job seeks straight to its chunk.
 '''
 
+# number of bytes read at once
+BLOCK_SIZE = 4 * 1024 * 1024
+LINES_PER_RECORD = 4
+GZIP_MAGIC = b'\x1f\x8b'
+
 
 def read_args():
     parser = argparse.ArgumentParser(
@@ -49,7 +65,8 @@ def read_args():
         '--sindex',
         '-s',
         nargs='?',
-        help='index of sample to write to file'
+        help='index of sample to write to file, all samples are written '
+        'in a single pass if not given'
     )
     parser.add_argument(
         '--mate',
@@ -57,64 +74,254 @@ def read_args():
         nargs='?',
         help='mate1: r1, mate2: r2'
     )
+    parser.add_argument(
+        '--index',
+        nargs='?',
+        help='file with the byte offsets of the chunks of an uncompressed '
+        'input, created by the first job that needs it'
+    )
+    parser.add_argument(
+        '--gzip',
+        action='store_true',
+        default=False,
+        help='write gzipped output files (<pattern>_1_r1.fastq.gz)'
+    )
+    parser.add_argument(
+        '--threads',
+        '-t',
+        type=int,
+        default=1,
+        help='number of threads compressing the output'
+    )
 
     args = parser.parse_args()
-    # TODO: catch missing args
+    if args.infile is None or args.read_count is None:
+        parser.error('--infile and --read_count are required')
+    if args.read_count[0] < 1:
+        parser.error('--read_count has to be positive')
 
     return args
 
 
-def batch_iterator(iterator, batch_size):
-    """Returns lists of length batch_size.
-
-    This can be used on any iterator, for example to batch up
-    SeqRecord objects from Bio.SeqIO.parse(...), or to batch
-    Alignment objects from Bio.AlignIO.parse(...), or simply
-    lines from a file handle.
-
-    This is a generator function, and it returns lists of the
-    entries from the supplied iterator.  Each list will have
-    batch_size entries, although the final list may be shorter.
-
-    From http://biopython.org/wiki/Split_large_file
-    """
-    entry = True  # Make sure we loop once
-    while entry:
-        batch = []
-        while len(batch) < batch_size:
-            try:
-                entry = next(iterator)
-            except StopIteration:
-                entry = None
-            if entry is None:
-                # End of file
+def open_input(path):
+    fin = open(path, 'rb')
+    if fin.read(2) == GZIP_MAGIC:
+        fin.seek(0)
+        return gzip.open(fin, 'rb'), True
+    fin.seek(0)
+    return fin, False
+
+
+def nth_newline(block, start, n):
+    '''
+    Returns the position after the *n*-th newline in *block* searched from
+    *start*.
+    '''
+    position = start
+    for _ in range(n):
+        position = block.index(b'\n', position) + 1
+    return position
+
+
+def chunk_blocks(fin, lines_per_chunk):
+    '''
+    Yields (chunk number, data) for the input in large blocks, cut at
+    chunk boundaries. Chunks are numbered from 1.
+    '''
+    chunk = 1
+    missing = lines_per_chunk
+    while True:
+        block = fin.read(BLOCK_SIZE)
+        if not block:
+            return
+        start = 0
+        newlines = block.count(b'\n')
+        while newlines >= missing:
+            end = nth_newline(block, start, missing)
+            yield chunk, block[start:end]
+            newlines -= missing
+            start = end
+            chunk += 1
+            missing = lines_per_chunk
+        if start < len(block):
+            yield chunk, block[start:]
+        missing -= newlines
+
+
+class ChunkWriter(object):
+    '''
+    Writes chunk files. Gzipped data is compressed by a thread pool as
+    independent gzip members, which concatenated form a valid gzip file.
+    zlib releases the GIL, so the threads compress in parallel.
+    '''
+
+    def __init__(self, args):
+        self.args = args
+        self.pool = None
+        self.pending = []
+        if args.gzip:
+            self.pool = concurrent.futures.ThreadPoolExecutor(args.threads)
+        self.fout = None
+        self.chunk = None
+
+    def path(self, chunk):
+        outpath = self.args.outpath if self.args.outpath is not None else ''
+        pattern = self.args.out_file_pattern \
+            if self.args.out_file_pattern is not None else 'group'
+        suffix = '.fastq.gz' if self.args.gzip else '.fastq'
+        return os.path.join(outpath, "%s_%i_%s%s" %
+                            (pattern, chunk, self.args.mate, suffix))
+
+    def start(self, chunk):
+        if chunk != self.chunk:
+            self.close()
+            self.chunk = chunk
+            self.fout = open(self.path(chunk), 'wb')
+
+    def write(self, chunk, data):
+        self.start(chunk)
+        if self.pool is None:
+            self.fout.write(data)
+            return
+        self.pending.append(self.pool.submit(
+            zlib.compress, data, 6, zlib.MAX_WBITS | 16))
+        # keep the number of buffered blocks bounded
+        while len(self.pending) > 2 * self.args.threads:
+            self.fout.write(self.pending.pop(0).result())
+
+    def close(self):
+        if self.fout is None:
+            return
+        for future in self.pending:
+            self.fout.write(future.result())
+        self.pending = []
+        self.fout.close()
+        self.fout = None
+
+    def shutdown(self):
+        self.close()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def split_all(args):
+    '''
+    Writes all chunks in a single pass.
+    '''
+    fin, compressed = open_input(args.infile[0])
+    writer = ChunkWriter(args)
+    chunks = 0
+    with fin:
+        for chunk, data in chunk_blocks(
+                fin, args.read_count[0] * LINES_PER_RECORD):
+            writer.write(chunk, data)
+            chunks = chunk
+    writer.shutdown()
+    sys.stdout.write("Wrote %d chunks.\n" % chunks)
+
+
+def chunk_offsets(path, lines_per_chunk):
+    '''
+    Returns the byte offsets of all chunk starts of an uncompressed file
+    followed by its size.
+    '''
+    offsets = [0]
+    position = 0
+    with open(path, 'rb') as fin:
+        missing = lines_per_chunk
+        while True:
+            block = fin.read(BLOCK_SIZE)
+            if not block:
                 break
-            batch.append(entry)
-        if batch:
-            yield batch
+            start = 0
+            newlines = block.count(b'\n')
+            while newlines >= missing:
+                start = nth_newline(block, start, missing)
+                offsets.append(position + start)
+                newlines -= missing
+                missing = lines_per_chunk
+            missing -= newlines
+            position += len(block)
+    if offsets[-1] != position:
+        offsets.append(position)
+    return offsets
 
 
-def main(args):
-    # TODO: Exception if its not a fastq
+def read_index(index_path, stat, read_count):
+    try:
+        with open(index_path) as fidx:
+            header = fidx.readline().split()
+            if header != [str(stat.st_size), str(stat.st_mtime_ns),
+                          str(read_count)]:
+                return None
+            return [int(line) for line in fidx]
+    except (OSError, ValueError):
+        return None
+
+
+def indexed_offsets(args):
+    '''
+    Returns the chunk offsets stored in the index or creates it. Concurrent
+    split jobs wait for the job that creates the index.
+    '''
     infile = args.infile[0]
     read_count = args.read_count[0]
-    out_file_pattern = args.out_file_pattern if args.out_file_pattern is not None else 'group'
-
-    # TODO: check for valid and existing path
-    outpath = args.outpath if args.outpath is not None else ''
-    if outpath != '' and outpath[-1] != '/':
-        outpath += '/'
-
-    sample_index = args.sindex
-    mate = args.mate
-
-    record_iter = SeqIO.parse(open(infile), "fastq")
-    for i, batch in enumerate(batch_iterator(record_iter, read_count)):
-        if int(sample_index) == (i + 1):
-            filename = outpath + \
-                "%s_%i_%s.fastq" % (out_file_pattern, int(sample_index), mate)
-            with open(filename, "w") as handle:
-                SeqIO.write(batch, handle, "fastq")
+    index_dir = os.path.dirname(args.index)
+    if index_dir:
+        os.makedirs(index_dir, exist_ok=True)
+    with open(args.index + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stat = os.stat(infile)
+        offsets = read_index(args.index, stat, read_count)
+        if offsets is None:
+            offsets = chunk_offsets(infile, read_count * LINES_PER_RECORD)
+            temp_path = '%s.%d' % (args.index, os.getpid())
+            with open(temp_path, 'w') as fidx:
+                fidx.write('%d %d %d\n' % (stat.st_size, stat.st_mtime_ns,
+                                           read_count))
+                fidx.writelines('%d\n' % offset for offset in offsets)
+            os.rename(temp_path, args.index)
+    return offsets
+
+
+def split_one(args):
+    '''
+    Writes the chunk with the number --sindex.
+    '''
+    sample_index = int(args.sindex)
+    lines_per_chunk = args.read_count[0] * LINES_PER_RECORD
+    writer = ChunkWriter(args)
+    # the file exists even if the input has less chunks
+    writer.start(sample_index)
+
+    fin, compressed = open_input(args.infile[0])
+    with fin:
+        if args.index is not None and not compressed:
+            offsets = indexed_offsets(args)
+            if sample_index < len(offsets):
+                start = offsets[sample_index - 1]
+                size = offsets[sample_index] - start
+                fin.seek(start)
+                while size > 0:
+                    data = fin.read(min(size, BLOCK_SIZE))
+                    if not data:
+                        break
+                    writer.write(sample_index, data)
+                    size -= len(data)
+        else:
+            for chunk, data in chunk_blocks(fin, lines_per_chunk):
+                if chunk == sample_index:
+                    writer.write(chunk, data)
+                elif chunk > sample_index:
+                    break
+    writer.shutdown()
+
+
+def main(args):
+    if args.sindex is None:
+        split_all(args)
+    else:
+        split_one(args)
 
 
 if __name__ == '__main__':
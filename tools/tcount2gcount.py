@@ -1,8 +1,9 @@
-import json
-import sys
-from collections import defaultdict
 import argparse
+import hashlib
 import os
+import re
+import sys
+import tempfile
 seq_pipeline_path = os.path.dirname(os.path.realpath(__file__))
 activate_this_file = '%s/../python_env/bin/activate_this.py' % seq_pipeline_path
 exec(
@@ -12,11 +13,25 @@ exec(
         'exec'),
     dict(
         __file__=activate_this_file))
+
+import numpy as np
 '''
 calculates gene counts from transcript counts
 tcount2gcounts.py -m <transcript_gene_mapping.csv> -i <transcript_counts.csv> -o <gene_counts.csv>
+
+The transcript to gene mapping is parsed once and stored in --cache-dir,
+keyed by the path, size and modification time of the mapping file. The
+content is not hashed, as reading the whole annotation for every sample
+would cost about as much as parsing it. Samples are aggregated by a
+group-by over integer gene codes.
 '''
 
+# version of the cache file layout
+CACHE_VERSION = 2
+
+GENE_ID = re.compile(r'\bgene_id "?([^";]+)"?;?')
+TRANSCRIPT_ID = re.compile(r'\btranscript_id "?([^";]+)"?;?')
+
 
 def read_args():
     parser = argparse.ArgumentParser(
@@ -57,11 +72,43 @@ def read_args():
 
     )
 
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=None,
+        help='directory for the parsed mapping, shared by all samples'
+    )
+
     args = parser.parse_args()
     return args
 
 
-def read_mapping_file(mapping_file):
+class Mapping(object):
+    '''
+    Transcript to gene mapping. The transcript IDs are sorted, codes holds
+    the index into genes for every transcript.
+    '''
+
+    def __init__(self, transcripts, codes, genes):
+        self.transcripts = transcripts
+        self.codes = codes
+        self.genes = genes
+
+    def encode(self, transcripts):
+        '''
+        Returns the gene codes of *transcripts*.
+        '''
+        positions = np.searchsorted(self.transcripts, transcripts)
+        positions[positions == len(self.transcripts)] = 0
+        found = self.transcripts[positions] == transcripts
+        if not found.all():
+            missing = transcripts[~found]
+            sys.exit('%d transcripts are missing in the mapping, e.g. %s.'
+                     % (len(missing), ', '.join(missing[:5])))
+        return self.codes[positions]
+
+
+def parse_mapping_file(mapping_file):
     mapping_data = dict()
 
     with open(mapping_file, 'r') as f:
@@ -69,82 +116,129 @@ def read_mapping_file(mapping_file):
             if line.startswith('#'):
                 continue
 
-            line_data = line.rstrip('\n').split('\t')
             if mapping_file.endswith('gtf'):
-                data = line_data[8].split()
-                if all(elem in data for elem in ['gene_id', 'transcript_id']):
-                    d = dict(zip(data[::2], data[1::2]))
-                    t_id = d['transcript_id'].rstrip(';').replace('"', '')
-                    g_id = d['gene_id'].rstrip(';').replace('"', '')
-                else:
+                if 'transcript_id' not in line:
                     continue
-
+                attributes = line.rstrip('\n').split('\t')[8]
+                t_id = TRANSCRIPT_ID.search(attributes)
+                g_id = GENE_ID.search(attributes)
+                if t_id is None or g_id is None:
+                    continue
+                t_id = t_id.group(1)
+                g_id = g_id.group(1)
             else:
+                line_data = line.rstrip('\n').split('\t')
                 t_id = line_data[0]
                 g_id = line_data[1]
             mapping_data[t_id] = g_id
 
-    # TODO: mapping data empty after extracting?
-    return mapping_data
-
-
-def read_input_file(input_file, mapping_data, tool_name):
-    result_data = dict()
-
-    count_index = 3 if tool_name == 'kallisto' else 4
-
+    if not mapping_data:
+        sys.exit('No transcript to gene mapping found in %s.' % mapping_file)
+
+    transcripts = np.array(list(mapping_data.keys()))
+    genes, codes = np.unique(np.array(list(mapping_data.values())),
+                             return_inverse=True)
+    order = np.argsort(transcripts)
+    return Mapping(transcripts[order], codes[order].astype(np.int32), genes)
+
+
+def cache_path(cache_dir, mapping_file):
+    stat = os.stat(mapping_file)
+    key = '%s\t%d\t%d\t%d' % (os.path.abspath(mapping_file), stat.st_size,
+                              stat.st_mtime_ns, CACHE_VERSION)
+    return os.path.join(cache_dir, 'mapping-%s.npz' %
+                        hashlib.sha256(key.encode()).hexdigest())
+
+
+def read_mapping_file(mapping_file, cache_dir=None):
+    '''
+    Returns the Mapping of *mapping_file*, from the cache if possible.
+    '''
+    if cache_dir is None:
+        return parse_mapping_file(mapping_file)
+    path = cache_path(cache_dir, mapping_file)
+    try:
+        with np.load(path) as cache:
+            return Mapping(cache['transcripts'], cache['codes'],
+                           cache['genes'])
+    except (OSError, KeyError, ValueError):
+        pass
+    mapping = parse_mapping_file(mapping_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    # concurrent samples may build the same cache, the last one wins
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.npz')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, transcripts=mapping.transcripts, codes=mapping.codes,
+                 genes=mapping.genes)
+    os.replace(temp_path, path)
+    return mapping
+
+
+def read_table(input_file, columns):
+    '''
+    Returns the fields of the tab separated *input_file* without its header
+    line as a rows x *columns* array of strings.
+    '''
     with open(input_file, 'r') as f:
-        for lnum, line in enumerate(f):
-            if lnum != 0:
-                line_data = line.rstrip('\n').split('\t')
-                transcript = line_data[0].strip('"')
-                count = line_data[count_index]
-
-                if mapping_data[transcript] not in result_data:
-                    result_data[mapping_data[transcript]] = 0
-
-                result_data[mapping_data[transcript]] += float(count)
+        f.readline()
+        fields = np.array(f.read().split(), dtype=str)
+    if len(fields) % columns != 0:
+        sys.exit('%s does not have %d columns in every line.'
+                 % (input_file, columns))
+    table = fields.reshape(-1, columns)
+    table[:, 0] = np.char.strip(table[:, 0], '"')
+    return table
 
-    return result_data
 
+def first_appearance(codes):
+    '''
+    Returns the distinct *codes* in the order of their first appearance.
+    '''
+    distinct, first = np.unique(codes, return_index=True)
+    return distinct[np.argsort(first)]
 
-def read_input_file_k(input_file, mapping_data):
-    res = defaultdict(dict)
 
-    info = ['t_target_id', 't_length', 't_eff_length', 't_est_count', 't_tpm']
-
-    with open(input_file, 'r') as f:
-        for lnum, line in enumerate(f):
-
-            if lnum != 0:
-                data = line.strip('"').rstrip('\n').split('\t')
-
-                transcript = data[0]
-
-                if mapping_data[transcript] not in res:
-                    for i in range(5):
-                        res[mapping_data[transcript]][info[i]] = str(data[i])
-                    res[mapping_data[transcript]]['target_id'] = str(
-                        mapping_data[transcript])
-                    res[mapping_data[transcript]]['length'] = 'NA'
-                    res[mapping_data[transcript]]['eff_length'] = 'NA'
-                    res[mapping_data[transcript]]['est_count'] = float(data[3])
-                    res[mapping_data[transcript]]['tpm'] = float(data[4])
-
-                else:
-                    for i in range(5):
-                        res[mapping_data[transcript]
-                            ][info[i]] += ',' + str(data[i])
-                    res[mapping_data[transcript]
-                        ]['est_count'] += float(data[3])
-                    res[mapping_data[transcript]]['tpm'] += float(data[4])
+def read_input_file(input_file, mapping, tool_name):
+    count_index = 3 if tool_name == 'kallisto' else 4
 
+    table = read_table(input_file, 5)
+    codes = mapping.encode(table[:, 0])
+    sums = np.bincount(codes, weights=table[:, count_index].astype(float),
+                       minlength=len(mapping.genes))
+    order = first_appearance(codes)
+    return mapping.genes[order], sums[order]
+
+
+def read_input_file_k(input_file, mapping):
+    table = read_table(input_file, 5)
+    codes = mapping.encode(table[:, 0])
+    est_counts = np.bincount(codes, weights=table[:, 3].astype(float))
+    tpms = np.bincount(codes, weights=table[:, 4].astype(float))
+
+    # transcripts grouped by gene in input order
+    grouped = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[grouped], np.arange(len(mapping.genes) + 1))
+
+    res = list()
+    for code in first_appearance(codes):
+        rows = table[grouped[bounds[code]:bounds[code + 1]]]
+        entry = {
+            'target_id': mapping.genes[code],
+            'length': 'NA',
+            'eff_length': 'NA',
+            'est_count': float(est_counts[code]),
+            'tpm': float(tpms[code]),
+        }
+        for i, name in enumerate(['t_target_id', 't_length', 't_eff_length',
+                                  't_est_count', 't_tpm']):
+            entry[name] = ','.join(rows[:, i])
+        res.append(entry)
     return res
 
 
-def write_output_file(output_file, result_data):
-    for g_id, count in result_data.items():
-        output_file.write('%s\t%f\n' % (g_id, count))
+def write_output_file(output_file, genes, counts):
+    output_file.writelines('%s\t%f\n' % (g_id, count)
+                           for g_id, count in zip(genes, counts))
 
 
 def write_output_file_k(output_file, result_data):
@@ -162,7 +256,7 @@ def write_output_file_k(output_file, result_data):
         't_tpm']
 
     output_file.write("\t".join(header) + '\n')
-    for g_id, entry in result_data.items():
+    for entry in result_data:
         out = [str(entry[x]) for x in header]
         output_file.write("\t".join(out) + "\n")
 
@@ -175,14 +269,14 @@ def main(args):
     # TODO: tool_name kallisto or salmon?
     tool_name = args.tool_name[0]
 
-    mapping_data = read_mapping_file(mapping_file)
+    mapping = read_mapping_file(mapping_file, args.cache_dir)
 
     if args.kallisto_extended:
-        result_data = read_input_file_k(input_file, mapping_data)
+        result_data = read_input_file_k(input_file, mapping)
         write_output_file_k(args.outfile, result_data)
     else:
-        result_data = read_input_file(input_file, mapping_data, tool_name)
-        write_output_file(args.outfile, result_data)
+        genes, counts = read_input_file(input_file, mapping, tool_name)
+        write_output_file(args.outfile, genes, counts)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), '..', 'include'))
+import file_io
+
+'''
+Copies a file the cheapest way possible: as reflink sharing the extents
+of the source on file systems like Btrfs or XFS, as hardlink (with
+--link), or inside the kernel with copy_file_range or sendfile. A 200 GB
+reference is copied instantly on the first two paths. With --no-copy a
+symbolic link is created instead of moving any data.
+
+With --hash-hint data that really has to be moved is read and written
+instead and hashed on the way. The hashes are left next to the copy, so
+uap does not have to read it again.
+'''
+
+
+def read_args():
+    parser = argparse.ArgumentParser(
+        description='copies a file as reflink, hardlink or in the kernel')
+    parser.add_argument(
+        'source',
+        help='file to copy')
+    parser.add_argument(
+        'target',
+        help='path of the copy')
+    parser.add_argument(
+        '--link',
+        action='store_true',
+        default=False,
+        help='create a hardlink if a reflink is not possible')
+    parser.add_argument(
+        '--no-copy',
+        action='store_true',
+        default=False,
+        help='create a symbolic link instead of copying the data')
+    parser.add_argument(
+        '--hash-hint',
+        action='store_true',
+        default=False,
+        help='hash copied data and store the hash next to the target')
+    parser.add_argument(
+        '--tree-chunk-size',
+        type=int,
+        default=file_io.tree_chunk_size_from_env(),
+        help='also hash chunks of this size for a tree hash. Default: '
+        '$%s set by uap or 0' % file_io.TREE_CHUNK_SIZE_VARIABLE)
+    return parser.parse_args()
+
+
+def main(args):
+    hasher = None
+    if args.hash_hint:
+        hasher = file_io.StreamHasher(args.tree_chunk_size)
+    method = file_io.transfer_file(args.source, args.target, args.link,
+                                   hasher, not args.no_copy)
+    if hasher is not None and method == 'copy':
+        file_io.write_hash_hint(args.target, hasher)
+    sys.stderr.write('%s: %s\n' % (method, args.target))
+
+
+if __name__ == '__main__':
+    main(read_args())
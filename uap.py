@@ -34,6 +34,7 @@ if subcommand_path not in sys.path:
     sys.path.append(subcommand_path)
 from uaperrors import *
 from include.subcommands import *
+import tracing
 
 
 def main():
@@ -119,6 +120,24 @@ def main():
         default=False,
         help="Enable profiling save report in uap.cprof.")
 
+    parser.add_argument(
+        "--trace",
+        dest="trace",
+        metavar="<file>",
+        default=None,
+        help="Record the time spent in the phases of uap as trace event "
+        "JSON in <file>,\nto be opened in chrome://tracing or "
+        "https://ui.perfetto.dev.\nJobs submitted to a cluster write "
+        "their own traces next to <file>.")
+
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        default=False,
+        help="With --trace, also save a cProfile report per phase in "
+        "<file>.<phase>.<n>.cprof.")
+
     parser.add_argument(
         "--version",
         dest="version",
@@ -503,6 +522,14 @@ def main():
     # create logger object
     logger = _configure_logger(args.verbose)
 
+    if args.profile and not args.trace:
+        parser.error('--profile requires --trace.')
+    if args.profile and args.profiling:
+        parser.error('--profile and --profiling cannot be combined.')
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+        tracing.enable(args.trace, profile=args.profile)
+
     # call subcommand
     try:
         if args.profiling is True:
@@ -510,7 +537,9 @@ def main():
             cProfile.runctx('args.func(args)', {'args': args}, {},
                             filename='uap.cprof')
         else:
-            args.func(args)
+            with tracing.span(args.func.__module__.split('.')[-1],
+                              'subcommand'):
+                args.func(args)
     except (Exception, KeyboardInterrupt) as e:
         error = traceback.format_exception(*sys.exc_info())[-1]
         logger.error(error.strip())
@@ -518,6 +547,8 @@ def main():
             raise
         else:
             sys.exit(1)
+    finally:
+        tracing.write()
 
 
 def _configure_logger(verbosity):